@@ -0,0 +1,179 @@
+"""
+読み取り専用の JSON API（Streamlit に依存しない）。
+
+得点板や場内アナウンス用のツールが、画面をスクレイピングせずに大会データを取得するためのもの。
+app.py と同じ形式のローカルのジャーナルを読む。secrets.toml（app.py と同じもの）があれば、
+リクエストのあった大会のシートを自分でも取り込み続ける（storage.sheet_reader。取り込むだけで書き込まない）。
+そのため、Streamlit のセッションが無くても・別のサーバーで入力された結果も返る。
+しばらくリクエストが無い大会は取り込みの間隔を延ばし、やがて止める（次のリクエストで再開する）。
+
+    python api.py [--host 0.0.0.0] [--port 8600] [--secrets .streamlit/secrets.toml]
+
+エンドポイント（大会IDは ?t=... で指定。省略時は既定の大会）:
+  GET /api/state                 保存されている状態（設定・チーム・全試合結果）
+  GET /api/standings/reg|mix     リーグの順位表
+  GET /api/timetable             リーグ戦・トーナメントの対戦表（チーム名・スコア入り）
+  GET /api/brackets              トーナメント表（出場チームと各試合の勝者）
+
+どの応答にも状態の内容から決まる強い ETag を付ける。If-None-Match が一致すれば本文なしの 304 を返すので、
+数秒おきにポーリングしても、結果が変わるまでは通信量も計算もほとんどかからない。
+"""
+import argparse
+import json
+import os
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from journal import LocalJournal
+from publish import StateCache
+from standings import LEAGUES
+from storage import (SECRETS_FILE, load_secrets, sheets_client, spreadsheet_from_secrets, tournament_worksheet,
+                     sheet_reader)
+
+JOURNAL_FILE = "patent_cup_journal.db" # app.py と同じ（環境変数 PATENT_CUP_JOURNAL で変更可）
+PULL_INTERVAL = float(os.environ.get("PATENT_CUP_PULL_INTERVAL", "10")) # app.py と同じ
+
+
+def _resource(path, entry):
+    """パスに対応する応答の中身（無いパスなら None）"""
+    public = entry['public']
+    if path == "/api/state":
+        return entry['data']
+    if path == "/api/timetable":
+        return {"league": public['league'], "tournament": public['tournament']}
+    if path == "/api/brackets":
+        return public['brackets']
+    if path.startswith("/api/standings/"):
+        league = path.rsplit("/", 1)[1]
+        if league in LEAGUES: return public['standings'][league]
+    return None
+
+
+def _etag_matches(header, etag):
+    """If-None-Match の比較（弱い比較。"*" はどの ETag にも一致する）"""
+    if not header: return False
+    candidates = [c.strip() for c in header.split(",")]
+    return "*" in candidates or any(c.removeprefix("W/") == etag for c in candidates)
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    cache = None # make_server で設定する
+    readers = None # make_server で設定する（シートを取り込まない場合は None）
+    server_version = "PatentCupAPI/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        tid = parse_qs(url.query).get("t", [""])[0]
+        if self.readers is not None: self.readers.touch(tid)
+        entry = self.cache.get(tid)
+        if entry is None:
+            return self._send_json(HTTPStatus.NOT_FOUND, {"error": "tournament not found"})
+        path = url.path.rstrip("/")
+        body = entry['bodies'].get(path)
+        if body is None:
+            resource = _resource(path, entry)
+            if resource is None:
+                return self._send_json(HTTPStatus.NOT_FOUND, {"error": "unknown endpoint"})
+            body = json.dumps(resource, ensure_ascii=False).encode()
+            entry['bodies'][path] = body
+
+        etag = f'"{entry["version"]}"'
+        if _etag_matches(self.headers.get("If-None-Match"), etag):
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self._common_headers(etag)
+            self.end_headers()
+            return
+        self.send_response(HTTPStatus.OK)
+        self._common_headers(etag)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _common_headers(self, etag):
+        self.send_header("ETag", etag)
+        # キャッシュしてよいが、使う前に毎回 ETag で確認すること
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("Access-Control-Expose-Headers", "ETag")
+
+    def _send_json(self, status, obj):
+        body = json.dumps(obj, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass # ポーリングのたびにログが出ないようにする
+
+
+class Readers:
+    """
+    大会ごとのシートの取り込みスレッド（リクエストのたびに touch して、読まれている大会だけ取り込む）。
+    make_reader(tid): storage.sheet_reader を返す関数。
+    ジャーナルに無い大会IDのスレッドは作らない（存在しない大会IDのリクエストでスレッドを増やさない）。
+    """
+
+    def __init__(self, journal, make_reader):
+        self.journal = journal
+        self._make_reader = make_reader
+        self._lock = threading.Lock()
+        self._readers = {}
+
+    def touch(self, tid):
+        with self._lock:
+            reader = self._readers.get(tid)
+            created = reader is None
+            if created:
+                if tid and self.journal.remote_cursor(tid) is None: return
+                reader = self._readers[tid] = self._make_reader(tid)
+        stopped = created or not reader.running
+        reader.touch()
+        if stopped: reader.sync_once() # 止まっていた間の変化を、この応答から反映する
+
+
+def make_server(host, port, journal, make_reader=None):
+    """make_reader(tid) を渡すと、リクエストのあった大会のシートを取り込み続ける（Readers）"""
+    readers = Readers(journal, make_reader) if make_reader else None
+    handler = type("Handler", (ApiHandler,), {"cache": StateCache(journal), "readers": readers})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def sheet_opener(secrets_path):
+    """secrets.toml から、大会IDを受け取ってワークシートを開く関数を作る（ファイルが無ければ None）"""
+    if not os.path.exists(secrets_path): return None
+    secrets = load_secrets(secrets_path)
+    client = {}
+
+    def open_sheet(tid):
+        if 'client' not in client: client['client'] = sheets_client(secrets)
+        return tournament_worksheet(spreadsheet_from_secrets(client['client'], secrets), tid)
+    return open_sheet
+
+
+def main():
+    parser = argparse.ArgumentParser(description="パテントカップの読み取り専用 JSON API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--secrets", default=SECRETS_FILE, help="シートを取り込むための secrets.toml（無ければジャーナルを読むだけ）")
+    args = parser.parse_args()
+    journal = LocalJournal(os.environ.get("PATENT_CUP_JOURNAL", JOURNAL_FILE))
+    open_sheet = sheet_opener(args.secrets)
+    make_reader = None
+    if open_sheet:
+        make_reader = lambda tid: sheet_reader(journal, tid, lambda: open_sheet(tid),
+                                               pull_interval=PULL_INTERVAL, idle_backoff=True)
+    else:
+        print(f"{args.secrets} が無いので、シートは取り込みません（同じジャーナルを使う app.py の同期に任せます）")
+    server = make_server(args.host, args.port, journal, make_reader)
+    print(f"http://{args.host}:{args.port}/api/state")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
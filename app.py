@@ -1,14 +1,24 @@
 import streamlit as st
-import pandas as pd
-from datetime import datetime, timedelta
-import graphviz
+from datetime import datetime
 import json
 import os
+import uuid
+import importlib.util
 # --- 追加ライブラリ ---
-import gspread
-from google.oauth2.service_account import Credentials
+# pandas・graphviz・gspread・google-auth は読み込みに時間がかかるので、使う処理の中で読み込む
+# （起動直後の最初の画面が、表示しない図やまだ通信しないシートのために待たされないようにする）
 import time   # ★追加
 import random # ★追加
+from standings import build_standings, update_result, standings_frame, ranked_team_names, ranked_team_codes
+from schedule import team_code
+from tournament import tourn_match_result, tournament_match_teams, bracket_state
+from timetable import LeagueMatch, compile_timetable, team_fixtures, next_fixture
+from journal import LocalJournal, SyncWorker, PENDING, FAILED
+from bracket import bracket_dot, bracket_svg, bracket_text
+from publish import SnapshotPublisher, StateCache, render_fragment, REFRESH_SECONDS
+from storage import (replay_sheet, compact_sheet, sheets_client, spreadsheet_from_secrets, tournament_worksheet,
+                     JournaledStorage, MemoryStorage, SQLiteStorage, SheetsStorage, PostgresStorage)
+from profiler import RerunProfiler, phase, count
 
 # ==========================================
 # 1. 設定・データ定義
@@ -47,272 +57,343 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 DATA_FILE = "patent_cup_data.json" # データを保存するファイル名
+JOURNAL_FILE = "patent_cup_journal.db" # ローカルのジャーナル（環境変数 PATENT_CUP_JOURNAL で変更可）
+PUBLISH_DIR = os.environ.get("PATENT_CUP_PUBLISH_DIR") # 設定すると観戦者向けの静的ページをここに書き出す
+FAKE_SHEETS = os.environ.get("PATENT_CUP_FAKE_SHEETS") # 設定するとプロセス内の偽のシートを使う（値は fake_sheets.py の仕様文字列）
+PROFILE = os.environ.get("PATENT_CUP_PROFILE") == "1" # 起動時から処理時間を計測する（管理者設定からも切り替え可）
+# 閲覧者の画面。"lite" は作り済みの HTML の表だけ（全閲覧者で共有）、"full" は管理者と同じカード・順位表・トーナメント表
+VIEWER_MODE = os.environ.get("PATENT_CUP_VIEWER_MODE", "lite")
+NODE_ID = uuid.uuid4().hex[:12] # このサーバープロセスの識別子
+# シートの新しいログを確かめる間隔 [秒]（表示中のセッションがある大会だけ。使われていない大会は間隔を延ばし、やがて止める）
+PULL_INTERVAL = float(os.environ.get("PATENT_CUP_PULL_INTERVAL", "10"))
+# 大会データの保存先。"sheets"（既定: ローカルのジャーナル + Google スプレッドシート）/ "sqlite:ファイル名" / "memory" /
+# "postgresql"（secrets の connections.postgresql。render_ver と同じテーブル。SQLAlchemy と psycopg2 を別途入れる: requirements.txt 参照）。
+# 大会ID・同期状況の表示・観戦者向けページの書き出し（PATENT_CUP_PUBLISH_DIR）は "sheets" の場合だけ
+STORAGE = os.environ.get("PATENT_CUP_STORAGE", "sheets")
+SHEET_COLUMNS = 3 # 大会のワークシートの列数（A1 = スナップショット, B1 = バージョン, C1 = 圧縮中の目印）
+
+# 管理者設定の項目（試合結果以外）。設定の保存はこの項目だけをログとして追記する
+SETTINGS_KEYS = ['app_title', 'teams_reg', 'teams_mix', 'court_mode', 'start_time_hour', 'start_time_minute',
+                 'league_duration', 'tourn_duration', 'interval_duration', 'league_games']
+
+# 大会ID（?t=... で指定）。未指定なら従来どおり1枚目のシートを使う。
+# 使えるのは作成済みの大会と、secrets の TOURNAMENTS（カンマ区切り）に載っている大会だけ。それ以外は管理者が画面から作成する
+TOURNAMENT_PARAM = "t"
+# 選手向けのチーム指定（?team=reg-A のように リーグ-チーム記号）。指定があれば最初にそのチームの画面を開く
+TEAM_PARAM = "team"
 
 # チーム名初期値
 DEFAULT_TEAMS_REGULAR = {chr(65+i): f"チーム{chr(65+i)}" for i in range(12)}
 DEFAULT_TEAMS_MIX = {chr(65+i): f"MIXチーム{chr(65+i)}" for i in range(12)}
 
-# -------------------------------------------
-# スケジュール定義
-# -------------------------------------------
-SCHEDULE_TEMPLATE_4COURT = [
-    [("A", "E"), ("B", "F"), ("A", "E"), ("B", "F")], 
-    [("C", "G"), ("D", "H"), ("C", "G"), ("D", "H")],
-    [("I", "J"), ("K", "L"), ("I", "J"), ("K", "L")],
-    [("A", "B"), ("C", "D"), ("A", "B"), ("C", "D")],
-    [("E", "F"), ("G", "H"), ("E", "F"), ("G", "H")],
-    [("A", "I"), ("B", "J"), ("A", "I"), ("B", "J")],
-    [("C", "K"), ("D", "L"), ("C", "K"), ("D", "L")],
-    [("E", "I"), ("F", "J"), ("E", "I"), ("F", "J")],
-    [("G", "K"), ("H", "L"), ("G", "K"), ("H", "L")]
-]
-
-SCHEDULE_TEMPLATE_3COURT = [
-    {"id": 1, "matches": [("reg", "A", "E"), ("reg", "B", "F"), ("mix", "A", "E")]},
-    {"id": 2, "matches": [("reg", "C", "G"), ("mix", "B", "F"), ("mix", "C", "G")]},
-    {"id": 3, "matches": [("reg", "I", "J"), ("reg", "D", "H"), ("mix", "D", "H")]},
-    {"id": 4, "matches": [("reg", "K", "L"), ("mix", "I", "J"), ("mix", "K", "L")]},
-    {"id": 5, "matches": [("reg", "A", "B"), ("reg", "C", "D"), ("mix", "A", "B")]},
-    {"id": 6, "matches": [("reg", "E", "F"), ("mix", "C", "D"), ("mix", "E", "F")]},
-    {"id": 7, "matches": [("reg", "G", "H"), ("reg", "A", "I"), ("mix", "G", "H")]},
-    {"id": 8, "matches": [("reg", "B", "J"), ("mix", "A", "I"), ("mix", "B", "J")]},
-    {"id": 9, "matches": [("reg", "C", "K"), ("reg", "D", "L"), ("mix", "C", "K")]},
-    {"id": 10, "matches": [("reg", "E", "I"), ("mix", "D", "L"), ("mix", "E", "I")]},
-    {"id": 11, "matches": [("reg", "F", "J"), ("reg", "G", "K"), ("mix", "F", "J")]},
-    {"id": 12, "matches": [("reg", "H", "L"), ("mix", "G", "K"), ("mix", "H", "L")]},
-]
-
-TOURN_SCHED_4COURT = [
-    {"cup_display": "パテントクラシカルカップ", "games": [
-        {"league": "reg", "cup": "Classical", "round": "SF1", "court": "A"},
-        {"league": "reg", "cup": "Classical", "round": "SF2", "court": "B"},
-        {"league": "mix", "cup": "Classical", "round": "SF1", "court": "C"},
-        {"league": "mix", "cup": "Classical", "round": "SF2", "court": "D"},
-    ]},
-    {"cup_display": "パテントエリートカップ", "games": [
-        {"league": "reg", "cup": "Elite", "round": "SF1", "court": "A"},
-        {"league": "reg", "cup": "Elite", "round": "SF2", "court": "B"},
-        {"league": "mix", "cup": "Elite", "round": "SF1", "court": "C"},
-        {"league": "mix", "cup": "Elite", "round": "SF2", "court": "D"},
-    ]},
-    {"cup_display": "パテントチャンピオンズカップ", "games": [
-        {"league": "reg", "cup": "Champions", "round": "SF1", "court": "A"},
-        {"league": "reg", "cup": "Champions", "round": "SF2", "court": "B"},
-        {"league": "mix", "cup": "Champions", "round": "SF1", "court": "C"},
-        {"league": "mix", "cup": "Champions", "round": "SF2", "court": "D"},
-    ]},
-    {"cup_display": "パテントクラシカルカップ(決勝)", "games": [
-        {"league": "reg", "cup": "Classical", "round": "Final", "court": "A"},
-        {"league": "reg", "cup": "Classical", "round": "3rd", "court": "B"},
-        {"league": "mix", "cup": "Classical", "round": "Final", "court": "C"},
-        {"league": "mix", "cup": "Classical", "round": "3rd", "court": "D"},
-    ]},
-    {"cup_display": "パテントエリートカップ(決勝)", "games": [
-        {"league": "reg", "cup": "Elite", "round": "Final", "court": "A"},
-        {"league": "reg", "cup": "Elite", "round": "3rd", "court": "B"},
-        {"league": "mix", "cup": "Elite", "round": "Final", "court": "C"},
-        {"league": "mix", "cup": "Elite", "round": "3rd", "court": "D"},
-    ]},
-    {"cup_display": "パテントチャンピオンズカップ(決勝)", "games": [
-        {"league": "reg", "cup": "Champions", "round": "Final", "court": "A"},
-        {"league": "reg", "cup": "Champions", "round": "3rd", "court": "B"},
-        {"league": "mix", "cup": "Champions", "round": "Final", "court": "C"},
-        {"league": "mix", "cup": "Champions", "round": "3rd", "court": "D"},
-    ]},
-]
-
-TOURN_SCHED_3COURT = [
-    {"cup_display": "クラシカルSF", "games": [
-        {"league": "reg", "cup": "Classical", "round": "SF1", "court": "A"},
-        {"league": "reg", "cup": "Classical", "round": "SF2", "court": "B"},
-        {"league": "mix", "cup": "Classical", "round": "SF1", "court": "C"},
-    ]},
-    {"cup_display": "クラシカル/エリートSF", "games": [
-        {"league": "mix", "cup": "Classical", "round": "SF2", "court": "A"},
-        {"league": "reg", "cup": "Elite", "round": "SF1", "court": "B"},
-        {"league": "reg", "cup": "Elite", "round": "SF2", "court": "C"},
-    ]},
-    {"cup_display": "エリート/チャンピオンズSF", "games": [
-        {"league": "mix", "cup": "Elite", "round": "SF1", "court": "A"},
-        {"league": "mix", "cup": "Elite", "round": "SF2", "court": "B"},
-        {"league": "reg", "cup": "Champions", "round": "SF1", "court": "C"},
-    ]},
-    {"cup_display": "チャンピオンズSF", "games": [
-        {"league": "reg", "cup": "Champions", "round": "SF2", "court": "A"},
-        {"league": "mix", "cup": "Champions", "round": "SF1", "court": "B"},
-        {"league": "mix", "cup": "Champions", "round": "SF2", "court": "C"},
-    ]},
-    {"cup_display": "クラシカル決勝", "games": [
-        {"league": "reg", "cup": "Classical", "round": "Final", "court": "A"},
-        {"league": "reg", "cup": "Classical", "round": "3rd", "court": "B"},
-        {"league": "mix", "cup": "Classical", "round": "Final", "court": "C"},
-    ]},
-    {"cup_display": "エリート決勝", "games": [
-        {"league": "mix", "cup": "Classical", "round": "3rd", "court": "A"},
-        {"league": "reg", "cup": "Elite", "round": "Final", "court": "B"},
-        {"league": "reg", "cup": "Elite", "round": "3rd", "court": "C"},
-    ]},
-    {"cup_display": "エリート/チャンピオンズ決勝", "games": [
-        {"league": "mix", "cup": "Elite", "round": "Final", "court": "A"},
-        {"league": "mix", "cup": "Elite", "round": "3rd", "court": "B"},
-        {"league": "reg", "cup": "Champions", "round": "Final", "court": "C"},
-    ]},
-    {"cup_display": "チャンピオンズ決勝", "games": [
-        {"league": "reg", "cup": "Champions", "round": "3rd", "court": "A"},
-        {"league": "mix", "cup": "Champions", "round": "Final", "court": "B"},
-        {"league": "mix", "cup": "Champions", "round": "3rd", "court": "C"},
-    ]},
-]
+def default_data():
+    """初期状態の大会データ（新しい大会のシートと、データの完全初期化で使う）"""
+    return {
+        'app_title': "パテントカップ2025",
+        'teams_reg': DEFAULT_TEAMS_REGULAR.copy(),
+        'teams_mix': DEFAULT_TEAMS_MIX.copy(),
+        'results': {},
+        'tourn_results': {},
+        'court_mode': "4面",
+        'start_time_hour': 13,
+        'start_time_minute': 15,
+        'league_duration': 7,
+        'tourn_duration': 10,
+        'interval_duration': 15,
+        'league_games': 3
+    }
 
 # ==========================================
 # 2. 関数定義 (Google Sheets 対応版)
 # ==========================================
 
-def get_google_sheet():
-    """Googleスプレッドシートに接続する関数"""
-    try:
-        # SecretsからJSONキーの文字列を取得して辞書に変換
-        key_dict = json.loads(st.secrets["GCP_JSON_KEY"])
-        scopes = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
-        creds = Credentials.from_service_account_info(key_dict, scopes=scopes)
-        client = gspread.authorize(creds)
-        
-        # シートを開く
-        sheet_name = st.secrets["SPREADSHEET_NAME"]
-        return client.open(sheet_name).sheet1
-    except Exception as e:
-        st.error(f"スプレッドシート接続エラー: {e}")
-        return None
+def get_tournament_id():
+    """URLパラメータから大会IDを取り出す（シート名に使える英数字・-・_ だけ残す）"""
+    raw = st.query_params.get(TOURNAMENT_PARAM, "")
+    return "".join(ch for ch in raw if ch.isalnum() or ch in "-_")[:50]
+
+@st.cache_resource
+def get_gspread_client():
+    """
+    認証済みの gspread クライアント（プロセス内で共有）。
+    アクセストークンの期限切れは google-auth が自動で更新する。
+    PATENT_CUP_FAKE_SHEETS が設定されていれば、認証せずにプロセス内の偽のシートを返す（負荷試験・計測用）。
+    """
+    with phase("sheets:auth"):
+        # 実際に送ったリクエストの数を sheets_api として数える（append_rows 1回で追記とバージョン更新の2〜3回など）
+        return sheets_client(st.secrets, FAKE_SHEETS, on_request=lambda: count("sheets_api"))
 
-# 修正前
-# def load_data_from_json():
+def open_spreadsheet():
+    """SPREADSHEET_KEY（ID）でスプレッドシートを開く。未設定なら従来どおり名前で探す"""
+    return spreadsheet_from_secrets(get_gspread_client(), st.secrets, fake=FAKE_SHEETS is not None)
 
-@st.cache_data(ttl=30) # キャッシュ時間を少し短くして反応を良くします
-def load_data_from_json():
+@st.cache_resource
+def get_google_sheet(tournament_id=""):
     """
-    【追記型】
-    A1セルの「基本データ」を読み込み、
-    2行目以降の「変更ログ」を全て適用して、最新状態を復元する。
+    Googleスプレッドシートに接続する関数。
+    ワークシートのハンドルは大会ごとにプロセス内で共有する（接続に失敗したら例外）。
+    大会IDが指定されていれば、同じスプレッドシート内の同名ワークシートを使う。
+    ここではワークシートを作らない（無ければ gspread の WorksheetNotFound。作成は create_tournament で行う）。
     """
+    get_gspread_client() # 認証は sheets:auth として別に計測する
+    with phase("sheets:open"):
+        sheet = tournament_worksheet(open_spreadsheet(), tournament_id)
+        if tournament_id and sheet.col_count < SHEET_COLUMNS:
+            sheet.resize(cols=SHEET_COLUMNS) # 1列で作られた大会のシート（B1・C1 に書けない）を広げる
+        return sheet
+
+def listed_tournaments():
+    """secrets の TOURNAMENTS に載っている大会ID（初めて開いたときに自動で作成してよい大会）"""
+    return {t.strip() for t in str(st.secrets.get("TOURNAMENTS", "")).split(",") if t.strip()}
+
+def tournament_exists(tournament_id):
+    """大会のワークシートがあるか（既定の大会は常にある。このプロセスで取り込み済みならシートに問い合わせない）"""
+    if not tournament_id or get_journal().remote_cursor(tournament_id) is not None: return True
+    import gspread
     try:
-        sheet = get_google_sheet()
-        if not sheet: return None
+        get_google_sheet(tournament_id)
+        return True
+    except gspread.exceptions.WorksheetNotFound:
+        return False
+
+def create_tournament(tournament_id):
+    """大会のワークシートを作り、A1/B1 に初期状態を書く（最初の試合結果のログが A1 に入らないように）"""
+    open_spreadsheet().add_worksheet(title=tournament_id, rows=1000, cols=SHEET_COLUMNS)
+    get_google_sheet.clear()
+    write_snapshot(tournament_id, default_data())
+
+def is_auth_error(e):
+    """トークンの更新失敗・401 など、接続を作り直せば直る可能性のあるエラーか"""
+    import gspread
+    from google.auth.exceptions import RefreshError
+    if isinstance(e, RefreshError): return True
+    if isinstance(e, gspread.exceptions.APIError):
+        return getattr(e.response, "status_code", None) == 401
+    return False
 
-        # シートの全データを一括取得（これが一番速い）
-        all_values = sheet.get_all_values()
-        
-        if not all_values: return None
-        
-        # 1行目（A1）は基本データ
-        try:
-            current_data = json.loads(all_values[0][0])
-        except:
-            return None # データが壊れている場合
-
-        # 2行目以降は「変更ログ」なので、順番に適用していく
-        # ログの形式: [json_string] (中身は {'k': match_key, 'v': result, 't': is_tournament})
-        if len(all_values) > 1:
-            for row in all_values[1:]:
-                if row and row[0]:
-                    try:
-                        log = json.loads(row[0])
-                        # ログの内容をデータに上書き適用
-                        m_key = log.get('k')
-                        res = log.get('v')
-                        is_tourn = log.get('t')
-                        
-                        if is_tourn:
-                            current_data['tourn_results'][m_key] = res
-                        else:
-                            current_data['results'][m_key] = res
-                    except:
-                        continue # 壊れたログは無視
-
-        return current_data
-            
+def run_sheet_op(tournament_id, op):
+    """
+    ワークシートに対する操作 op(sheet) を実行する。
+    認証エラーの場合は、クライアントとハンドルを作り直して1回だけ再試行する。
+    操作の時間は sheets:op として計測する（同期スレッドからの呼び出しは background に入る）。
+    """
+    sheet = get_google_sheet(tournament_id)
+    try:
+        with phase("sheets:op"):
+            return op(sheet)
     except Exception as e:
-        return None
+        if not is_auth_error(e): raise
+        get_gspread_client.clear()
+        get_google_sheet.clear()
+        sheet = get_google_sheet(tournament_id)
+        with phase("sheets:op"):
+            return op(sheet)
+
+@st.cache_resource
+def get_journal():
+    """ローカルの SQLite ジャーナル（プロセス内で共有）"""
+    return LocalJournal(os.environ.get("PATENT_CUP_JOURNAL", JOURNAL_FILE))
+
+@st.cache_resource
+def get_publisher(tournament_id=""):
+    """観戦者向けの静的ページの書き出し先（大会ごとのサブディレクトリ。未指定の大会は default）"""
+    return SnapshotPublisher(os.path.join(PUBLISH_DIR, tournament_id or "default"))
+
+@st.cache_resource
+def get_state_cache():
+    """閲覧者向けの表の元になる状態（ジャーナルが変わったときだけ作り直す。プロセス内で共有）"""
+    if STORAGE != "sheets":
+        return StateCache(load_fn=lambda tid: get_storage(tid).load_state())
+    return StateCache(get_journal())
+
+@st.cache_resource
+def get_profiler():
+    """再実行ごとの処理時間の計測（プロセス内で共有。既定では無効）"""
+    return RerunProfiler(enabled=PROFILE)
+
+@st.cache_resource
+def get_sync_worker(tournament_id=""):
+    """
+    ジャーナルとスプレッドシートの同期スレッド（大会ごとに、プロセス内で共有）。
+    溜まったログは append_rows 1回でまとめて送り、シート側の新しいログは PULL_INTERVAL 秒ごとに取り込む。
+    定期的な取り込みは、画面の再実行で touch() された大会だけ（しばらく使われなければスレッドは止まる）。
+    ただし観戦者向けページを書き出す場合（PUBLISH_DIR）は、セッションが無くても取り込み続ける。
+    別プロセスの API（api.py）・書き出し（python publish.py --watch）は、それぞれ自分でシートを取り込む。
+    """
+    return SyncWorker(
+        get_journal(), tournament_id,
+        push_fn=lambda rows: push_rows(tournament_id, rows),
+        pull_fn=lambda cursor: run_sheet_op(tournament_id, lambda sheet: replay_sheet(sheet, cursor)),
+        compact_fn=lambda cursor: run_sheet_op(tournament_id, lambda sheet: compact_sheet(sheet, cursor, NODE_ID)),
+        on_change=get_publisher(tournament_id).publish if PUBLISH_DIR else None,
+        pull_interval=PULL_INTERVAL, idle_backoff=not PUBLISH_DIR,
+    )
+
+@st.cache_resource
+def get_storage(tournament_id=""):
+    """
+    大会データの保存先（STORAGE で選ぶ。大会ごとに、プロセス内で共有）。
+    既定の "sheets" はローカルのジャーナル越し: シート側の状態（A1 + ログ）に、まだシートに取り込まれていない
+    ローカルの書き込みを重ねて読み、書き込みはジャーナルに入れてすぐ戻る（オフラインでも入力できる）。
+    シートを一度も取り込めないまま起動した場合も、送信待ちの書き込みは初期状態に重ねて見せる。
+    それ以外の保存先は、空なら初期状態を書いておく（最初の試合結果のログが、スナップショットの無いところに入らないように）。
+    """
+    kind, _, arg = STORAGE.partition(":")
+    if kind == "sheets":
+        return JournaledStorage(get_sync_worker(tournament_id), lambda data: write_snapshot(tournament_id, data),
+                                empty_state=default_data)
+    if kind == "sqlite":
+        storage = SQLiteStorage(arg or "patent_cup.db")
+    elif kind == "memory":
+        storage = MemoryStorage()
+    elif kind == "postgresql":
+        missing = [name for name in ("sqlalchemy", "psycopg2") if importlib.util.find_spec(name) is None]
+        if missing:
+            raise ImportError(f"PATENT_CUP_STORAGE=postgresql には {', '.join(missing)} が必要です"
+                              "（pip install SQLAlchemy psycopg2-binary。requirements.txt の末尾を参照）")
+        storage = PostgresStorage(st.connection("postgresql", type="sql").engine)
+    else:
+        raise ValueError(f"PATENT_CUP_STORAGE が不正です: {STORAGE}")
+    if storage.load_state() is None:
+        storage.write_snapshot(default_data())
+    return storage
+
+def touch_sync(tournament_id):
+    """この大会を表示中（同期スレッドの取り込み間隔を保つ。ジャーナルを使う保存先だけ）"""
+    if STORAGE == "sheets": get_sync_worker(tournament_id).touch()
+
+def load_data_from_json(tournament_id=""):
+    """
+    【オフライン対応】
+    保存先から最新状態を復元する（既定のジャーナル越しなら、一度もシートを取り込んでいない場合だけ通信する）。
+    """
+    return get_storage(tournament_id).load_state()
+
+def known_version(tournament_id):
+    cursor = get_journal().remote_cursor(tournament_id)
+    return cursor.get('version') if cursor else None
+
+def sheet_storage(tournament_id, sheet):
+    """ワークシートへの書き込み（storage.SheetsStorage）。バージョンはジャーナルに保存したものから進める"""
+    return SheetsStorage(sheet, NODE_ID, known_version=lambda: known_version(tournament_id))
+
+def push_rows(tournament_id, rows):
+    """
+    ログをまとめて追記し、B1のバージョンを進める。
+    まだシートの状態を取り込んでいない場合、A1 が空なら先に初期状態を書く（ログを A1 に書かない）。
+    """
+    cursor = get_journal().remote_cursor(tournament_id)
+    empty_snapshot = default_data() if not cursor or cursor['data'] is None else None
+    run_sheet_op(tournament_id, lambda sheet: sheet_storage(tournament_id, sheet).append_rows(rows, empty_snapshot))
+
+def write_snapshot(tournament_id, data):
+    """
+    シートを一旦クリアして、A1（基本データ）とB1（バージョン）だけ書き直す（data が None ならクリアするだけ）。
+    ジャーナル側のシート状態も書いた内容で置き換える（次回のフルリロードを省く）。
+    """
+    def op(sheet):
+        storage = sheet_storage(tournament_id, sheet)
+        if data is None: storage.reset()
+        else: storage.write_snapshot(data)
+        return storage.cursor
+    cursor = run_sheet_op(tournament_id, op)
+    get_journal().save_remote(tournament_id, cursor, full_reload=True)
+    if PUBLISH_DIR and data is not None: get_publisher(tournament_id).publish(data)
 
 def save_data_to_json():
     """
     【管理者用】
-    現在の最新状態（ログ適用済み）を正として、A1セルを更新し、
-    2行目以降のログを削除してスッキリさせる（スナップショット作成）。
+    設定（タイトル・コート数・時間・チーム名）の変更を、ログとして追記する。
+    試合結果と同じく保存先のログに追記するので、他の端末の入力を消すことはない。
+    ログのスナップショットへの畳み込みは、同期スレッドが行数・サイズ・時間を見て自動で行う。
+    保存先がまだ空の場合だけ、現在の状態でスナップショットを作る。
     """
-    # まず、現在のセッションステートから保存用データを作る
-    data = {
-        'app_title': st.session_state.app_title,
-        'teams_reg': st.session_state.teams_reg,
-        'teams_mix': st.session_state.teams_mix,
-        'results': st.session_state.results,
-        'tourn_results': st.session_state.tourn_results,
-        'court_mode': st.session_state.court_mode,
-        'start_time_hour': st.session_state.start_time_hour,
-        'start_time_minute': st.session_state.start_time_minute,
-        'league_duration': st.session_state.league_duration,
-        'tourn_duration': st.session_state.tourn_duration,
-        'interval_duration': st.session_state.interval_duration
-    }
+    settings = {k: st.session_state[k] for k in SETTINGS_KEYS}
     
+    storage = get_storage(st.session_state.tournament_id)
     try:
-        sheet = get_google_sheet()
-        if sheet:
-            json_str = json.dumps(data, ensure_ascii=False)
-            
-            # シートを一旦クリアして、A1だけ書き直す
-            sheet.clear()
-            sheet.update_cell(1, 1, json_str)
-            
-            # キャッシュクリア
-            load_data_from_json.clear()
-            st.toast("✅ 設定を保存し、データを最適化しました")
+        if storage.load_state() is None:
+            data = dict(settings, results=st.session_state.results, tourn_results=st.session_state.tourn_results)
+            storage.write_snapshot(data)
+        else:
+            storage.append_settings(settings)
+        # チーム数・試合数が変わると対戦表も変わるので、今の対戦表にある試合だけで集計し直す
+        st.session_state.standings = build_standings(st.session_state.results, get_timetable().by_key)
+        st.toast("✅ 設定を保存しました")
     except Exception as e:
         st.error(f"保存エラー: {e}")
 
 def save_specific_match(match_key, new_result_dict, is_tournament=False):
     """
     【追記型・即時反映版】
-    変更内容をログとして追記し、かつ手元の画面表示も即座に更新する。
+    変更内容をログとして保存先に追記し、手元の画面表示も即座に更新する。
+    既定の保存先ではローカルのジャーナルに書き込むだけで、シートへの追記はバックグラウンドでまとめて行う（待ち時間なし・オフラインでも入力できる）。
     """
+    tournament_id = st.session_state.tournament_id
     try:
-        sheet = get_google_sheet()
-        if sheet:
-            # 1. 保存するログデータを作成
-            log_data = {
-                'k': match_key,
-                'v': new_result_dict,
-                't': is_tournament
-            }
-            json_str = json.dumps(log_data, ensure_ascii=False)
-            
-            # 2. Googleスプレッドシートに行追加（Googleが順番制御してくれるので競合しない）
-            sheet.append_row([json_str])
-            
-            # ★ここを追加！ 手元の画面（セッションステート）もすぐに更新して、リロード不要にする
-            if is_tournament:
-                st.session_state.tourn_results[match_key] = new_result_dict
-            else:
-                st.session_state.results[match_key] = new_result_dict
-            
-            # 3. キャッシュをクリア（次に他の人が読み込むときのために）
-            load_data_from_json.clear()
-            
-            st.toast(f"✅ 試合結果を記録しました")
+        # ログに追記する（Googleへの行追加は裏でまとめて行う。順番制御はGoogle側）
+        get_storage(tournament_id).append_result(match_key, new_result_dict, is_tournament)
+        
+        # ★ここを追加！ 手元の画面（セッションステート）もすぐに更新して、リロード不要にする
+        if is_tournament:
+            st.session_state.tourn_results[match_key] = new_result_dict
+        else:
+            # 順位表の集計も差分だけ更新（上書き時は古いスコアを差し引く）
+            update_result(st.session_state.standings, match_key, st.session_state.results.get(match_key), new_result_dict)
+            st.session_state.results[match_key] = new_result_dict
+        
+        st.toast(f"✅ 試合結果を記録しました")
             
     except Exception as e:
         st.error(f"保存エラー: {e}")
 
+def init_auth_state():
+    """ログイン状態の初期化と、URLパラメータによる自動ログイン（大会のデータには触れない）"""
+    if 'auth_status' not in st.session_state:
+        st.session_state.auth_status = None
+
+    # URLパラメータによる自動ログイン
+    query_params = st.query_params
+    if st.session_state.auth_status is None:
+        role = query_params.get("role")
+        if role == "player":
+            st.session_state.auth_status = "view"
+        elif role == "admin_secret":
+            st.session_state.auth_status = "admin"
+
+def render_missing_tournament(tournament_id):
+    """作成されていない大会IDが指定された場合（管理者だけが作成できる）"""
+    st.error(f"大会「{tournament_id}」は見つかりません。URLの大会IDを確認してください。")
+    if st.session_state.auth_status == "admin" and st.button(f"大会「{tournament_id}」を新しく作成する", key="btn_create_tournament"):
+        try:
+            create_tournament(tournament_id)
+            st.rerun()
+        except Exception as e:
+            st.error(f"作成エラー: {e}")
+
 def init_session_state():
+    """大会のデータを読み込む（ログインした後で呼ぶ。存在しない大会なら False）"""
     if 'initialized' not in st.session_state:
-        saved_data = load_data_from_json()
+        tournament_id = get_tournament_id()
+        if tournament_id and STORAGE != "sheets":
+            st.error("大会ID（URLの t）は、保存先が Google スプレッドシートの場合だけ使えます。")
+            return False
+        # 存在しない大会のシートや同期スレッドは作らない（secrets に載っている大会だけは自動で作成する）
+        if not tournament_exists(tournament_id):
+            if tournament_id not in listed_tournaments():
+                render_missing_tournament(tournament_id)
+                return False
+            create_tournament(tournament_id)
+        st.session_state.tournament_id = tournament_id
+        with phase("load"):
+            saved_data = load_data_from_json(st.session_state.tournament_id)
         
         # 変数の初期化
-        st.session_state.auth_status = None
         st.session_state.edit_mode_title = False
         st.session_state.edit_mode_court = False
         st.session_state.edit_mode_settings = False
         st.session_state.edit_mode_teams = False
-        st.session_state.editing_match_id = None
+        st.session_state.editing_matches = set() # スコア入力中の試合（カードごとに開閉する）
 
         if saved_data:
             st.session_state.app_title = saved_data.get('app_title', "パテントカップ2025")
@@ -326,6 +407,7 @@ def init_session_state():
             st.session_state.league_duration = saved_data.get('league_duration', 7)
             st.session_state.tourn_duration = saved_data.get('tourn_duration', 10)
             st.session_state.interval_duration = saved_data.get('interval_duration', 15)
+            st.session_state.league_games = saved_data.get('league_games', 3)
         else:
             if 'app_title' not in st.session_state: st.session_state.app_title = "パテントカップ2025"
             if 'teams_reg' not in st.session_state: st.session_state.teams_reg = DEFAULT_TEAMS_REGULAR.copy()
@@ -338,17 +420,25 @@ def init_session_state():
             if 'league_duration' not in st.session_state: st.session_state.league_duration = 7
             if 'tourn_duration' not in st.session_state: st.session_state.tourn_duration = 10
             if 'interval_duration' not in st.session_state: st.session_state.interval_duration = 15
+            if 'league_games' not in st.session_state: st.session_state.league_games = 3
         
+        # 順位表の集計は、ログを再生した直後のここでだけ全件から作り直す
+        st.session_state.standings = build_standings(st.session_state.results, get_timetable().by_key)
         st.session_state.initialized = True
+    return True
 
-    # URLパラメータによる自動ログイン
-    query_params = st.query_params
-    if st.session_state.auth_status is None:
-        role = query_params.get("role")
-        if role == "player":
-            st.session_state.auth_status = "view"
-        elif role == "admin_secret":
-            st.session_state.auth_status = "admin"
+def clear_login_params():
+    """ログイン用のURLパラメータだけを消す（大会IDは残す）"""
+    if "role" in st.query_params:
+        del st.query_params["role"]
+
+def render_sync_status(match_key):
+    """管理者向け: この試合の結果がシートに届いたかどうか（ジャーナルを使う保存先だけ）"""
+    if STORAGE != "sheets": return
+    state = get_journal().status(st.session_state.tournament_id, match_key)
+    if state == PENDING: st.caption("⏳ 送信待ち")
+    elif state == FAILED: st.caption("⚠️ 送信失敗（自動で再送します）")
+    elif state is not None: st.caption("☁️ 同期済み")
 
 def check_password():
     if st.session_state.auth_status is not None:
@@ -375,83 +465,95 @@ def get_team_name(league, code):
     if league == "reg": return st.session_state.teams_reg.get(code, code)
     else: return st.session_state.teams_mix.get(code, code)
 
+def resize_teams(teams_map, n, name_prefix):
+    """チーム数の変更: 足りない記号を既定名で追加し、余った記号を後ろから削る"""
+    for i in range(n):
+        teams_map.setdefault(team_code(i), f"{name_prefix}{team_code(i)}")
+    for code in list(teams_map)[n:]:
+        del teams_map[code]
+
+def cached_call(name, fn, *args):
+    """
+    lru_cache の関数 fn を呼び、キャッシュの当たり外れを数える。
+    他のセッションと同時に呼んでいると数え間違えることがある（目安）
+    """
+    hits = fn.cache_info().hits
+    value = fn(*args)
+    count(f"cache.{name}.hit" if fn.cache_info().hits > hits else f"cache.{name}.miss")
+    return value
+
 def calculate_standings(league_type):
+    """保持している集計値から順位表を作る（結果の全件走査はしない）"""
     teams_map = st.session_state.teams_reg if league_type == "reg" else st.session_state.teams_mix
-    data = []
-    for code, name in teams_map.items():
-        stats = {"チーム名": name, "Code": code, "勝点": 0, "試合数": 0, "勝": 0, "引": 0, "負": 0, "得点": 0, "失点": 0, "得失差": 0}
-        stats["SortIndex"] = ord(code) - 65
-        for key, res in st.session_state.results.items():
-            if not key.startswith(f"{league_type}_"): continue
-            parts = key.split("_")
-            if len(parts) < 4: continue
-            home_code, away_code = parts[2], parts[3]
-            if res['s1'] is not None and res['s2'] is not None:
-                s1, s2 = res['s1'], res['s2']
-                if code == home_code:
-                    stats["試合数"]+=1; stats["得点"]+=s1; stats["失点"]+=s2; stats["得失差"]+=(s1-s2)
-                    if s1>s2: stats["勝点"]+=3; stats["勝"]+=1
-                    elif s1==s2: stats["勝点"]+=1; stats["引"]+=1
-                    else: stats["負"]+=1
-                elif code == away_code:
-                    stats["試合数"]+=1; stats["得点"]+=s2; stats["失点"]+=s1; stats["得失差"]+=(s2-s1)
-                    if s2>s1: stats["勝点"]+=3; stats["勝"]+=1
-                    elif s2==s1: stats["勝点"]+=1; stats["引"]+=1
-                    else: stats["負"]+=1
-        data.append(stats)
-    df = pd.DataFrame(data)
-    df = df.sort_values(by=["勝点", "得失差", "得点", "SortIndex"], ascending=[False, False, False, True])
-    df.insert(0, "順位", range(1, len(df) + 1))
-    return df
+    with phase(f"standings:{league_type}"):
+        return standings_frame(st.session_state.standings.get(league_type, {}), teams_map)
 
-# --- トーナメント処理 ---
-def get_cup_ranks(cup_name):
-    if cup_name == "Champions": return 0
-    if cup_name == "Elite": return 4
-    if cup_name == "Classical": return 8
-    return 0
+def get_ranks(league_type):
+    """順位順のチーム名（トーナメントの組み合わせ用。順位表の DataFrame は作らない）"""
+    teams_map = st.session_state.teams_reg if league_type == "reg" else st.session_state.teams_mix
+    with phase(f"standings:{league_type}"):
+        return ranked_team_names(st.session_state.standings.get(league_type, {}), teams_map)
 
+def get_rank_codes(league_type):
+    """順位順のチーム記号（チーム名が重なっていても区別したい場合に使う）"""
+    teams_map = st.session_state.teams_reg if league_type == "reg" else st.session_state.teams_mix
+    with phase(f"standings:{league_type}"):
+        return ranked_team_codes(st.session_state.standings.get(league_type, {}), teams_map)
+
+# --- トーナメント処理 ---
 def get_tourn_match_result(match_id):
-    res = st.session_state.tourn_results.get(match_id, {'s1': None, 's2': None, 'pk1': None, 'pk2': None})
-    winner, loser = None, None
-    s1, s2 = res['s1'], res['s2']
-    if s1 is not None and s2 is not None:
-        if s1 > s2: winner, loser = "left", "right"
-        elif s2 > s1: winner, loser = "right", "left"
-        else:
-            pk1, pk2 = res.get('pk1'), res.get('pk2')
-            if pk1 is not None and pk2 is not None:
-                if pk1 > pk2: winner, loser = "left", "right"
-                elif pk2 > pk1: winner, loser = "right", "left"
-    return res, winner, loser
-
-def resolve_tournament_team(league, cup, round_name, ranks_list, match_id_prefix):
-    start_idx = get_cup_ranks(cup)
-    if len(ranks_list) < 12: return None
-    t1, t4 = ranks_list[start_idx], ranks_list[start_idx+3]
-    t2, t3 = ranks_list[start_idx+1], ranks_list[start_idx+2]
-    
-    if round_name == "SF1": return t1
-    if round_name == "SF1_Opp": return t4
-    if round_name == "SF2": return t2
-    if round_name == "SF2_Opp": return t3
-
-    sf1_id = f"{league}_{cup}_SF1"; sf2_id = f"{league}_{cup}_SF2"
-    _, w1, l1 = get_tourn_match_result(sf1_id)
-    _, w2, l2 = get_tourn_match_result(sf2_id)
-    
-    win1 = t1 if w1=="left" else t4 if w1=="right" else None
-    lose1 = t1 if w1=="right" else t4 if w1=="left" else None
-    win2 = t2 if w2=="left" else t3 if w2=="right" else None
-    lose2 = t2 if w2=="right" else t3 if w2=="left" else None
+    return tourn_match_result(st.session_state.tourn_results, match_id)
+
+def start_editing(match_id):
+    st.session_state.editing_matches.add(match_id)
+
+def stop_editing(match_id):
+    st.session_state.editing_matches.discard(match_id)
+
+@st.fragment
+def render_league_card(l_type, match_key, home_name, away_name, court, is_admin):
+    """
+    リーグ戦1試合のカード。入力・修正・中止ではこのカードだけが再実行される。
+    確定したときだけ画面全体を再実行する。
+    """
+    header_color = "#FFF0F5" if l_type == "mix" else "#E6F3FF"
+    # コート名に「コート」を追加
+    header_text = f"{court}コート (MIX)" if l_type == "mix" else f"{court}コート (ガチ)"
 
-    if round_name == "Final": return win1
-    if round_name == "Final_Opp": return win2
-    if round_name == "3rd": return lose1
-    if round_name == "3rd_Opp": return lose2
-    return None
+    with st.container(border=True):
+        st.markdown(f"""<div style="background-color: {header_color}; padding: 8px; border-radius: 5px; margin-bottom: 10px; font-weight: bold;">{header_text}</div>""", unsafe_allow_html=True)
+        st.write(f"**{home_name}** vs **{away_name}**")
+        res = st.session_state.results.get(match_key, {'s1': None, 's2': None})
+        if is_admin:
+            if match_key in st.session_state.editing_matches:
+                c1, c2 = st.columns(2)
+                v1 = c1.number_input("左", value=res['s1'] or 0, key=f"{match_key}_1", label_visibility="collapsed")
+                v2 = c2.number_input("右", value=res['s2'] or 0, key=f"{match_key}_2", label_visibility="collapsed")
+                b1, b2 = st.columns(2)
+                if b1.button("確定", key=f"sv_{match_key}", type="primary"):
+                    # --- 修正前 ---
+                    # st.session_state.results[match_key] = {'s1': v1, 's2': v2}
+                    # save_data_to_json() 
+                    # st.session_state.editing_match_id = None; st.rerun()
 
+                    # --- 修正後 ---
+                    save_specific_match(match_key, {'s1': v1, 's2': v2}, is_tournament=False)
+                    stop_editing(match_key)
+                    st.rerun() # 順位表などはここで1回だけ更新する
+                b2.button("中止", key=f"cn_{match_key}", on_click=stop_editing, args=(match_key,))
+            else:
+                if res['s1'] is not None:
+                    st.markdown(f"### {res['s1']} - {res['s2']}")
+                    render_sync_status(match_key)
+                    st.button("修正", key=f"ed_{match_key}", on_click=start_editing, args=(match_key,))
+                else:
+                    st.button("入力", key=f"in_{match_key}", on_click=start_editing, args=(match_key,))
+        else:
+            st.write(f"### {res['s1']} - {res['s2']}" if res['s1'] is not None else "ー")
+
+@st.fragment
 def render_match_card(league_type, title, match_id, team_l, team_r, court, is_admin):
+    """トーナメント1試合のカード（render_league_card と同じく、入力中はこのカードだけを再実行する）"""
     res, _, _ = get_tourn_match_result(match_id)
     header_color = "#FFF0F5" if league_type == "mix" else "#E6F3FF"
     header_text = f"{title} @ {court}コート"
@@ -463,7 +565,7 @@ def render_match_card(league_type, title, match_id, team_l, team_r, court, is_ad
         st.write(f"**{t_l_show}** vs **{t_r_show}**")
 
         if is_admin:
-            if st.session_state.editing_match_id == match_id:
+            if match_id in st.session_state.editing_matches:
                 c1, c2 = st.columns(2)
                 v1 = c1.number_input("左", value=res['s1'] or 0, key=f"{match_id}_s1", label_visibility="collapsed")
                 v2 = c2.number_input("右", value=res['s2'] or 0, key=f"{match_id}_s2", label_visibility="collapsed")
@@ -482,18 +584,19 @@ def render_match_card(league_type, title, match_id, team_l, team_r, court, is_ad
 
                     # --- 修正後 ---
                     save_specific_match(match_id, {'s1': v1, 's2': v2, 'pk1': pk_v1, 'pk2': pk_v2}, is_tournament=True)
-                    st.session_state.editing_match_id = None
-                    st.rerun()
-                if b2.button("取消", key=f"cn_{match_id}"): st.session_state.editing_match_id = None; st.rerun()
+                    stop_editing(match_id)
+                    st.rerun() # トーナメント表などはここで1回だけ更新する
+                b2.button("取消", key=f"cn_{match_id}", on_click=stop_editing, args=(match_id,))
             else:
                 if res['s1'] is not None:
                     txt = f"{res['s1']}-{res['s2']}"
                     if res['s1'] == res['s2']: txt += f" (PK {res['pk1']}-{res['pk2']})"
                     st.markdown(f"### {txt}")
-                    if st.button("修正", key=f"ed_{match_id}"): st.session_state.editing_match_id = match_id; st.rerun()
+                    render_sync_status(match_id)
+                    st.button("修正", key=f"ed_{match_id}", on_click=start_editing, args=(match_id,))
                 else:
                     if team_l and team_r:
-                        if st.button("入力", key=f"in_{match_id}"): st.session_state.editing_match_id = match_id; st.rerun()
+                        st.button("入力", key=f"in_{match_id}", on_click=start_editing, args=(match_id,))
                     else:
                         st.caption("対戦待ち")
         else:
@@ -509,63 +612,255 @@ def render_graphviz_bracket(cup_name, team_list, league, league_label):
     if len(team_list) < 12:
         st.caption("順位確定後に表示されます")
         return
-    start_idx = get_cup_ranks(cup_name)
-    prefix = f"{league}_{cup_name}"
-    t1, t2, t3, t4 = team_list[start_idx], team_list[start_idx+1], team_list[start_idx+2], team_list[start_idx+3]
-    _, w_sf1, _ = get_tourn_match_result(f"{prefix}_SF1")
-    _, w_sf2, _ = get_tourn_match_result(f"{prefix}_SF2")
-    _, w_fin, _ = get_tourn_match_result(f"{prefix}_Final")
-    _, w_3rd, _ = get_tourn_match_result(f"{prefix}_3rd")
-    
-    f1_name = t1 if w_sf1 == "left" else t4 if w_sf1 == "right" else "SF1勝者"
-    f2_name = t2 if w_sf2 == "left" else t3 if w_sf2 == "right" else "SF2勝者"
-    th1_name = t1 if w_sf1 == "right" else t4 if w_sf1 == "left" else "SF1敗者"
-    th2_name = t2 if w_sf2 == "right" else t3 if w_sf2 == "left" else "SF2敗者"
-    champ_name = f1_name if w_fin == "left" else f2_name if w_fin == "right" else "優勝"
-    third_name = th1_name if w_3rd == "left" else th2_name if w_3rd == "right" else "3位"
-    bg_color = "#FFF0F5" if league == "mix" else "#E6F3FF"
-    third_node_color = "#FFFACD" 
-    dot_code = f"""
-    digraph G {{
-        rankdir=LR; bgcolor="{bg_color}";
-        node [shape=box, style="filled,rounded", fillcolor="white", fontname="Sans-Serif", fontsize=10];
-        edge [penwidth=1.5];
-        subgraph cluster_main {{
-            label="本戦"; style=invis;
-            node [fillcolor="#E6F3FF"] T1 [label="1位: {t1}"]; T4 [label="4位: {t4}"]; T2 [label="2位: {t2}"]; T3 [label="3位: {t3}"];
-            node [fillcolor="#FFF0F5"] F1 [label="{f1_name}"]; F2 [label="{f2_name}"];
-            node [fillcolor="#FFD700"] WIN [label="{champ_name}"];
-            T1 -> F1 [color="{'red' if w_sf1=='left' else 'black'}", penwidth={'2.5' if w_sf1=='left' else '1'}];
-            T4 -> F1 [color="{'red' if w_sf1=='right' else 'black'}", penwidth={'2.5' if w_sf1=='right' else '1'}];
-            T2 -> F2 [color="{'red' if w_sf2=='left' else 'black'}", penwidth={'2.5' if w_sf2=='left' else '1'}];
-            T3 -> F2 [color="{'red' if w_sf2=='right' else 'black'}", penwidth={'2.5' if w_sf2=='right' else '1'}];
-            F1 -> WIN [color="{'red' if w_fin=='left' else 'black'}", penwidth={'2.5' if w_fin=='left' else '1'}];
-            F2 -> WIN [color="{'red' if w_fin=='right' else 'black'}", penwidth={'2.5' if w_fin=='right' else '1'}];
-        }}
-        T3 -> L1 [style=invis, weight=10];
-        subgraph cluster_3rd {{
-            label="3位決定戦"; style=filled; color="{bg_color}";
-            node [fillcolor="#F0F8FF"] L1 [label="{th1_name}"]; L2 [label="{th2_name}"];
-            node [fillcolor="{third_node_color}"] THIRD [label="{third_name}"];
-            L1 -> THIRD [color="{'red' if w_3rd=='left' else 'black'}", penwidth={'2.5' if w_3rd=='left' else '1'}];
-            L2 -> THIRD [color="{'red' if w_3rd=='right' else 'black'}", penwidth={'2.5' if w_3rd=='right' else '1'}];
-        }}
-    }}
+    import graphviz
+    teams, winners = bracket_state(st.session_state.tourn_results, league, cup_name, team_list)
+    with phase(f"bracket:{league}/{cup_name}"):
+        try:
+            # 同じ状態のトーナメント表は、サーバー側で一度だけ描いた SVG を全員に配る
+            st.image(cached_call("bracket_svg", bracket_svg, league, teams, winners))
+        except graphviz.ExecutableNotFound:
+            # dot コマンドが無い環境では、従来どおりブラウザ側で描画する
+            st.graphviz_chart(bracket_dot(league, teams, winners))
+        except graphviz.CalledProcessError:
+            # dot が描画に失敗した場合は、図を諦めて文字だけのトーナメント表にする
+            st.text("\n".join(bracket_text(teams, winners)))
+
+def get_timetable():
+    """
+    現在の設定の対戦表（設定が同じ間は、全セッションで同じコンパイル済みのものを使う）。
+    既定の12チーム構成ならテンプレート、それ以外は自動生成した対戦表になる。
     """
-    st.graphviz_chart(dot_code)
+    ss = st.session_state
+    return cached_call("timetable", compile_timetable, ss.court_mode, tuple(ss.teams_reg), tuple(ss.teams_mix),
+                       ss.start_time_hour, ss.start_time_minute, ss.league_duration, ss.interval_duration, ss.tourn_duration,
+                       ss.league_games)
+
+def render_standings_view(is_admin):
+    df_reg = calculate_standings("reg")
+    df_mix = calculate_standings("mix")
+
+    # カラム設定を追加（チーム名の幅を固定）
+    common_cfg = {"チーム名": st.column_config.TextColumn("チーム名", width="medium")}
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.subheader("🟦 ガチリーグ")
+        with phase("standings_table:reg"):
+            st.dataframe(
+                df_reg.style.background_gradient(subset=['勝点'], cmap='Blues').format(precision=0), 
+                hide_index=True, 
+                column_config=common_cfg
+            )
+    with c2:
+        st.subheader("🟧 MIXリーグ")
+        with phase("standings_table:mix"):
+            st.dataframe(
+                df_mix.style.background_gradient(subset=['勝点'], cmap='Oranges').format(precision=0), 
+                hide_index=True,
+                column_config=common_cfg
+            )
+
+def render_league_view(is_admin):
+    for slot in get_timetable().league_slots:
+        st.markdown(f"#### {slot.title}")
+        cols = st.columns(len(slot.matches))
+        for idx, m in enumerate(slot.matches):
+            home_name = get_team_name(m.league, m.home); away_name = get_team_name(m.league, m.away)
+
+            with cols[idx]:
+                render_league_card(m.league, m.key, home_name, away_name, m.court, is_admin)
+        st.divider()
+
+def render_tournament_view(is_admin):
+    timetable = get_timetable()
+    league_end_time, tourn_start = timetable.league_end, timetable.tournament_start
+    st.info(f"🏆 トーナメント開始: {tourn_start.strftime('%H:%M')} (リーグ終了 {league_end_time.strftime('%H:%M')} + {st.session_state.interval_duration}分後)")
+
+    reg_ranks = get_ranks("reg")
+    mix_ranks = get_ranks("mix")
+
+    for slot in timetable.tournament_slots:
+        st.markdown(f"#### ⏰ {slot.time} - {slot.title}")
+        cols = st.columns(len(slot.matches))
+        for idx_game, m in enumerate(slot.matches):
+            with cols[idx_game]:
+                team_list = reg_ranks if m.league=="reg" else mix_ranks
+                t_left, t_right = tournament_match_teams(st.session_state.tourn_results, m.game, team_list)
+
+                render_match_card(m.league, m.title, m.key, t_left, t_right, m.court, is_admin)
+        st.divider()
+
+def render_bracket_view(is_admin):
+    st.header("決勝トーナメント表")
+    reg_ranks_list = get_ranks("reg")
+    mix_ranks_list = get_ranks("mix")
+
+    c1, c2 = st.columns(2)
+    with c1:
+        st.subheader("🟦 ガチリーグ")
+        render_graphviz_bracket("Champions", reg_ranks_list, "reg", "🟦 パテントチャンピオンズカップ")
+        render_graphviz_bracket("Elite", reg_ranks_list, "reg", "🟦 パテントエリートカップ")
+        render_graphviz_bracket("Classical", reg_ranks_list, "reg", "🟦 パテントクラシカルカップ")
+    with c2:
+        st.subheader("🟧 MIXリーグ")
+        render_graphviz_bracket("Champions", mix_ranks_list, "mix", "🟧 パテントチャンピオンズカップMIX")
+        render_graphviz_bracket("Elite", mix_ranks_list, "mix", "🟧 パテントエリートカップMIX")
+        render_graphviz_bracket("Classical", mix_ranks_list, "mix", "🟧 パテントクラシカルカップMIX")
+
+def parse_team_param():
+    """URLパラメータのチーム指定を (リーグ, チーム記号) にする。無い・存在しないチームなら None"""
+    league, _, code = st.query_params.get(TEAM_PARAM, "").partition("-")
+    teams_map = {"reg": st.session_state.teams_reg, "mix": st.session_state.teams_mix}.get(league)
+    return (league, code) if teams_map and code in teams_map else None
+
+def render_team_view(is_admin):
+    """選手向け: 1チームの試合だけを、次の試合を先頭に表示する（他のチームのカードは作らない）"""
+    options = [("reg", c) for c in st.session_state.teams_reg] + [("mix", c) for c in st.session_state.teams_mix]
+    selected = parse_team_param()
+    team = st.selectbox("チーム", options, index=options.index(selected) if selected in options else 0, key="my_team",
+                        format_func=lambda o: f"{'🟧' if o[0] == 'mix' else '🟦'} {get_team_name(*o)}")
+    league, code = team
+    if st.query_params.get(TEAM_PARAM) != f"{league}-{code}":
+        st.query_params[TEAM_PARAM] = f"{league}-{code}" # このURLを保存しておけば、次回はこのチームから開く
+
+    teams_map = st.session_state.teams_reg if league == "reg" else st.session_state.teams_mix
+    fixtures = team_fixtures(get_timetable(), league, code, teams_map,
+                             st.session_state.results, st.session_state.tourn_results, get_rank_codes(league))
+    upcoming = next_fixture(fixtures)
+    if upcoming:
+        m = upcoming.match
+        note = "（リーグ戦の途中の順位による組み合わせ）" if upcoming.provisional else ""
+        st.success(f"次の試合: {m.time} {m.court}コート vs {upcoming.opponent or '未定'}{note}")
+    else:
+        st.info("予定されている試合はありません")
+
+    for f in fixtures:
+        m = f.match
+        if isinstance(m, LeagueMatch):
+            st.caption(f"{m.time} 第{m.slot+1}試合帯")
+            render_league_card(m.league, m.key, get_team_name(m.league, m.home), get_team_name(m.league, m.away), m.court, is_admin)
+        else:
+            st.caption(f"{m.time} トーナメント" + ("（暫定）" if f.provisional else ""))
+            left, right = (teams_map[code], f.opponent) if f.is_home else (f.opponent, teams_map[code])
+            render_match_card(m.league, m.title, m.key, left, right, m.court, is_admin)
+
+def viewer_page_html(tournament_id):
+    """閲覧者向けの表の HTML（状態のバージョンごとに一度だけ作り、全セッションで同じ文字列を使う）"""
+    touch_sync(tournament_id) # 見ている人がいる間は、シートの新しい結果を取り込み続ける
+    entry = get_state_cache().get(tournament_id)
+    if entry is None: return None
+    page = entry['bodies'].get("viewer")
+    count("cache.viewer_page.hit" if page is not None else "cache.viewer_page.miss")
+    if page is None:
+        page = entry['bodies']["viewer"] = render_fragment(entry['public'])
+    return page
+
+@st.fragment(run_every=REFRESH_SECONDS)
+def render_viewer_page(is_admin):
+    """閲覧者用: 順位表・対戦表・トーナメント表を、ウィジェットを使わない HTML の表で表示する（定期的に読み直す）"""
+    with phase("viewer_page"):
+        page = viewer_page_html(st.session_state.tournament_id)
+    if page is None:
+        st.info("大会データがまだ保存されていません")
+        return
+    st.html(page)
+
+# 画面の切り替え（表示中の画面の関数だけを実行する）
+VIEWS = {
+    "📊 順位表": render_standings_view,
+    "📝 リーグ戦入力": render_league_view,
+    "🏆 トーナメント入力": render_tournament_view,
+    "🌲 トーナメント表": render_bracket_view,
+    "👕 マイチーム": render_team_view,
+}
+# 閲覧者の軽い画面（VIEWER_MODE = "lite"）
+VIEWER_VIEWS = {
+    "📋 速報": render_viewer_page,
+    "👕 マイチーム": render_team_view,
+}
+
+def render_profiler_panel():
+    """管理者設定: 直近の再実行のフェーズごとの処理時間（p50 / p95）と、外部 API・キャッシュの回数"""
+    profiler = get_profiler()
+    st.markdown("##### 処理時間の計測")
+    st.toggle("再実行ごとに処理時間を計測する（全端末）", value=profiler.enabled, key="profiling_enabled",
+              on_change=lambda: setattr(profiler, "enabled", st.session_state.profiling_enabled))
+    phases = profiler.phase_summary()
+    if not phases:
+        if profiler.enabled: st.caption("計測結果はまだありません（次の再実行から記録されます）")
+        return
+    import pandas as pd
+    st.caption(f"直近 {profiler.records.maxlen} 回までの再実行（n: そのフェーズを通った回数）")
+    st.dataframe(pd.DataFrame([{"フェーズ": r['phase'], "n": r['n'], "p50[ms]": r['p50'] * 1e3,
+                                "p95[ms]": r['p95'] * 1e3, "最新[ms]": r['last'] * 1e3} for r in phases]).round(1),
+                 hide_index=True)
+    counters = profiler.counter_summary()
+    if counters:
+        # background: 同期スレッドなど、画面の再実行以外からの回数（計測を有効にしてからの合計）
+        st.dataframe(pd.DataFrame([{"項目": r['counter'], "再実行あたり": round(r['per_rerun'], 2),
+                                    "最新": r['last'], "background": r['background']} for r in counters]),
+                     hide_index=True)
+    background = profiler.background_phase_summary()
+    if background:
+        # 同期スレッドなど、画面の再実行の外での処理時間（シートへの送信・取り込み・圧縮など。1回ごと）
+        st.caption(f"画面の再実行の外（同期スレッド等）の処理時間（フェーズごとに直近 {profiler.records.maxlen} 回まで）")
+        st.dataframe(pd.DataFrame([{"フェーズ": r['phase'], "n": r['n'], "p50[ms]": r['p50'] * 1e3,
+                                    "p95[ms]": r['p95'] * 1e3, "最新[ms]": r['last'] * 1e3} for r in background]).round(1),
+                     hide_index=True)
+    if st.button("計測結果をクリア", key="btn_profile_clear"):
+        profiler.clear()
+        st.rerun()
 
 # ==========================================
 # 4. メイン処理
 # ==========================================
-init_session_state()
+get_profiler().start_rerun()
+with phase("auth"):
+    init_auth_state()
+    authenticated = check_password()
+# 大会のデータはログインした後で読み込む（ログインしていない訪問者にシートや同期スレッドを作らせない）
+if authenticated:
+    with phase("init_session_state"):
+        authenticated = init_session_state()
+    if authenticated:
+        touch_sync(st.session_state.tournament_id)
 
 # --- メイン画面上部の管理者設定（サイドバー廃止） ---
-if check_password():
+if authenticated:
     is_admin = (st.session_state.auth_status == "admin")
     
     # ★【修正】管理者なら、メイン画面の最上部に設定パネルを表示
     if is_admin:
         with st.expander("⚙️ 管理者設定 (設定・リセット)", expanded=False):
+            # 0. シートとの同期状況
+            if STORAGE == "sheets":
+                worker = get_sync_worker(st.session_state.tournament_id)
+                n_pending = get_journal().pending_count(st.session_state.tournament_id)
+                if worker.last_error:
+                    st.warning(f"シートに接続できません（入力はこの端末に保存され、復旧後に送信されます）: {worker.last_error}")
+                if n_pending:
+                    st.warning(f"シート未送信の試合結果: {n_pending}件")
+                else:
+                    st.caption("試合結果は全てシートに送信済みです")
+                if worker.last_compacted_at:
+                    st.caption(f"最後のログ圧縮: {datetime.fromtimestamp(worker.last_compacted_at).strftime('%H:%M:%S')}")
+            else:
+                st.caption(f"保存先: {STORAGE}")
+            if PUBLISH_DIR and STORAGE == "sheets":
+                publisher = get_publisher(st.session_state.tournament_id)
+                if publisher.last_error: st.warning(f"観戦者向けページの書き出しに失敗しました: {publisher.last_error}")
+                elif publisher.last_published_at:
+                    st.caption(f"観戦者向けページの更新: {datetime.fromtimestamp(publisher.last_published_at).strftime('%H:%M:%S')}（{publisher.out_dir}）")
+            if st.button("ログを今すぐ圧縮", key="btn_compact"):
+                try:
+                    if get_storage(st.session_state.tournament_id).compact(): st.toast("✅ ログをスナップショットに畳み込みました")
+                    else: st.info("圧縮するログがないか、他の端末が圧縮中です")
+                except Exception as e:
+                    st.error(f"圧縮エラー: {e}")
+
+            st.markdown("---")
+            render_profiler_panel()
+            
             # 1. タイトル
             st.markdown("##### タイトル設定")
             if not st.session_state.edit_mode_title:
@@ -593,7 +888,7 @@ if check_password():
             # 3. 時間・スケジュール
             st.markdown("##### 時間・スケジュール設定")
             if not st.session_state.edit_mode_settings:
-                st.write(f"開始 {st.session_state.start_time_hour}:{st.session_state.start_time_minute:02d}")
+                st.write(f"開始 {st.session_state.start_time_hour}:{st.session_state.start_time_minute:02d} / リーグ戦 1チーム{st.session_state.league_games}試合")
                 if st.button("編集", key="btn_tm"): st.session_state.edit_mode_settings=True; st.rerun()
             else:
                 c1, c2, c3 = st.columns(3)
@@ -602,10 +897,12 @@ if check_password():
                 n_ld = c3.number_input("リーグ時間(分)", 1, 30, st.session_state.league_duration)
                 n_iv = c1.number_input("インターバル(分)", 0, 60, st.session_state.interval_duration)
                 n_td = c2.number_input("トーナメント時間(分)", 1, 30, st.session_state.tourn_duration)
+                # 3試合以外にすると、リーグ戦の対戦表は自動生成になります
+                n_lg = c3.number_input("リーグ戦の試合数(1チーム)", 1, 59, st.session_state.league_games)
                 if st.button("保存", key="sv_tm"):
                     st.session_state.start_time_hour = nh; st.session_state.start_time_minute = nm
                     st.session_state.league_duration = n_ld; st.session_state.interval_duration = n_iv
-                    st.session_state.tourn_duration = n_td
+                    st.session_state.tourn_duration = n_td; st.session_state.league_games = n_lg
                     save_data_to_json(); st.session_state.edit_mode_settings = False; st.rerun()
             
             st.markdown("---")
@@ -617,12 +914,17 @@ if check_password():
             else:
                 t1, t2 = st.tabs(["ガチ", "MIX"])
                 with t1:
+                    # 12チーム以外にすると、リーグ戦の対戦表は自動生成になります
+                    n_reg = st.number_input("チーム数", 2, 60, len(st.session_state.teams_reg), key="n_reg")
+                    resize_teams(st.session_state.teams_reg, n_reg, "チーム")
                     with st.form("rt"):
-                        for c in "ABCDEFGHIJKL": st.session_state.teams_reg[c] = st.text_input(f"{c}", st.session_state.teams_reg[c])
+                        for c in list(st.session_state.teams_reg): st.session_state.teams_reg[c] = st.text_input(f"{c}", st.session_state.teams_reg[c])
                         st.form_submit_button("保存")
                 with t2:
+                    n_mix = st.number_input("チーム数", 2, 60, len(st.session_state.teams_mix), key="n_mix")
+                    resize_teams(st.session_state.teams_mix, n_mix, "MIXチーム")
                     with st.form("mt"):
-                        for c in "ABCDEFGHIJKL": st.session_state.teams_mix[c] = st.text_input(f"{c}", st.session_state.teams_mix[c])
+                        for c in list(st.session_state.teams_mix): st.session_state.teams_mix[c] = st.text_input(f"{c}", st.session_state.teams_mix[c])
                         st.form_submit_button("保存")
                 if st.button("編集完了（保存）", key="en_te"): 
                     save_data_to_json(); st.session_state.edit_mode_teams=False; st.rerun()
@@ -635,41 +937,25 @@ if check_password():
             
             if st.button("初期化を実行する", type="primary"):
                 if confirm_pass == RESET_PASS:
+                    tournament_id = st.session_state.tournament_id
                     try:
-                        sheet = get_google_sheet()
-                        if sheet:
-                            # 1. デフォルトのデータを作成
-                            default_data = {
-                                'app_title': "パテントカップ2025",
-                                'teams_reg': DEFAULT_TEAMS_REGULAR.copy(),
-                                'teams_mix': DEFAULT_TEAMS_MIX.copy(),
-                                'results': {},
-                                'tourn_results': {},
-                                'court_mode': "4面",
-                                'start_time_hour': 13,
-                                'start_time_minute': 15,
-                                'league_duration': 7,
-                                'tourn_duration': 10,
-                                'interval_duration': 15
-                            }
-                            
-                            # 2. シートを真っ白にする（これで追記されたログも全部消えます）
-                            sheet.clear()
-                            
-                            # 3. A1セルにデフォルトデータを書き込む
-                            sheet.update_cell(1, 1, json.dumps(default_data, ensure_ascii=False))
-                            
-                            # 4. キャッシュをクリア
-                            load_data_from_json.clear()
-                            
-                            # 5. セッションステート（手元の画面）もリセット
-                            st.session_state.clear()
-                            st.query_params.clear()
-                            
-                            st.toast("✅ 全データを初期化しました")
-                            time.sleep(2) # メッセージを読む時間を確保
-                            st.rerun()
-                            
+                        # 1. デフォルトのデータを作成
+                        data = default_data()
+                        
+                        # 2. 保存先を真っ白にして（これで追記されたログも全部消えます。初期化前の送信待ちも捨てる）、
+                        # 3. デフォルトデータをスナップショットとして書き込む（ジャーナル側のシート状態も置き換わる）
+                        storage = get_storage(tournament_id)
+                        storage.reset()
+                        storage.write_snapshot(data)
+                        
+                        # 4. セッションステート（手元の画面）もリセット（大会IDのURLパラメータは残す）
+                        st.session_state.clear()
+                        clear_login_params()
+                        
+                        st.toast("✅ 全データを初期化しました")
+                        time.sleep(2) # メッセージを読む時間を確保
+                        st.rerun()
+                        
                     except Exception as e:
                         st.error(f"初期化エラー: {e}")
                 else:
@@ -678,149 +964,28 @@ if check_password():
         # ログアウトボタン（管理者用）
         if st.button("ログアウト", key="admin_logout"):
             st.session_state.auth_status = None
-            st.query_params.clear()
+            clear_login_params()
             st.rerun()
             
     else:
         # 閲覧者用のログアウトボタン（画面右上あたりに配置したいが、シンプルにタイトル下に配置）
         if st.button("ログアウト", key="viewer_logout"):
             st.session_state.auth_status = None
-            st.query_params.clear()
+            clear_login_params()
             st.rerun()
 
     # === メインコンテンツ ===
     st.title(f"⚽ {st.session_state.app_title}")
+    if st.session_state.tournament_id: st.caption(f"大会ID: {st.session_state.tournament_id}")
     
-    # タブの表示
-    tab1, tab2, tab3, tab4 = st.tabs(["📊 順位表", "📝 リーグ戦入力", "🏆 トーナメント入力", "🌲 トーナメント表"])
-    
-    df_reg = calculate_standings("reg")
-    df_mix = calculate_standings("mix")
-
-    # Tab 1: 順位表
-    with tab1:
-        # カラム設定を追加（チーム名の幅を固定）
-        common_cfg = {"チーム名": st.column_config.TextColumn("チーム名", width="medium")}
-        
-        c1, c2 = st.columns(2)
-        with c1:
-            st.subheader("🟦 ガチリーグ")
-            st.dataframe(
-                df_reg.style.background_gradient(subset=['勝点'], cmap='Blues').format(precision=0), 
-                hide_index=True, 
-                column_config=common_cfg
-            )
-        with c2:
-            st.subheader("🟧 MIXリーグ")
-            st.dataframe(
-                df_mix.style.background_gradient(subset=['勝点'], cmap='Oranges').format(precision=0), 
-                hide_index=True,
-                column_config=common_cfg
-            )
-
-    # Tab 2: リーグ戦
-    with tab2:
-        base_time = datetime(2025, 1, 1, st.session_state.start_time_hour, st.session_state.start_time_minute)
-        court_mode = st.session_state.court_mode
-        matches_to_show = []
-        if court_mode == "4面":
-            for i, slot in enumerate(SCHEDULE_TEMPLATE_4COURT):
-                matches_to_show.append({"time": base_time + timedelta(minutes=i*st.session_state.league_duration), "games": [
-                    {"type": "reg", "c": "A", "p": slot[0]}, {"type": "reg", "c": "B", "p": slot[1]},
-                    {"type": "mix", "c": "C", "p": slot[2]}, {"type": "mix", "c": "D", "p": slot[3]}
-                ]})
-            league_end_time = base_time + timedelta(minutes=9*st.session_state.league_duration)
-        else:
-            for i, slot in enumerate(SCHEDULE_TEMPLATE_3COURT):
-                games = []
-                for idx, m_info in enumerate(slot["matches"]):
-                    games.append({"type": m_info[0], "c": ["A","B","C"][idx], "p": (m_info[1], m_info[2])})
-                matches_to_show.append({"time": base_time + timedelta(minutes=i*st.session_state.league_duration), "games": games})
-            league_end_time = base_time + timedelta(minutes=12*st.session_state.league_duration)
-
-        for i, slot in enumerate(matches_to_show):
-            st.markdown(f"#### 第{i+1}試合帯 ({slot['time'].strftime('%H:%M')})")
-            cols = st.columns(len(slot['games']))
-            for idx, game in enumerate(slot['games']):
-                l_type, court, (home, away) = game['type'], game['c'], game['p']
-                match_key = f"{l_type}_{i}_{home}_{away}"
-                home_name = get_team_name(l_type, home); away_name = get_team_name(l_type, away)
-                
-                with cols[idx]:
-                    header_color = "#FFF0F5" if l_type == "mix" else "#E6F3FF"
-                    # コート名に「コート」を追加
-                    header_text = f"{court}コート (MIX)" if l_type == "mix" else f"{court}コート (ガチ)"
-                    
-                    with st.container(border=True):
-                        st.markdown(f"""<div style="background-color: {header_color}; padding: 8px; border-radius: 5px; margin-bottom: 10px; font-weight: bold;">{header_text}</div>""", unsafe_allow_html=True)
-                        st.write(f"**{home_name}** vs **{away_name}**")
-                        res = st.session_state.results.get(match_key, {'s1': None, 's2': None})
-                        if is_admin:
-                            if st.session_state.editing_match_id == match_key:
-                                c1, c2 = st.columns(2)
-                                v1 = c1.number_input("左", value=res['s1'] or 0, key=f"{match_key}_1", label_visibility="collapsed")
-                                v2 = c2.number_input("右", value=res['s2'] or 0, key=f"{match_key}_2", label_visibility="collapsed")
-                                b1, b2 = st.columns(2)
-                                if b1.button("確定", key=f"sv_{match_key}", type="primary"):
-                                    # --- 修正前 ---
-                                    # st.session_state.results[match_key] = {'s1': v1, 's2': v2}
-                                    # save_data_to_json() 
-                                    # st.session_state.editing_match_id = None; st.rerun()
-
-                                    # --- 修正後 ---
-                                    save_specific_match(match_key, {'s1': v1, 's2': v2}, is_tournament=False)
-                                    st.session_state.editing_match_id = None
-                                    st.rerun()
-                                if b2.button("中止", key=f"cn_{match_key}"): st.session_state.editing_match_id = None; st.rerun()
-                            else:
-                                if res['s1'] is not None:
-                                    st.markdown(f"### {res['s1']} - {res['s2']}")
-                                    if st.button("修正", key=f"ed_{match_key}"): st.session_state.editing_match_id = match_key; st.rerun()
-                                else:
-                                    if st.button("入力", key=f"in_{match_key}"): st.session_state.editing_match_id = match_key; st.rerun()
-                        else:
-                            st.write(f"### {res['s1']} - {res['s2']}" if res['s1'] is not None else "ー")
-            st.divider()
-
-    with tab3:
-        tourn_start = league_end_time + timedelta(minutes=st.session_state.interval_duration)
-        st.info(f"🏆 トーナメント開始: {tourn_start.strftime('%H:%M')} (リーグ終了 {league_end_time.strftime('%H:%M')} + {st.session_state.interval_duration}分後)")
-        
-        reg_ranks = df_reg["チーム名"].tolist()
-        mix_ranks = df_mix["チーム名"].tolist()
-        schedule = TOURN_SCHED_4COURT if st.session_state.court_mode == "4面" else TOURN_SCHED_3COURT
-        
-        for idx_slot, slot in enumerate(schedule):
-            t_str = (tourn_start + timedelta(minutes=idx_slot * st.session_state.tourn_duration)).strftime('%H:%M')
-            st.markdown(f"#### ⏰ {t_str} - {slot['cup_display']}")
-            cols = st.columns(len(slot['games']))
-            for idx_game, game in enumerate(slot['games']):
-                with cols[idx_game]:
-                    m_id = f"{game['league']}_{game['cup']}_{game['round']}"
-                    team_list = reg_ranks if game['league']=="reg" else mix_ranks
-                    if game['round'].startswith("SF"):
-                        t_left = resolve_tournament_team(game['league'], game['cup'], "SF1" if game['round']=="SF1" else "SF2", team_list, "")
-                        t_right = resolve_tournament_team(game['league'], game['cup'], "SF1_Opp" if game['round']=="SF1" else "SF2_Opp", team_list, "")
-                    else:
-                        t_left = resolve_tournament_team(game['league'], game['cup'], game['round'], team_list, "")
-                        t_right = resolve_tournament_team(game['league'], game['cup'], f"{game['round']}_Opp", team_list, "")
-
-                    render_match_card(game['league'], f"{game['cup']} {game['round']}", m_id, t_left, t_right, game['court'], is_admin)
-            st.divider()
-
-    with tab4:
-        st.header("決勝トーナメント表")
-        reg_ranks_list = df_reg["チーム名"].tolist()
-        mix_ranks_list = df_mix["チーム名"].tolist()
-
-        c1, c2 = st.columns(2)
-        with c1:
-            st.subheader("🟦 ガチリーグ")
-            render_graphviz_bracket("Champions", reg_ranks_list, "reg", "🟦 パテントチャンピオンズカップ")
-            render_graphviz_bracket("Elite", reg_ranks_list, "reg", "🟦 パテントエリートカップ")
-            render_graphviz_bracket("Classical", reg_ranks_list, "reg", "🟦 パテントクラシカルカップ")
-        with c2:
-            st.subheader("🟧 MIXリーグ")
-            render_graphviz_bracket("Champions", mix_ranks_list, "mix", "🟧 パテントチャンピオンズカップMIX")
-            render_graphviz_bracket("Elite", mix_ranks_list, "mix", "🟧 パテントエリートカップMIX")
-            render_graphviz_bracket("Classical", mix_ranks_list, "mix", "🟧 パテントクラシカルカップMIX")
+    # 表示中の画面だけを組み立てる（選択はセッションに残るので、再実行しても同じ画面のまま）
+    views = VIEWS if is_admin or VIEWER_MODE == "full" else VIEWER_VIEWS
+    if st.session_state.get("active_view") not in views:
+        st.session_state.pop("active_view", None) # ログインし直して画面の一覧が変わった場合
+    if "active_view" not in st.session_state and parse_team_param():
+        st.session_state.active_view = "👕 マイチーム"
+    view = st.radio("表示", list(views), horizontal=True, key="active_view", label_visibility="collapsed")
+    with phase(f"view:{view}"):
+        views[view](is_admin)
+
+get_profiler().finish_rerun()
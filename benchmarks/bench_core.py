@@ -0,0 +1,312 @@
+"""
+大会ロジックの中核部分のマイクロベンチマーク（回帰の検出用）。
+
+    python benchmarks/bench_core.py                       # 計測して閾値と比べる（超えたものがあれば終了コード 1）
+    python benchmarks/bench_core.py replay standings      # 名前にどれかを含むものだけ計測
+    python benchmarks/bench_core.py --update-thresholds   # 今回の計測値から閾値を作り直す
+
+計測する処理（app.py の再実行のたびに通る、または同期のたびに通るもの）:
+  replay/<行数>       スナップショット + ログ 10〜100,000 行の再生（storage.replay_sheet の全件読み直し）
+  standings/*         全結果からの再集計（build_standings）・順位表の作成（standings_frame）・1試合分の差分更新
+  tournament/*        トーナメント全試合の対戦チームの解決（tournament_match_teams）と結果・勝者の判定
+  bracket/dot         トーナメント表 6 つ分の DOT の生成（Graphviz は呼ばない）
+  timetable/*         リーグ戦の対戦表の作成（12チームはテンプレート、それ以外は自動生成）
+                      compiled/*: 対戦表のコンパイル（compile_timetable）と、コンパイル済みのものの再利用・試合キーからの参照
+                      team/*: 1チームの試合一覧と次の試合（team_fixtures。トーナメントの勝ち上がりの解決を含む）
+  viewer/page/*       閲覧者向けの表の HTML の作成（public_state + render_fragment。状態のバージョンごとに1回）
+チーム数は 12 / 100 / 1,000（各リーグ）の合成データ。
+
+値は1回あたりの最良値。閾値（thresholds.json）は、基準にした環境での計測値に余裕（既定 3 倍）を
+掛けたもの。別の環境で比べる場合は、まずその環境で --update-thresholds してから変更を計測すること。
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bracket import bracket_dot  # noqa: E402
+from journal import new_cursor  # noqa: E402
+from publish import public_state, render_fragment  # noqa: E402
+from schedule import team_code, round_robin_rounds, generate_league_schedule  # noqa: E402
+from standings import LEAGUES, build_standings, standings_frame, update_result  # noqa: E402
+from storage import result_log, replay_sheet  # noqa: E402
+from timetable import compile_timetable, team_fixtures, next_fixture  # noqa: E402
+from tournament import (STANDARD_TEAM_CODES, CUP_ROUNDS, TOURN_SCHED_4COURT, league_slots,  # noqa: E402
+                        league_match_key, tourn_match_result, tournament_match_teams, bracket_state)
+
+THRESHOLDS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "thresholds.json")
+HEADROOM = 3.0
+MIN_THRESHOLD_MS = 0.01
+TEAM_COUNTS = (12, 100, 1000)
+LOG_ROWS = (10, 1000, 10000, 100000)
+GAMES_PER_TEAM = 11
+CUPS = ("Champions", "Elite", "Classical")
+BASE_TIME = datetime(2025, 1, 1, 13, 15)
+
+
+# ==========================================
+# 合成データ
+# ==========================================
+
+def make_teams(n_teams):
+    """リーグごとの {チーム記号: チーム名}（12チームなら既定の A〜L）"""
+    codes = STANDARD_TEAM_CODES if n_teams == 12 else tuple(team_code(i) for i in range(n_teams))
+    return {league: {c: f"{league}チーム{c}" for c in codes} for league in LEAGUES}
+
+
+def make_results(teams, seed=0):
+    """各チームが GAMES_PER_TEAM 試合ずつ戦い終えたリーグ戦の結果"""
+    rnd = random.Random(seed)
+    results = {}
+    for league in LEAGUES:
+        for r, pairs in enumerate(round_robin_rounds(list(teams[league]), GAMES_PER_TEAM)):
+            for home, away in pairs:
+                results[league_match_key(league, r, home, away)] = {'s1': rnd.randint(0, 4), 's2': rnd.randint(0, 4)}
+    return results
+
+
+def make_tourn_results(seed=0):
+    """全カップの全試合が終わったトーナメントの結果（同点は PK で決着）"""
+    rnd = random.Random(seed)
+    tourn_results = {}
+    for league in LEAGUES:
+        for cup in CUPS:
+            for round_name in CUP_ROUNDS:
+                s1, s2 = rnd.randint(0, 3), rnd.randint(0, 3)
+                pk1, pk2 = (5, 4) if s1 == s2 else (None, None)
+                tourn_results[f"{league}_{cup}_{round_name}"] = {'s1': s1, 's2': s2, 'pk1': pk1, 'pk2': pk2}
+    return tourn_results
+
+
+def make_ranks(teams):
+    return {league: list(teams[league].values()) for league in LEAGUES}
+
+
+class _ReplaySheet:
+    """replay_sheet の全件読み直しに必要な get_all_values だけを持つシート"""
+
+    def __init__(self, rows):
+        self.rows = rows
+
+    def get_all_values(self):
+        return self.rows
+
+
+def make_sheet_rows(n_rows, seed=0):
+    """A1（12チームの基本データ）+ リーグ戦・トーナメントの結果ログ n_rows 行"""
+    rnd = random.Random(seed)
+    teams = make_teams(12)
+    snapshot = {'app_title': "ベンチマーク", 'teams_reg': teams["reg"], 'teams_mix': teams["mix"],
+                'results': {}, 'tourn_results': {}, 'court_mode': "4面"}
+    keys = list(make_results(teams))
+    tourn_keys = list(make_tourn_results())
+    rows = [[json.dumps(snapshot, ensure_ascii=False), "1-bench"]]
+    for _ in range(n_rows):
+        if rnd.random() < 0.1:
+            log = result_log(rnd.choice(tourn_keys), {'s1': rnd.randint(0, 3), 's2': rnd.randint(0, 3),
+                                                      'pk1': None, 'pk2': None}, True)
+        else:
+            log = result_log(rnd.choice(keys), {'s1': rnd.randint(0, 4), 's2': rnd.randint(0, 4)})
+        rows.append([json.dumps(log, ensure_ascii=False)])
+    return rows
+
+
+# ==========================================
+# 計測対象（準備をしてから、計測する関数を返す）
+# ==========================================
+
+def prepare_replay(n_rows):
+    sheet = _ReplaySheet(make_sheet_rows(n_rows))
+    return lambda: replay_sheet(sheet, new_cursor())
+
+
+def prepare_build_standings(n_teams):
+    results = make_results(make_teams(n_teams))
+    return lambda: build_standings(results)
+
+
+def prepare_standings_frame(n_teams):
+    teams = make_teams(n_teams)
+    aggregates = build_standings(make_results(teams))
+    return lambda: [standings_frame(aggregates[league], teams[league]) for league in LEAGUES]
+
+
+def prepare_update_result(n_teams):
+    results = make_results(make_teams(n_teams))
+    aggregates = build_standings(results)
+    key = next(iter(results))
+    old, new = results[key], {'s1': 9, 's2': 0}
+    def run():
+        # 上書きして元に戻す（集計値は変わらないので何度でも繰り返せる）
+        update_result(aggregates, key, old, new)
+        update_result(aggregates, key, new, old)
+    return run
+
+
+def prepare_match_teams(n_teams):
+    ranks = make_ranks(make_teams(n_teams))
+    tourn_results = make_tourn_results()
+    games = [game for slot in TOURN_SCHED_4COURT for game in slot['games']]
+    return lambda: [tournament_match_teams(tourn_results, game, ranks[game['league']]) for game in games]
+
+
+def prepare_match_results():
+    tourn_results = make_tourn_results()
+    match_ids = list(tourn_results)
+    return lambda: [tourn_match_result(tourn_results, m_id) for m_id in match_ids]
+
+
+def prepare_bracket_dot():
+    ranks = make_ranks(make_teams(12))
+    tourn_results = make_tourn_results()
+    states = [(league, bracket_state(tourn_results, league, cup, ranks[league])) for league in LEAGUES for cup in CUPS]
+    return lambda: [bracket_dot(league, teams, winners) for league, (teams, winners) in states]
+
+
+def prepare_timetable(n_teams, games_per_team=None):
+    codes = tuple(make_teams(n_teams)["reg"])
+    if n_teams == 12:
+        return lambda: league_slots("4面", codes, codes, BASE_TIME, 7)
+    league_codes = {league: list(codes) for league in LEAGUES}
+    return lambda: generate_league_schedule(league_codes, 4, 7, BASE_TIME, games_per_team)
+
+
+def _timetable_args(n_teams):
+    codes = tuple(make_teams(n_teams)["reg"])
+    # 12チームはテンプレート、それ以外は GAMES_PER_TEAM 試合ずつの自動生成
+    return ("4面", codes, codes, 13, 15, 7, 15, 10, 3 if n_teams == 12 else GAMES_PER_TEAM)
+
+
+def prepare_compile_timetable(n_teams):
+    args = _timetable_args(n_teams)
+    return lambda: compile_timetable.__wrapped__(*args) # キャッシュを通さずに毎回組み立てる
+
+
+def prepare_cached_timetable(n_teams):
+    args = _timetable_args(n_teams)
+    compile_timetable(*args)
+    def run():
+        # 再実行1回分: キャッシュから取り出し、全試合を試合キーで引く
+        timetable = compile_timetable(*args)
+        return [timetable.by_key[m.key] for slot in timetable.league_slots + timetable.tournament_slots for m in slot.matches]
+    return run
+
+
+def prepare_team_fixtures(n_teams):
+    teams = make_teams(n_teams)
+    args = _timetable_args(n_teams)
+    timetable = compile_timetable(*args)
+    results, tourn_results = make_results(teams), make_tourn_results()
+    rank_codes = list(teams["reg"])
+    code = args[1][0]
+    def run():
+        # 再実行1回分: 1チームの試合一覧を作り、次の試合を求める
+        fixtures = team_fixtures(timetable, "reg", code, teams["reg"], results, tourn_results, rank_codes)
+        return next_fixture(fixtures)
+    return run
+
+
+def prepare_viewer_page(n_teams):
+    teams = make_teams(n_teams)
+    data = {'teams_reg': teams["reg"], 'teams_mix': teams["mix"], 'results': make_results(teams),
+            'tourn_results': make_tourn_results()}
+    return lambda: render_fragment(public_state(data))
+
+
+# (名前, 準備する関数, 繰り返し回数)
+CASES = (
+    [(f"replay/{n}", lambda n=n: prepare_replay(n), 3 if n >= 10000 else 10) for n in LOG_ROWS]
+    + [(f"standings/build/{n}", lambda n=n: prepare_build_standings(n), 10) for n in TEAM_COUNTS]
+    + [(f"standings/frame/{n}", lambda n=n: prepare_standings_frame(n), 10) for n in TEAM_COUNTS]
+    + [(f"standings/update/{n}", lambda n=n: prepare_update_result(n), 10) for n in TEAM_COUNTS]
+    + [(f"tournament/teams/{n}", lambda n=n: prepare_match_teams(n), 10) for n in TEAM_COUNTS]
+    + [("tournament/results", prepare_match_results, 10),
+       ("bracket/dot", prepare_bracket_dot, 10),
+       ("timetable/12", lambda: prepare_timetable(12), 10),
+       ("timetable/100", lambda: prepare_timetable(100), 1),
+       (f"timetable/100/{GAMES_PER_TEAM}games", lambda: prepare_timetable(100, GAMES_PER_TEAM), 3),
+       (f"timetable/1000/{GAMES_PER_TEAM}games", lambda: prepare_timetable(1000, GAMES_PER_TEAM), 1),
+       ("timetable/compiled/build/12", lambda: prepare_compile_timetable(12), 10),
+       ("timetable/compiled/cached/12", lambda: prepare_cached_timetable(12), 10),
+       ("timetable/compiled/cached/100", lambda: prepare_cached_timetable(100), 10),
+       ("timetable/team/12", lambda: prepare_team_fixtures(12), 10),
+       ("timetable/team/100", lambda: prepare_team_fixtures(100), 10),
+       ("viewer/page/12", lambda: prepare_viewer_page(12), 10),
+       ("viewer/page/100", lambda: prepare_viewer_page(100), 10)]
+)
+
+
+# ==========================================
+# 計測・閾値
+# ==========================================
+
+def measure(fn, repeat):
+    """1回あたりの最良値 [ms]。短い処理は 0.2 秒程度かかるまでまとめて呼んでから割る"""
+    timer = timeit.Timer(fn)
+    first = timer.timeit(number=1)
+    if first >= 0.2:
+        # 1回で十分に長い処理は、最初の1回も計測値に含める（秒単位の処理を余分に回さない）
+        return min([first] + timer.repeat(repeat=repeat - 1, number=1)) * 1e3
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e3
+
+
+def load_thresholds():
+    if not os.path.exists(THRESHOLDS_FILE): return {}
+    with open(THRESHOLDS_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_thresholds(thresholds):
+    with open(THRESHOLDS_FILE, "w", encoding="utf-8") as f:
+        json.dump(dict(sorted(thresholds.items())), f, indent=2)
+        f.write("\n")
+
+
+def threshold_for(value_ms, headroom):
+    """計測値に余裕を掛けて、有効数字2桁に切り上げた閾値"""
+    value = max(value_ms * headroom, MIN_THRESHOLD_MS)
+    scale = 10 ** (math.floor(math.log10(value)) - 1)
+    return round(math.ceil(value / scale) * scale, 6)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="大会ロジックのマイクロベンチマーク")
+    parser.add_argument("names", nargs="*", help="名前にこの文字列を含むものだけ計測する")
+    parser.add_argument("--update-thresholds", action="store_true", help="計測値から thresholds.json を書き直す")
+    parser.add_argument("--headroom", type=float, default=HEADROOM, help="閾値を作るときに計測値に掛ける倍率")
+    args = parser.parse_args()
+
+    thresholds = load_thresholds()
+    regressions, missing = [], []
+    print(f"{'benchmark':<28} {'best[ms]':>10} {'limit[ms]':>10} {'ratio':>6}")
+    for name, prepare, repeat in CASES:
+        if args.names and not any(s in name for s in args.names): continue
+        value = measure(prepare(), repeat)
+        if args.update_thresholds:
+            thresholds[name] = threshold_for(value, args.headroom)
+        limit = thresholds.get(name)
+        if limit is None:
+            missing.append(name)
+            print(f"{name:<28} {value:>10.3f} {'-':>10} {'-':>6}")
+            continue
+        status = "" if value <= limit else "  REGRESSION"
+        if status: regressions.append(name)
+        print(f"{name:<28} {value:>10.3f} {limit:>10.3f} {value/limit:>6.2f}{status}")
+
+    if args.update_thresholds:
+        save_thresholds(thresholds)
+        print(f"\n{THRESHOLDS_FILE} を更新しました")
+    if missing:
+        print(f"\n閾値が未設定: {', '.join(missing)}（--update-thresholds で追加）")
+    if regressions:
+        sys.exit(f"閾値を超えました: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
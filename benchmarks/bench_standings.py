@@ -0,0 +1,101 @@
+"""
+順位表計算のベンチマーク（12〜1,000チーム）。
+
+    python benchmarks/bench_standings.py
+
+旧来のループ版（チーム数 × 試合数）と、アプリが実際に通る経路を同じ結果で計測し、両者の順位表が一致することも確認する。
+  rebuild  全結果からの再集計（build_standings。ログ再生直後・対戦表が変わったとき）
+  frame    集計値から順位表の DataFrame を作る（standings_frame。画面の表示ごと）
+  update   結果1件の書き込みで集計を更新する（update_result。入力のたび）
+"""
+import copy
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from schedule import team_code  # noqa: E402
+from standings import build_standings, standings_frame, update_result  # noqa: E402
+
+TEAM_COUNTS = [12, 40, 100, 200, 1000]
+GAMES_PER_TEAM = 11
+
+
+def make_results(n_teams, games_per_team, seed=0):
+    """各チームが games_per_team 試合ずつ戦うリーグ戦の結果（サークル方式で対戦を作る）"""
+    rnd = random.Random(seed)
+    codes = [team_code(i) for i in range(n_teams)]
+    ring = codes + ([None] if n_teams % 2 else [])
+    results = {}
+    for rnd_idx in range(min(games_per_team, len(ring) - 1)):
+        for j in range(len(ring) // 2):
+            home, away = ring[j], ring[-1 - j]
+            if home and away:
+                results[f"reg_{rnd_idx}_{home}_{away}"] = {'s1': rnd.randint(0, 4), 's2': rnd.randint(0, 4)}
+        ring = [ring[0], ring[-1]] + ring[1:-1]
+    return {c: f"チーム{c}" for c in codes}, results
+
+
+def legacy_standings(teams_map, results, league_type):
+    """変更前の calculate_standings と同じアルゴリズム（比較用。SortIndex だけは複数文字の記号に対応するため登録順）"""
+    data = []
+    for i, (code, name) in enumerate(teams_map.items()):
+        stats = {"チーム名": name, "Code": code, "勝点": 0, "試合数": 0, "勝": 0, "引": 0, "負": 0, "得点": 0, "失点": 0, "得失差": 0}
+        stats["SortIndex"] = i
+        for key, res in results.items():
+            if not key.startswith(f"{league_type}_"): continue
+            parts = key.split("_")
+            if len(parts) < 4: continue
+            home_code, away_code = parts[2], parts[3]
+            if res['s1'] is not None and res['s2'] is not None:
+                s1, s2 = res['s1'], res['s2']
+                if code == home_code:
+                    stats["試合数"]+=1; stats["得点"]+=s1; stats["失点"]+=s2; stats["得失差"]+=(s1-s2)
+                    if s1>s2: stats["勝点"]+=3; stats["勝"]+=1
+                    elif s1==s2: stats["勝点"]+=1; stats["引"]+=1
+                    else: stats["負"]+=1
+                elif code == away_code:
+                    stats["試合数"]+=1; stats["得点"]+=s2; stats["失点"]+=s1; stats["得失差"]+=(s2-s1)
+                    if s2>s1: stats["勝点"]+=3; stats["勝"]+=1
+                    elif s2==s1: stats["勝点"]+=1; stats["引"]+=1
+                    else: stats["負"]+=1
+        data.append(stats)
+    df = pd.DataFrame(data)
+    df = df.sort_values(by=["勝点", "得失差", "得点", "SortIndex"], ascending=[False, False, False, True])
+    df.insert(0, "順位", range(1, len(df) + 1))
+    return df
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def main():
+    print(f"{'teams':>6} {'matches':>8} {'legacy[ms]':>11} {'rebuild[ms]':>12} {'frame[ms]':>10} {'update[us]':>11} {'speedup':>8}")
+    for n in TEAM_COUNTS:
+        teams_map, results = make_results(n, GAMES_PER_TEAM)
+        repeat = 5 if n <= 200 else 1
+        t_old, df_old = best_of(lambda: legacy_standings(teams_map, results, "reg"), repeat)
+        t_build, agg = best_of(lambda: build_standings(results), repeat)
+        t_frame, df_new = best_of(lambda: standings_frame(agg["reg"], teams_map), repeat)
+        pd.testing.assert_frame_equal(df_old.reset_index(drop=True), df_new.reset_index(drop=True))
+        # 1件の上書き（同じ結果で上書きするので、集計値は変わらない）
+        key, res = next(iter(results.items()))
+        updated = copy.deepcopy(agg)
+        t_update, _ = best_of(lambda: update_result(updated, key, res, res), 1000)
+        assert updated == agg
+        t_app = t_build + t_frame
+        print(f"{n:>6} {len(results):>8} {t_old*1e3:>11.2f} {t_build*1e3:>12.2f} {t_frame*1e3:>10.2f}"
+              f" {t_update*1e6:>11.2f} {t_old/t_app:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+起動直後の速さの計測（予算を超えたら終了コード 1）。
+
+    python benchmarks/bench_startup.py
+
+どの項目も新しいプロセスで計測する（読み込み済みのモジュールが無い、デプロイ直後・再起動直後と同じ状態）。
+  import/<モジュール>   ロジック部分のモジュールの読み込み時間（Streamlit なしで読み込めることも確かめる）
+  render/<場面>         app.py の最初の1回の実行にかかる時間（Streamlit 自体とテスト用の仕組みの読み込みは除く）
+                        シートは偽のシート（fake_sheets.py）、ジャーナルは一時ファイルを使う。
+                        "cold" はジャーナルが空の場合（最初にシートから取り込む）、それ以外は取り込み済みの場合。
+各項目で読み込まれた重いモジュールも表示し、その場面で読み込んではいけないもの（forbidden）が
+読み込まれていれば、時間が予算内でも失敗にする。
+予算はこのリポジトリの開発環境での計測値に余裕を持たせたもの。遅い環境では --scale で緩める。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("pandas", "numpy", "matplotlib", "graphviz", "gspread", "google.auth", "pyarrow")
+
+# (名前, 読み込むモジュール, 予算[ms])
+IMPORTS = [
+    ("import/standings", "standings", 60),
+    ("import/tournament", "tournament", 60),
+    ("import/storage", "storage", 80),
+    ("import/journal", "journal", 60),
+    ("import/bracket", "bracket", 30),
+    ("import/profiler", "profiler", 30),
+]
+LOGIC_FORBIDDEN = ("streamlit", "pandas", "numpy", "graphviz", "gspread")
+
+# (名前, role, 表示する画面, ジャーナルを取り込み済みにするか, 予算[ms], 読み込んではいけないモジュール)
+RENDERS = [
+    ("render/viewer-page", "player", "📋 速報", True, 600, ("pandas", "gspread", "matplotlib")),
+    ("render/viewer-team", "player", "👕 マイチーム", True, 600, ("pandas", "graphviz", "gspread", "matplotlib")),
+    ("render/admin-league", "admin_secret", "📝 リーグ戦入力", True, 800, ("pandas", "graphviz", "gspread", "matplotlib")),
+    ("render/admin-tournament", "admin_secret", "🏆 トーナメント入力", True, 800, ("pandas", "graphviz", "gspread", "matplotlib")),
+    ("render/admin-standings", "admin_secret", "📊 順位表", True, 2500, ("graphviz", "gspread")),
+    ("render/viewer-page-cold", "player", "📋 速報", False, 1500, ("pandas", "graphviz", "matplotlib")),
+]
+
+
+def _heavy():
+    return sorted(m for m in HEAVY_MODULES if m in sys.modules)
+
+
+# ==========================================
+# 子プロセス側
+# ==========================================
+
+def child_import(module):
+    t0 = time.perf_counter()
+    __import__(module)
+    ms = (time.perf_counter() - t0) * 1e3
+    loaded = [m for m in LOGIC_FORBIDDEN if m in sys.modules]
+    return {"ms": ms, "heavy": _heavy(), "loaded": loaded}
+
+
+def _prime_journal(path):
+    """シートから取り込み済みの状態（既定の12チーム・結果なし）をジャーナルに書いておく"""
+    from journal import LocalJournal
+    data = {'app_title': "起動計測", 'teams_reg': {chr(65+i): f"チーム{chr(65+i)}" for i in range(12)},
+            'teams_mix': {chr(65+i): f"MIXチーム{chr(65+i)}" for i in range(12)}, 'results': {}, 'tourn_results': {}}
+    raw = json.dumps(data, ensure_ascii=False)
+    cursor = {'snapshot': raw, 'last_row': 1, 'last_raw': raw, 'data': data, 'version': None,
+              'log_bytes': 0, 'snapshot_at': time.time()}
+    LocalJournal(path).save_remote("", cursor, full_reload=True)
+
+
+def child_render(role, view, primed):
+    from streamlit.testing.v1 import AppTest
+    journal_path = os.path.join(tempfile.mkdtemp(prefix="patent_cup_startup_"), "journal.db")
+    os.environ["PATENT_CUP_JOURNAL"] = journal_path
+    os.environ["PATENT_CUP_FAKE_SHEETS"] = ""
+    if primed:
+        _prime_journal(journal_path)
+        # ジャーナルを用意するために読み込んだモジュールを外し、app.py に読み込ませる
+        for name in [m for m in sys.modules if m.split(".")[0] in ("journal", "storage")]:
+            del sys.modules[name]
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    for key in ("ADMIN_PASS", "VIEW_PASS", "RESET_PASS"):
+        at.secrets[key] = key.lower()
+    at.query_params["role"] = role
+    at.session_state["active_view"] = view
+    before = set(sys.modules)
+    t0 = time.perf_counter()
+    at.run()
+    ms = (time.perf_counter() - t0) * 1e3
+    errors = [str(e.value).splitlines()[0] for e in at.exception]
+    return {"ms": ms, "heavy": sorted(m for m in HEAVY_MODULES if m in sys.modules and m not in before),
+            "errors": errors}
+
+
+# ==========================================
+# 親プロセス側
+# ==========================================
+
+def _run_child(*args):
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", *args], cwd=ROOT,
+                         capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=ROOT))
+    if out.returncode != 0:
+        return {"errors": [(out.stderr.strip().splitlines() or ["(no output)"])[-1]]}
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        sys.path.insert(0, ROOT)
+        if sys.argv[2] == "import":
+            result = child_import(sys.argv[3])
+        else:
+            result = child_render(sys.argv[3], sys.argv[4], sys.argv[5] == "1")
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    parser = argparse.ArgumentParser(description="起動直後の速さの計測")
+    parser.add_argument("--scale", type=float, default=1.0, help="予算に掛ける倍率（遅い環境用）")
+    args = parser.parse_args()
+
+    failures, skipped = [], []
+    print(f"{'item':<28} {'ms':>8} {'budget':>8}  heavy modules")
+    cases = [(name, ("import", module), budget, LOGIC_FORBIDDEN) for name, module, budget in IMPORTS]
+    cases += [(name, ("render", role, view, "1" if primed else "0"), budget, forbidden)
+              for name, role, view, primed, budget, forbidden in RENDERS]
+    for name, child_args, budget, forbidden in cases:
+        result = _run_child(*child_args)
+        budget *= args.scale
+        if result.get("errors"):
+            error = result['errors'][0]
+            # この環境に無い依存（matplotlib など）で描画できない場面は計測しない。それ以外のエラーは失敗
+            if "No module named" in error or "requires matplotlib" in error:
+                skipped.append(name)
+                print(f"{name:<28} {'-':>8} {budget:>8.0f}  skipped: {error}")
+            else:
+                failures.append(name)
+                print(f"{name:<28} {'-':>8} {budget:>8.0f}  ERROR: {error}")
+            continue
+        bad = [m for m in result.get("loaded", result["heavy"]) if m in forbidden]
+        status = ""
+        if result["ms"] > budget: status = "  OVER BUDGET"
+        if bad: status += f"  FORBIDDEN: {', '.join(bad)}"
+        if status: failures.append(name)
+        print(f"{name:<28} {result['ms']:>8.1f} {budget:>8.0f}  {', '.join(result['heavy']) or '-'}{status}")
+
+    if skipped:
+        print(f"\n計測できなかった項目: {', '.join(skipped)}")
+    if failures:
+        sys.exit(f"予算を超えました: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    main()
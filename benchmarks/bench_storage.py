@@ -0,0 +1,79 @@
+"""
+保存先ごとの読み込み・追記・圧縮の所要時間。会場ごとにどの保存先を使うかを、実測で決めるためのもの。
+
+    python benchmarks/bench_storage.py [ログ行数]
+
+計測する保存先は storage_conformance.py と同じ（環境変数で PostgreSQL / スプレッドシート / 遅延を入れた偽のシートを追加）。
+例: PATENT_CUP_BENCH_FAKE_SHEETS="latency=lognormal:150:0.4,seed=1" で、本物に近い通信の遅延での所要時間が分かる。
+計測の前に、その保存先が共通の動作確認を通ることを確かめる。
+  append:  1件追記の中央値
+  load:    スナップショット + ログ行数ぶんの状態を読み込む時間（最良値）
+  compact: ログ行数ぶんを畳み込む時間
+  load(c): 圧縮後の読み込み時間（最良値）
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from storage_conformance import available_backends, base_state, run_checks  # noqa: E402
+
+DEFAULT_LOG_ROWS = 300   # 既定の圧縮の閾値（journal.CompactionPolicy.max_rows）と同じ
+MATCH_KEYS = 132
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench(open_storage, log_rows, seed=0):
+    rnd = random.Random(seed)
+    storage = open_storage()
+    storage.reset()
+    storage.write_snapshot(base_state())
+
+    appends = []
+    for _ in range(log_rows):
+        key = f"reg_{rnd.randrange(MATCH_KEYS)}_A_B"
+        result = {'s1': rnd.randint(0, 4), 's2': rnd.randint(0, 4)}
+        t0 = time.perf_counter()
+        storage.append_result(key, result)
+        appends.append(time.perf_counter() - t0)
+
+    # 別のハンドルで読む（2回目以降に差分だけ読む実装でも、初回の全件読み込みを測る）
+    t_load = best_of(lambda: open_storage().load_state(), 3)
+    t0 = time.perf_counter()
+    storage.compact()
+    t_compact = time.perf_counter() - t0
+    t_load_compacted = best_of(lambda: open_storage().load_state(), 3)
+    storage.reset()
+    return statistics.median(appends), t_load, t_compact, t_load_compacted
+
+
+def main():
+    log_rows = int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_LOG_ROWS
+    backends = {name: make() for name, make in available_backends().items()}
+
+    print("動作確認")
+    failed = [name for name, open_storage in backends.items() if run_checks(name, open_storage)]
+    for name in failed:
+        del backends[name]
+
+    print(f"\nログ {log_rows} 行")
+    print(f"{'backend':>9} {'append[ms]':>11} {'load[ms]':>9} {'compact[ms]':>12} {'load(c)[ms]':>12}")
+    for name, open_storage in backends.items():
+        t_append, t_load, t_compact, t_load_c = bench(open_storage, log_rows)
+        print(f"{name:>9} {t_append*1e3:>11.3f} {t_load*1e3:>9.2f} {t_compact*1e3:>12.2f} {t_load_c*1e3:>12.2f}")
+    if failed:
+        sys.exit(f"動作確認に失敗した保存先は計測していません: {', '.join(failed)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+保存先（storage.py）の共通の動作確認。どの実装も同じ手順で同じ結果になることを確かめる。
+
+    python benchmarks/storage_conformance.py
+
+メモリ・SQLite・プロセス内の偽のスプレッドシート（fake_sheets.py）と、
+app.py の既定（偽のスプレッドシートをローカルのジャーナル越しに使う JournaledStorage）は常に確認する。
+次の環境変数があれば、その保存先も確認する:
+  PATENT_CUP_BENCH_FAKE_SHEETS  偽のスプレッドシートの遅延・割り当て等の仕様（fake_sheets.py 参照）
+  PATENT_CUP_BENCH_DSN          PostgreSQL の接続先（専用スキーマ patent_cup_bench を使う）
+  PATENT_CUP_BENCH_SHEET_KEY    Google スプレッドシートのID（ワークシート patent_cup_bench を使う）
+  GOOGLE_APPLICATION_CREDENTIALS  上のシートにアクセスできるサービスアカウントの JSON キー
+どれも中身は消されるので、本番のデータが入っている場所を指定しないこと。
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage import (MemoryStorage, SQLiteStorage, SheetsStorage, PostgresStorage, JournaledStorage,  # noqa: E402
+                     replay_sheet, compact_sheet)
+from journal import LocalJournal, SyncWorker  # noqa: E402
+from fake_sheets import FakeSheetsService  # noqa: E402
+
+BENCH_SCHEMA = "patent_cup_bench"
+BENCH_WORKSHEET = "patent_cup_bench"
+TID = ""
+
+
+def base_state():
+    return {
+        'app_title': "パテントカップ確認用",
+        'teams_reg': {"A": "チームA", "B": "チームB"},
+        'teams_mix': {"A": "MIXチームA", "B": "MIXチームB"},
+        'results': {},
+        'tourn_results': {},
+        'court_mode': "4面",
+    }
+
+
+# ==========================================
+# 保存先ごとの開き方（同じ保存先を指すハンドルを何度でも開ける関数を返す）
+# ==========================================
+
+def _memory():
+    storage = MemoryStorage()
+    return lambda: storage
+
+
+def _sqlite():
+    path = os.path.join(tempfile.mkdtemp(prefix="patent_cup_"), "storage.db")
+    return lambda: SQLiteStorage(path)
+
+
+def _fake_sheets(spec=""):
+    sheet = FakeSheetsService.from_spec(spec).open_by_key(BENCH_WORKSHEET).sheet1
+    return lambda: SheetsStorage(sheet)
+
+
+def _journaled(spec=""):
+    """
+    app.get_storage の既定と同じ組み立て（ジャーナル・同期スレッド・シートへの書き込みを app.py と同じ関数で行う）。
+    ハンドルを開くたびに、前の同期スレッドを止めて同じファイルのジャーナルを開き直す（アプリの再起動にあたる）。
+    """
+    sheet = FakeSheetsService.from_spec(spec).open_by_key(BENCH_WORKSHEET).sheet1
+    path = os.path.join(tempfile.mkdtemp(prefix="patent_cup_"), "journal.db")
+    opened = []
+
+    def open_storage():
+        if opened: opened.pop().worker.stop()
+        journal = LocalJournal(path)
+
+        def sheet_storage():
+            return SheetsStorage(sheet, known_version=lambda: (journal.remote_cursor(TID) or {}).get('version'))
+
+        def write(data):
+            storage = sheet_storage()
+            if data is None: storage.reset()
+            else: storage.write_snapshot(data)
+            journal.save_remote(TID, storage.cursor, full_reload=True)
+
+        worker = SyncWorker(
+            journal, TID,
+            push_fn=lambda rows: sheet_storage().append_rows(rows),
+            pull_fn=lambda cursor: replay_sheet(sheet, cursor),
+            compact_fn=lambda cursor: compact_sheet(sheet, cursor, "conformance"),
+            interval=0.01, pull_interval=0.05,
+        )
+        opened.append(JournaledStorage(worker, write))
+        return opened[0]
+
+    return open_storage
+
+
+def _postgres(dsn):
+    from sqlalchemy import create_engine, text
+    with create_engine(dsn).begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA IF NOT EXISTS {BENCH_SCHEMA}"))
+    engine = create_engine(dsn, connect_args={"options": f"-csearch_path={BENCH_SCHEMA}"})
+    return lambda: PostgresStorage(engine)
+
+
+def _sheets(sheet_key, credentials_file):
+    import gspread
+    client = gspread.service_account(filename=credentials_file)
+    spreadsheet = client.open_by_key(sheet_key)
+    try:
+        sheet = spreadsheet.worksheet(BENCH_WORKSHEET)
+    except gspread.exceptions.WorksheetNotFound:
+        sheet = spreadsheet.add_worksheet(title=BENCH_WORKSHEET, rows=1000, cols=3)
+    return lambda: SheetsStorage(sheet)
+
+
+def available_backends():
+    """{名前: 開く関数}（環境変数が無い保存先は含めない）"""
+    backends = {"memory": _memory, "sqlite": _sqlite, "fake": _fake_sheets, "journal": _journaled}
+    if os.environ.get("PATENT_CUP_BENCH_FAKE_SHEETS"):
+        backends["fake(env)"] = lambda: _fake_sheets(os.environ["PATENT_CUP_BENCH_FAKE_SHEETS"])
+        backends["journal(env)"] = lambda: _journaled(os.environ["PATENT_CUP_BENCH_FAKE_SHEETS"])
+    if os.environ.get("PATENT_CUP_BENCH_DSN"):
+        backends["postgres"] = lambda: _postgres(os.environ["PATENT_CUP_BENCH_DSN"])
+    if os.environ.get("PATENT_CUP_BENCH_SHEET_KEY") and os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"):
+        backends["sheets"] = lambda: _sheets(os.environ["PATENT_CUP_BENCH_SHEET_KEY"],
+                                             os.environ["GOOGLE_APPLICATION_CREDENTIALS"])
+    return backends
+
+
+# ==========================================
+# 確認項目（open_storage: 同じ保存先のハンドルを返す関数）
+# ==========================================
+
+def check_empty(open_storage):
+    storage = open_storage()
+    storage.reset()
+    assert storage.load_state() is None, "reset の後は None"
+    assert open_storage().load_state() is None, "別のハンドルからも None"
+
+
+def check_snapshot_roundtrip(open_storage):
+    storage = open_storage()
+    storage.reset()
+    storage.write_snapshot(base_state())
+    assert storage.load_state() == base_state()
+    assert open_storage().load_state() == base_state(), "別のハンドルから同じ状態が読める"
+
+
+def check_latest_result_wins(open_storage):
+    storage = open_storage()
+    storage.reset()
+    storage.write_snapshot(base_state())
+    storage.append_result("reg_0_A_B", {'s1': 1, 's2': 0})
+    storage.append_result("mix_0_A_B", {'s1': 2, 's2': 2})
+    storage.append_result("reg_0_A_B", {'s1': 3, 's2': 1})
+    storage.append_result("reg_0_A_B", {'s1': None, 's2': None, 'pk1': None, 'pk2': None}, is_tournament=True)
+    state = open_storage().load_state()
+    assert state['results'] == {"reg_0_A_B": {'s1': 3, 's2': 1}, "mix_0_A_B": {'s1': 2, 's2': 2}}
+    # リーグ戦とトーナメントは同じキーでも別物
+    assert state['tourn_results'] == {"reg_0_A_B": {'s1': None, 's2': None, 'pk1': None, 'pk2': None}}
+    assert state['teams_reg'] == base_state()['teams_reg'], "スナップショットの他の項目はそのまま"
+
+
+def check_settings_overlay(open_storage):
+    storage = open_storage()
+    storage.reset()
+    storage.write_snapshot(base_state())
+    storage.append_result("reg_0_A_B", {'s1': 1, 's2': 0})
+    storage.append_settings({'app_title': "変更後", 'court_mode': "3面"})
+    storage.append_settings({'court_mode': "4面"}) # 一部の項目だけの変更も、前の変更に重なる
+    storage.append_result("reg_1_A_B", {'s1': 0, 's2': 2})
+    state = open_storage().load_state()
+    assert state['app_title'] == "変更後" and state['court_mode'] == "4面"
+    assert state['teams_reg'] == base_state()['teams_reg'], "変更していない項目はそのまま"
+    assert state['results'] == {"reg_0_A_B": {'s1': 1, 's2': 0}, "reg_1_A_B": {'s1': 0, 's2': 2}}, "設定の前後の結果も残る"
+    storage.compact()
+    assert open_storage().load_state() == state, "圧縮しても設定の変更は残る"
+
+
+def check_returned_state_is_a_copy(open_storage):
+    storage = open_storage()
+    storage.reset()
+    storage.write_snapshot(base_state())
+    storage.append_result("reg_0_A_B", {'s1': 1, 's2': 0})
+    state = storage.load_state()
+    state['results']["reg_0_A_B"]['s1'] = 99
+    state['app_title'] = "書き換え"
+    again = storage.load_state()
+    assert again['results']["reg_0_A_B"] == {'s1': 1, 's2': 0}
+    assert again['app_title'] == base_state()['app_title']
+
+
+def check_compact_keeps_state(open_storage):
+    storage = open_storage()
+    storage.reset()
+    storage.write_snapshot(base_state())
+    for i in range(20):
+        storage.append_result(f"reg_{i % 5}_A_B", {'s1': i, 's2': 0})
+    before = storage.load_state()
+    assert storage.compact(), "ログがあれば畳み込む"
+    assert storage.load_state() == before
+    assert open_storage().load_state() == before
+    # 圧縮の後の追記も、圧縮後のスナップショットに重なる
+    storage.append_result("reg_0_A_B", {'s1': 0, 's2': 7})
+    after = open_storage().load_state()
+    assert after['results']["reg_0_A_B"] == {'s1': 0, 's2': 7}
+    assert after['results']["reg_4_A_B"] == before['results']["reg_4_A_B"]
+
+
+def check_compact_without_snapshot(open_storage):
+    storage = open_storage()
+    storage.reset()
+    assert not storage.compact(), "スナップショットが無ければ何もしない"
+    assert storage.load_state() is None
+
+
+def check_write_snapshot_discards_log(open_storage):
+    storage = open_storage()
+    storage.reset()
+    storage.write_snapshot(base_state())
+    storage.append_result("reg_0_A_B", {'s1': 1, 's2': 0})
+    replaced = dict(base_state(), app_title="差し替え")
+    storage.write_snapshot(replaced)
+    assert open_storage().load_state() == replaced
+
+
+def check_reset_clears(open_storage):
+    storage = open_storage()
+    storage.write_snapshot(base_state())
+    storage.append_result("reg_0_A_B", {'s1': 1, 's2': 0})
+    storage.reset()
+    assert open_storage().load_state() is None
+
+
+def check_reopen_replays_log(open_storage):
+    storage = open_storage()
+    storage.reset()
+    storage.write_snapshot(base_state())
+    storage.append_result("reg_0_A_B", {'s1': 1, 's2': 0})
+    storage.append_settings({'app_title': "再起動前"})
+    storage.append_result("reg_0_A_B", {'s1': 2, 's2': 0})
+    expected = dict(base_state(), app_title="再起動前", results={"reg_0_A_B": {'s1': 2, 's2': 0}})
+    # 開き直した直後（送信待ちが残っていても）と、そこからさらに開き直して最後まで読み直した後で同じ
+    reopened = open_storage()
+    assert reopened.load_state() == expected, "開き直しても、それまでの追記が順に重なる"
+    reopened.compact()
+    assert open_storage().load_state() == expected, "開き直した先で送信・圧縮しても変わらない"
+    open_storage().append_settings({'court_mode': "3面"})
+    assert open_storage().load_state() == dict(expected, court_mode="3面"), "開き直した後の追記も重なる"
+
+
+CHECKS = [
+    check_empty,
+    check_snapshot_roundtrip,
+    check_latest_result_wins,
+    check_settings_overlay,
+    check_returned_state_is_a_copy,
+    check_compact_keeps_state,
+    check_compact_without_snapshot,
+    check_write_snapshot_discards_log,
+    check_reset_clears,
+    check_reopen_replays_log,
+]
+
+
+def run_checks(name, open_storage):
+    """全項目を実行して、失敗した項目の数を返す"""
+    failures = 0
+    for check in CHECKS:
+        try:
+            check(open_storage)
+            print(f"  ok    {name}: {check.__name__}")
+        except Exception as e:
+            failures += 1
+            print(f"  FAIL  {name}: {check.__name__}: {type(e).__name__}: {e}")
+    return failures
+
+
+def main():
+    failures = 0
+    for name, make in available_backends().items():
+        failures += run_checks(name, make())
+    if failures:
+        sys.exit(f"{failures} 件の確認に失敗しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+決勝トーナメント表の描画（Streamlit に依存しない）。
+
+トーナメント表は「4チーム + 準決勝・決勝・3位決定戦の勝者」だけで決まるので、
+その組ごとに一度だけサーバー側で Graphviz のレイアウトを行い、SVG をプロセス内で使い回す。
+観戦者の端末でレイアウトし直す（st.graphviz_chart）必要がなくなる。
+"""
+from functools import lru_cache
+
+# 6つのトーナメント × 試合の進み具合、が同時に何通りか入る程度
+BRACKET_CACHE_SIZE = 128
+
+
+def dot_label(text):
+    """DOT の "..." の中にそのまま書ける文字列にする（チーム名の " や \\ でグラフの記述が壊れないように）"""
+    text = str(text)
+    if '"' in text or "\\" in text or "\n" in text or "\r" in text:
+        return text.replace("\\", "\\\\").replace('"', '\\"').replace("\r", "").replace("\n", "\\n")
+    return text
+
+
+def bracket_names(teams, winners):
+    """
+    各枠に入るチーム名 (決勝の2チーム, 3位決定戦の2チーム, 優勝, 3位)（決まっていない枠は "SF1勝者" などの仮の名前）。
+    teams: (1位, 2位, 3位, 4位) のチーム名
+    winners: (SF1, SF2, 決勝, 3位決定戦) の勝者 "left" / "right" / None
+    """
+    t1, t2, t3, t4 = teams
+    w_sf1, w_sf2, w_fin, w_3rd = winners
+    f1 = t1 if w_sf1 == "left" else t4 if w_sf1 == "right" else "SF1勝者"
+    f2 = t2 if w_sf2 == "left" else t3 if w_sf2 == "right" else "SF2勝者"
+    th1 = t1 if w_sf1 == "right" else t4 if w_sf1 == "left" else "SF1敗者"
+    th2 = t2 if w_sf2 == "right" else t3 if w_sf2 == "left" else "SF2敗者"
+    champ = f1 if w_fin == "left" else f2 if w_fin == "right" else "優勝"
+    third = th1 if w_3rd == "left" else th2 if w_3rd == "right" else "3位"
+    return f1, f2, th1, th2, champ, third
+
+
+def bracket_text(teams, winners):
+    """図を描けないとき用の、文字だけのトーナメント表（1行ずつのリスト）"""
+    t1, t2, t3, t4 = teams
+    f1, f2, th1, th2, champ, third = bracket_names(teams, winners)
+    return [
+        f"準決勝1: {t1}（1位） vs {t4}（4位）",
+        f"準決勝2: {t2}（2位） vs {t3}（3位）",
+        f"決勝: {f1} vs {f2} → {champ}",
+        f"3位決定戦: {th1} vs {th2} → {third}",
+    ]
+
+
+def bracket_dot(league, teams, winners):
+    """
+    teams: (1位, 2位, 3位, 4位) のチーム名
+    winners: (SF1, SF2, 決勝, 3位決定戦) の勝者 "left" / "right" / None
+    チーム名は dot_label でエスケープして埋め込む。
+    """
+    w_sf1, w_sf2, w_fin, w_3rd = winners
+    # 仮の名前（"SF1勝者" など）はエスケープ不要なので、チーム名だけ先にエスケープしてから枠に入れる
+    teams = tuple(map(dot_label, teams))
+    t1, t2, t3, t4 = teams
+    f1_name, f2_name, th1_name, th2_name, champ_name, third_name = bracket_names(teams, winners)
+    bg_color = "#FFF0F5" if league == "mix" else "#E6F3FF"
+    third_node_color = "#FFFACD"
+    return f"""
+    digraph G {{
+        rankdir=LR; bgcolor="{bg_color}";
+        node [shape=box, style="filled,rounded", fillcolor="white", fontname="Sans-Serif", fontsize=10];
+        edge [penwidth=1.5];
+        subgraph cluster_main {{
+            label="本戦"; style=invis;
+            node [fillcolor="#E6F3FF"] T1 [label="1位: {t1}"]; T4 [label="4位: {t4}"]; T2 [label="2位: {t2}"]; T3 [label="3位: {t3}"];
+            node [fillcolor="#FFF0F5"] F1 [label="{f1_name}"]; F2 [label="{f2_name}"];
+            node [fillcolor="#FFD700"] WIN [label="{champ_name}"];
+            T1 -> F1 [color="{'red' if w_sf1=='left' else 'black'}", penwidth={'2.5' if w_sf1=='left' else '1'}];
+            T4 -> F1 [color="{'red' if w_sf1=='right' else 'black'}", penwidth={'2.5' if w_sf1=='right' else '1'}];
+            T2 -> F2 [color="{'red' if w_sf2=='left' else 'black'}", penwidth={'2.5' if w_sf2=='left' else '1'}];
+            T3 -> F2 [color="{'red' if w_sf2=='right' else 'black'}", penwidth={'2.5' if w_sf2=='right' else '1'}];
+            F1 -> WIN [color="{'red' if w_fin=='left' else 'black'}", penwidth={'2.5' if w_fin=='left' else '1'}];
+            F2 -> WIN [color="{'red' if w_fin=='right' else 'black'}", penwidth={'2.5' if w_fin=='right' else '1'}];
+        }}
+        T3 -> L1 [style=invis, weight=10];
+        subgraph cluster_3rd {{
+            label="3位決定戦"; style=filled; color="{bg_color}";
+            node [fillcolor="#F0F8FF"] L1 [label="{th1_name}"]; L2 [label="{th2_name}"];
+            node [fillcolor="{third_node_color}"] THIRD [label="{third_name}"];
+            L1 -> THIRD [color="{'red' if w_3rd=='left' else 'black'}", penwidth={'2.5' if w_3rd=='left' else '1'}];
+            L2 -> THIRD [color="{'red' if w_3rd=='right' else 'black'}", penwidth={'2.5' if w_3rd=='right' else '1'}];
+        }}
+    }}
+    """
+
+
+@lru_cache(maxsize=BRACKET_CACHE_SIZE)
+def bracket_svg(league, teams, winners):
+    """
+    トーナメント表の SVG（状態ごとにキャッシュし、古いものから捨てる）。
+    teams / winners はキャッシュのキーになるのでタプルで渡す。
+    Graphviz の dot コマンドが無い環境では graphviz.ExecutableNotFound、描画に失敗すれば graphviz.CalledProcessError になる。
+    """
+    import graphviz # DOT の生成だけなら不要なので、描画するときに読み込む
+    return graphviz.Source(bracket_dot(league, teams, winners)).pipe(format="svg", encoding="utf-8")
@@ -0,0 +1,341 @@
+"""
+プロセス内で動く Google スプレッドシートの代わり（Streamlit に依存しない）。
+
+GCP の認証情報もネットワークも無い環境で、シートとの通信部分を負荷試験・計測するためのもの。
+app.py / storage.py が使う gspread のワークシートの操作（get_all_values・get・batch_get・append_row(s)・
+update・update_cell・batch_update・resize・clear、スプレッドシートの batch_update）だけを真似る。
+遅延・429（割り当て超過）・障害は設定で入れられ、乱数の種を固定すれば毎回同じ順で起きる。
+
+    service = FakeSheetsService.from_spec("latency=lognormal:150:0.4,write_quota=60,error_rate=0.01,seed=1")
+    sheet = service.open_by_key("bench").sheet1
+
+仕様文字列（"," 区切りの key=value。空文字列なら遅延・障害なし）:
+  latency=...      1回の通信の遅延 [ms]。const:100 / uniform:50:300 / lognormal:中央値:σ
+  read_quota=N     読み込みの割り当て（1分あたりの回数）。超えたら 429
+  write_quota=N    書き込みの割り当て（1分あたりの回数）。超えたら 429
+  error_rate=P     確率 P で 503 を返す
+  seed=N           乱数の種
+
+ワークシートの大きさ（行数・列数）も本物と同じく守り、範囲外への書き込みは 400（exceeds grid limits）にする。
+追記（append_row(s)）だけは、本物と同じく足りない行を増やす。
+遅延は半分を「届くまで」、残りを「返るまで」に振り分け、シートへの反映は届いた時点で行う。
+そのため、複数のスレッドから同時に追記すると、本物と同じく呼び出した順と行の順が入れ替わることがある。
+app.py では環境変数 PATENT_CUP_FAKE_SHEETS に仕様文字列を設定すると、本物の代わりにこれを使う。
+"""
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, deque
+
+from gspread.exceptions import APIError, WorksheetNotFound
+
+QUOTA_WINDOW = 60.0 # 割り当ての集計期間 [秒]（Sheets API と同じく1分あたり）
+
+
+# ==========================================
+# 遅延の分布
+# ==========================================
+
+def parse_latency(spec):
+    """遅延の指定から、乱数生成器を受け取って遅延 [秒] を返す関数を作る"""
+    kind, *args = spec.split(":")
+    args = [float(a) for a in args]
+    if kind == "const" and len(args) == 1:
+        return lambda rnd: args[0] / 1000
+    if kind == "uniform" and len(args) == 2:
+        return lambda rnd: rnd.uniform(args[0], args[1]) / 1000
+    if kind == "lognormal" and len(args) == 2:
+        return lambda rnd: rnd.lognormvariate(math.log(args[0]), args[1]) / 1000
+    raise ValueError(f"latency の指定が不正です: {spec}")
+
+
+# ==========================================
+# エラー
+# ==========================================
+
+class _Response:
+    """APIError が参照する requests.Response の一部"""
+
+    def __init__(self, code, status, message):
+        self.status_code = code
+        self._error = {"code": code, "status": status, "message": message}
+        self.text = message
+
+    def json(self):
+        return {"error": self._error}
+
+
+def quota_error():
+    return APIError(_Response(429, "RESOURCE_EXHAUSTED", "Quota exceeded (fake sheets)"))
+
+
+def grid_error(range_name):
+    return APIError(_Response(400, "INVALID_ARGUMENT", f"Range ({range_name}) exceeds grid limits (fake sheets)"))
+
+
+def unavailable_error():
+    return APIError(_Response(503, "UNAVAILABLE", "The service is currently unavailable (fake sheets)"))
+
+
+# ==========================================
+# A1 形式の範囲
+# ==========================================
+
+_CELL = re.compile(r"^([A-Z]+)(\d*)$")
+
+
+def _column_index(letters):
+    n = 0
+    for ch in letters:
+        n = n * 26 + ord(ch) - 64
+    return n - 1
+
+
+def parse_range(range_name):
+    """"A1" / "A5:A" / "A1:B1" を (開始行, 開始列, 終了行 or None, 終了列)（0始まり・終端を含む）にする"""
+    start, _, end = range_name.partition(":")
+    m = _CELL.match(start)
+    if not m or not m.group(2): raise ValueError(f"範囲の指定が不正です: {range_name}")
+    r0, c0 = int(m.group(2)) - 1, _column_index(m.group(1))
+    if not end: return r0, c0, r0, c0
+    m = _CELL.match(end)
+    if not m: raise ValueError(f"範囲の指定が不正です: {range_name}")
+    return r0, c0, (int(m.group(2)) - 1 if m.group(2) else None), _column_index(m.group(1))
+
+
+def _trim(rows):
+    """gspread と同じく、各行の末尾の空セルと、末尾の空行を落とす"""
+    out = []
+    for row in rows:
+        while row and row[-1] == "": row = row[:-1]
+        out.append(row)
+    while out and not out[-1]: out.pop()
+    return out
+
+
+# ==========================================
+# サービス・スプレッドシート・ワークシート
+# ==========================================
+
+class FakeSheetsService:
+    """
+    gspread のクライアントの代わり（open_by_key / open でスプレッドシートを返す）。
+    全スプレッドシートで遅延・割り当て・障害の設定と、呼び出しの集計（stats）を共有する。
+    """
+
+    def __init__(self, latency=None, read_quota=None, write_quota=None, error_rate=0.0, seed=None):
+        self.latency = parse_latency(latency) if isinstance(latency, str) else latency
+        self.read_quota = read_quota
+        self.write_quota = write_quota
+        self.error_rate = error_rate
+        self.down = False # True の間は全ての通信が ConnectionError（回線断）
+        self.stats = Counter()
+        self.on_request = None # 通信1回ごとに呼ぶ関数（storage.sheets_client の on_request）
+        self._rnd = random.Random(seed)
+        self._lock = threading.RLock()
+        self._calls = {"read": deque(), "write": deque()}
+        self._fail_next = deque()
+        self._spreadsheets = {}
+
+    @classmethod
+    def from_spec(cls, spec):
+        kwargs = {}
+        for item in filter(None, (s.strip() for s in spec.split(","))):
+            key, _, value = item.partition("=")
+            if key == "latency": kwargs[key] = value
+            elif key in ("read_quota", "write_quota", "seed"): kwargs[key] = int(value)
+            elif key == "error_rate": kwargs[key] = float(value)
+            else: raise ValueError(f"不明な設定です: {key}")
+        return cls(**kwargs)
+
+    def fail_next(self, n=1, error=None):
+        """次の n 回の通信を error（既定は 503）で失敗させる"""
+        with self._lock:
+            self._fail_next.extend([error or unavailable_error()] * n)
+
+    def open_by_key(self, key):
+        with self._lock:
+            if key not in self._spreadsheets:
+                self._spreadsheets[key] = FakeSpreadsheet(self, key)
+            return self._spreadsheets[key]
+
+    def open(self, title):
+        return self.open_by_key(title)
+
+    def _request(self, kind, name, apply):
+        """
+        1回の通信: 障害・割り当ての判定 → 届くまでの遅延 → シートに反映 → 返るまでの遅延。
+        割り当て超過・障害の通信もその回数に数える（本物の API と同じ）。
+        """
+        if self.on_request: self.on_request()
+        with self._lock:
+            self.stats[name] += 1
+            delay = self.latency(self._rnd) if self.latency else 0.0
+            error = self._injected_error(kind)
+            if error is not None: self.stats["error"] += 1
+        if delay: time.sleep(delay / 2)
+        if error is not None: raise error
+        with self._lock:
+            result = apply()
+        if delay: time.sleep(delay / 2)
+        return result
+
+    def _injected_error(self, kind):
+        if self.down: return ConnectionError("fake sheets is down")
+        if self._fail_next: return self._fail_next.popleft()
+        quota = self.read_quota if kind == "read" else self.write_quota
+        if quota is not None:
+            now = time.monotonic()
+            calls = self._calls[kind]
+            while calls and calls[0] <= now - QUOTA_WINDOW: calls.popleft()
+            if len(calls) >= quota:
+                self.stats["throttled"] += 1
+                return quota_error()
+            calls.append(now)
+        if self.error_rate and self._rnd.random() < self.error_rate: return unavailable_error()
+        return None
+
+
+class FakeSpreadsheet:
+    def __init__(self, service, key):
+        self._service = service
+        self.id = key
+        self._worksheets = []
+        self.sheet1 = self.add_worksheet("Sheet1", rows=1000, cols=26)
+
+    def worksheet(self, title):
+        for ws in self._worksheets:
+            if ws.title == title: return ws
+        raise WorksheetNotFound(title)
+
+    def add_worksheet(self, title, rows=1000, cols=26):
+        ws = FakeWorksheet(self, len(self._worksheets), title, rows, cols)
+        self._worksheets.append(ws)
+        return ws
+
+    def batch_update(self, body):
+        """updateCells（セルの書き換え）と deleteDimension（行の削除）だけに対応"""
+        def apply():
+            for req in body["requests"]:
+                if "updateCells" in req:
+                    spec = req["updateCells"]
+                    ws = self._by_id(spec["range"]["sheetId"])
+                    r0, c0 = spec["range"]["startRowIndex"], spec["range"]["startColumnIndex"]
+                    ws._check_grid(spec["range"].get("endRowIndex", r0 + len(spec["rows"])) - 1,
+                                   spec["range"].get("endColumnIndex", c0 + 1) - 1, f"{ws.title}!updateCells")
+                    for i, row in enumerate(spec["rows"]):
+                        for j, cell in enumerate(row["values"]):
+                            ws._set(r0 + i, c0 + j, cell.get("userEnteredValue", {}).get("stringValue", ""))
+                elif "deleteDimension" in req:
+                    spec = req["deleteDimension"]["range"]
+                    if spec["dimension"] != "ROWS": raise ValueError("列の削除には対応していません")
+                    ws = self._by_id(spec["sheetId"])
+                    ws._check_grid(spec["endIndex"] - 1, 0, f"{ws.title}!deleteDimension")
+                    del ws._rows[spec["startIndex"]:spec["endIndex"]]
+                    ws.row_count -= spec["endIndex"] - spec["startIndex"]
+                else:
+                    raise ValueError(f"対応していないリクエストです: {list(req)}")
+            return {"replies": [{} for _ in body["requests"]]}
+        return self._service._request("write", "batch_update", apply)
+
+    def _by_id(self, sheet_id):
+        return self._worksheets[sheet_id]
+
+
+class FakeWorksheet:
+    def __init__(self, spreadsheet, sheet_id, title, rows=1000, cols=26):
+        self.spreadsheet = spreadsheet
+        self.id = sheet_id
+        self.title = title
+        self.row_count = rows
+        self.col_count = cols
+        self._rows = []
+
+    def _request(self, kind, name, apply):
+        return self.spreadsheet._service._request(kind, name, apply)
+
+    def _check_grid(self, r, c, range_name):
+        """(r, c)（0始まり）がワークシートの範囲外なら、本物と同じく 400"""
+        if r >= self.row_count or c >= self.col_count: raise grid_error(range_name)
+
+    def _set(self, r, c, value):
+        while len(self._rows) <= r: self._rows.append([])
+        row = self._rows[r]
+        while len(row) <= c: row.append("")
+        row[c] = "" if value is None else str(value)
+
+    def _read(self, range_name):
+        r0, c0, r1, c1 = parse_range(range_name)
+        rows = self._rows[r0:] if r1 is None else self._rows[r0:r1 + 1]
+        return _trim([row[c0:c1 + 1] for row in rows])
+
+    def _write(self, range_name, values):
+        r0, c0, _, _ = parse_range(range_name)
+        if values:
+            self._check_grid(r0 + len(values) - 1, c0 + max((len(row) for row in values), default=1) - 1, range_name)
+        for i, row in enumerate(values):
+            for j, value in enumerate(row):
+                self._set(r0 + i, c0 + j, value)
+
+    def _append(self, rows):
+        # 最後に値のある行の次から書く（途中の空行は埋めない）
+        last = len(_trim(self._rows))
+        self._check_grid(0, max((len(row) for row in rows), default=1) - 1, "append")
+        del self._rows[last:]
+        self.row_count = max(self.row_count, last + len(rows))
+        self._rows.extend([["" if v is None else str(v) for v in row] for row in rows])
+
+    # --- 読み込み ---
+
+    def get_all_values(self):
+        def apply():
+            rows = _trim(self._rows)
+            width = max((len(r) for r in rows), default=0)
+            return [r + [""] * (width - len(r)) for r in rows]
+        return self._request("read", "get_all_values", apply)
+
+    def get(self, range_name):
+        return self._request("read", "get", lambda: self._read(range_name))
+
+    def batch_get(self, ranges):
+        return self._request("read", "batch_get", lambda: [self._read(r) for r in ranges])
+
+    # --- 書き込み ---
+
+    def update(self, values=None, range_name=None, value_input_option=None):
+        self._request("write", "update", lambda: self._write(range_name or "A1", values))
+
+    def update_cell(self, row, col, value):
+        def apply():
+            self._check_grid(row - 1, col - 1, f"R{row}C{col}")
+            self._set(row - 1, col - 1, value)
+        self._request("write", "update_cell", apply)
+
+    def batch_update(self, data, value_input_option=None):
+        def apply():
+            for item in data:
+                self._write(item["range"], item["values"])
+        self._request("write", "batch_update", apply)
+
+    def append_row(self, values, value_input_option=None):
+        self._request("write", "append_row", lambda: self._append([values]))
+
+    def append_rows(self, values, value_input_option=None):
+        self._request("write", "append_rows", lambda: self._append(values))
+
+    def resize(self, rows=None, cols=None):
+        def apply():
+            if rows is not None:
+                del self._rows[rows:]
+                self.row_count = rows
+            if cols is not None:
+                self._rows = [row[:cols] for row in self._rows]
+                self.col_count = cols
+        self._request("write", "resize", apply)
+
+    def clear(self):
+        def apply():
+            self._rows = []
+        self._request("write", "clear", apply)
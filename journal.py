@@ -0,0 +1,370 @@
+"""
+ローカルの SQLite ジャーナル（Streamlit に依存しない）。
+
+画面は常にこのジャーナルを読み書きする（ローカルディスクの速度で完結する）。
+SyncWorker がバックグラウンドで、つながっている間だけリモート（スプレッドシートのログ）と突き合わせる。
+  - push: まだ送っていないローカルの書き込みを、まとめてリモートに追記する
+  - pull: リモートに増えたログを取り込み、ローカルに「リモート側の最新状態」として保存する
+会場の Wi-Fi が切れても、スコア入力と表示はそのまま続けられる。
+
+ローカルの書き込み（entries）の状態:
+  pending → synced（リモートに追記済み）→ merged（pull でリモート側の状態に取り込み済み）
+  送信に失敗したものは failed になり、次の周期で再送する。
+"""
+import json
+import sqlite3
+import threading
+import time
+
+PENDING = "pending"
+SYNCED = "synced"
+FAILED = "failed"
+MERGED = "merged"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    tid TEXT NOT NULL,
+    id TEXT NOT NULL UNIQUE,
+    key TEXT NOT NULL,
+    row TEXT NOT NULL,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_tid_state ON entries (tid, state, seq);
+CREATE INDEX IF NOT EXISTS entries_tid_key ON entries (tid, key, seq);
+CREATE TABLE IF NOT EXISTS remote (
+    tid TEXT PRIMARY KEY,
+    snapshot TEXT,
+    last_row INTEGER NOT NULL,
+    last_raw TEXT,
+    data TEXT,
+    version TEXT,
+    log_bytes INTEGER,
+    snapshot_at REAL
+);
+"""
+# 後から追加した remote の列（古いジャーナルには ALTER TABLE で足す）
+_REMOTE_EXTRA_COLUMNS = {"version": "TEXT", "log_bytes": "INTEGER", "snapshot_at": "REAL"}
+
+
+def new_cursor():
+    """
+    リモートのログをどこまで取り込んだか
+    （snapshot: A1の生文字列 / last_row: 最終行番号 / last_raw: その行 / version: その時点のバージョン /
+      log_bytes: スナップショット以降のログの合計サイズ / snapshot_at: スナップショットを最初に見た時刻）
+    """
+    return {'snapshot': None, 'last_row': 0, 'last_raw': None, 'data': None, 'version': None,
+            'log_bytes': 0, 'snapshot_at': None}
+
+
+class CompactionPolicy:
+    """
+    ログをスナップショット(A1)に畳み込むタイミング。
+    スナップショット以降のログが、行数・合計サイズ・経過時間のどれかの上限を超えたら圧縮する。
+    """
+
+    def __init__(self, max_rows=300, max_bytes=256 * 1024, max_age=15 * 60):
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+
+    def due(self, cursor, now):
+        rows = cursor['last_row'] - 1
+        if rows <= 0: return False
+        if rows >= self.max_rows: return True
+        if (cursor.get('log_bytes') or 0) >= self.max_bytes: return True
+        return cursor.get('snapshot_at') is not None and now - cursor['snapshot_at'] >= self.max_age
+
+
+class LocalJournal:
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        columns = [r[1] for r in self._conn.execute("PRAGMA table_info(remote)")]
+        for name, sql_type in _REMOTE_EXTRA_COLUMNS.items():
+            if name not in columns:
+                self._conn.execute(f"ALTER TABLE remote ADD COLUMN {name} {sql_type}")
+
+    # --- ローカルの書き込み ---
+    def append(self, tid, entry_id, key, row):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO entries (tid, id, key, row, state, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (tid, entry_id, key, row, PENDING, time.time()))
+
+    def outbox(self, tid):
+        """まだリモートに届いていない書き込み [(seq, row)]（書き込み順）"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT seq, row FROM entries WHERE tid = ? AND state IN (?, ?) ORDER BY seq",
+                (tid, PENDING, FAILED)).fetchall()
+
+    def mark(self, seqs, state):
+        with self._lock:
+            self._conn.executemany("UPDATE entries SET state = ? WHERE seq = ?", [(state, s) for s in seqs])
+
+    def status(self, tid, key):
+        """キーの最新の書き込みの状態（merged は synced として返す）。書き込みが無ければ None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state FROM entries WHERE tid = ? AND key = ? ORDER BY seq DESC LIMIT 1", (tid, key)).fetchone()
+        if not row: return None
+        return SYNCED if row[0] == MERGED else row[0]
+
+    def pending_count(self, tid):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM entries WHERE tid = ? AND state IN (?, ?)", (tid, PENDING, FAILED)).fetchone()[0]
+
+    def discard(self, tid):
+        """未送信の書き込みを捨てる（データ初期化時用）"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE tid = ? AND state IN (?, ?)", (tid, PENDING, FAILED))
+
+    def state_marker(self, tid):
+        """
+        状態が変わったかどうかの目印。状態そのものを組み立て直さずに比べられる小さな値
+        （取り込んだリモートの位置・バージョンと、未取り込みのローカルの書き込み）
+        """
+        with self._lock:
+            remote = self._conn.execute(
+                "SELECT last_row, version, snapshot_at, length(last_raw) FROM remote WHERE tid = ?", (tid,)).fetchone()
+            local = self._conn.execute(
+                "SELECT MAX(seq), COUNT(*) FROM entries WHERE tid = ? AND state != ?", (tid, MERGED)).fetchone()
+        return remote, local
+
+    # --- リモート側の状態 ---
+    def remote_cursor(self, tid):
+        """保存してあるカーソル（無ければ None）"""
+        with self._lock:
+            row = self._remote_row(tid)
+        return self._cursor_from_row(row)
+
+    def local_state(self, tid):
+        """
+        保存してあるカーソルと、リモート側の状態にまだ含まれていない書き込みの行（書き込み順）を、同じ時点のものとして返す
+        （別々に読むと、間に save_remote が入ったときに取り込まれた書き込みがどちらにも含まれない）
+        """
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                row = self._remote_row(tid)
+                rows = [r[0] for r in self._conn.execute(
+                    "SELECT row FROM entries WHERE tid = ? AND state != ? ORDER BY seq", (tid, MERGED))]
+            finally:
+                self._conn.execute("COMMIT")
+        return self._cursor_from_row(row), rows
+
+    def _remote_row(self, tid):
+        return self._conn.execute(
+            "SELECT snapshot, last_row, last_raw, data, version, log_bytes, snapshot_at FROM remote WHERE tid = ?",
+            (tid,)).fetchone()
+
+    @staticmethod
+    def _cursor_from_row(row):
+        if not row: return None
+        return {'snapshot': row[0], 'last_row': row[1], 'last_raw': row[2],
+                'data': json.loads(row[3]) if row[3] else None, 'version': row[4],
+                'log_bytes': row[5] or 0, 'snapshot_at': row[6]}
+
+    def save_remote(self, tid, cursor, merged_ids=(), full_reload=False):
+        """
+        pull の結果を保存し、取り込まれたローカルの書き込みを merged にする。
+        全件読み直し（スナップショットが作り直された）の場合は、送信済みの書き込みは
+        スナップショットか後続のログのどちらかに含まれているので、まとめて merged にする。
+        """
+        data = json.dumps(cursor['data'], ensure_ascii=False) if cursor['data'] is not None else None
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO remote (tid, snapshot, last_row, last_raw, data, version, log_bytes, snapshot_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (tid, cursor['snapshot'], cursor['last_row'], cursor['last_raw'], data, cursor.get('version'),
+                     cursor.get('log_bytes') or 0, cursor.get('snapshot_at')))
+                if full_reload:
+                    self._conn.execute("UPDATE entries SET state = ? WHERE tid = ? AND state = ?", (MERGED, tid, SYNCED))
+                self._conn.executemany(
+                    "UPDATE entries SET state = ? WHERE tid = ? AND id = ?", [(MERGED, tid, i) for i in merged_ids if i])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+
+class SyncWorker:
+    """
+    1大会分のジャーナルとリモートの同期を行うバックグラウンドスレッド。
+    push_fn(rows): 行のリストをリモートに追記する（Sheets なら append_rows 1回）。
+    None なら読むだけ（別のプロセスの書き込みを取り込むだけの API・静的ページ用。送信はそのプロセスに任せる）
+    pull_fn(cursor): カーソル以降のログを取り込んで cursor を進め、(全件読み直したか, 取り込んだ書き込みID) を返す
+    リモート側にバージョン番号があれば、pull は変化が無い限りその小さな値を読むだけで済む。
+    既定では pull_interval ごとに pull し続ける。idle_backoff=True にすると、定期的な pull を使われている間に限る
+    （全ての読み手が touch する場合だけ使う。touch しない読み手がいると、その読み手には古い状態が残る）:
+      - touch() で「この大会を読んでいる人がいる」ことを知らせる（画面の再実行・API のリクエストのたび）
+      - 最後の touch から active_for 秒までは pull_interval ごと、それ以降は間隔を倍々に idle_interval まで延ばす
+      - stop_after 秒 touch が無く、送信待ちも無ければスレッドを止める（次の touch / submit で再開する）
+    compact_fn(cursor): 取り込み済みのログをスナップショットに畳み込み、成功したら cursor を更新して True を返す。
+    policy の条件を満たしたときに、同期の後で呼ぶ。
+    on_change(data): pull でリモート側の状態が変わったときに、その状態を渡して呼ぶ（静的ページの書き出しなど）。
+    """
+
+    def __init__(self, journal, tid, push_fn, pull_fn, compact_fn=None, policy=None,
+                 interval=1.0, pull_interval=10.0, max_backoff=30.0, on_change=None,
+                 idle_backoff=False, active_for=60.0, idle_interval=60.0, stop_after=600.0):
+        self.journal = journal
+        self.tid = tid
+        self._push_fn = push_fn
+        self._pull_fn = pull_fn
+        self._compact_fn = compact_fn
+        self._on_change = on_change
+        self.policy = policy or CompactionPolicy()
+        self._interval = interval
+        self._pull_interval = pull_interval
+        self._max_backoff = max_backoff
+        self._idle_backoff = idle_backoff
+        self._active_for = active_for
+        self._idle_interval = idle_interval
+        self._stop_after = stop_after
+        self._sync_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._failures = 0
+        self._last_active = time.monotonic()
+        self._thread = None
+        self._stopped = False
+        self.last_error = None
+        self.last_synced_at = None
+        self.last_compacted_at = None
+        self.touch()
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def stop(self):
+        """同期スレッドを止めて終わるのを待つ（送信待ちはジャーナルに残り、次に作った SyncWorker が送る）。以後 touch しても再開しない"""
+        with self._state_lock:
+            self._stopped = True
+            thread = self._thread
+        self._wakeup.set()
+        if thread is not None and thread is not threading.current_thread(): thread.join()
+
+    def touch(self):
+        """この大会が使われていることを知らせる。止まっていた同期スレッドは再開し、すぐに1回同期する"""
+        with self._state_lock:
+            if self._stopped: return
+            idle = time.monotonic() - self._last_active > self._active_for
+            self._last_active = time.monotonic()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"journal-sync-{self.tid}", daemon=True)
+                self._thread.start()
+            elif idle:
+                self._wakeup.set() # 間隔を延ばしている間に変わったかもしれないので、待たずに取り込む
+
+    def submit(self, entry_id, key, row):
+        """ローカルに書き込んで、すぐ戻る（リモートへの送信は裏で行う）"""
+        self.journal.append(self.tid, entry_id, key, row)
+        self._wakeup.set()
+        self.touch()
+
+    def push(self):
+        if self._push_fn is None: return
+        outbox = self.journal.outbox(self.tid)
+        if not outbox: return
+        seqs = [seq for seq, _ in outbox]
+        try:
+            self._push_fn([row for _, row in outbox])
+        except Exception:
+            self.journal.mark(seqs, FAILED)
+            raise
+        self.journal.mark(seqs, SYNCED)
+
+    def pull(self):
+        cursor = self.journal.remote_cursor(self.tid) or new_cursor()
+        full_reload, merged_ids = self._pull_fn(cursor)
+        self.journal.save_remote(self.tid, cursor, merged_ids, full_reload)
+        if self._on_change and (full_reload or merged_ids) and cursor['data'] is not None:
+            self._on_change(cursor['data'])
+
+    def compact(self, force=False):
+        """
+        取り込み済みのログをスナップショットに畳み込む（_sync_lock 取得済みで、pull の直後に呼ぶ）。
+        force=True なら policy の条件に関係なく行う。
+        """
+        if not self._compact_fn: return False
+        cursor = self.journal.remote_cursor(self.tid)
+        if not cursor or cursor['data'] is None or cursor['last_row'] < 2: return False
+        if not force and not self.policy.due(cursor, time.time()): return False
+        if not self._compact_fn(cursor): return False
+        # 畳み込んだ行は全て pull で取り込み済みなので、ここで merged にするものは無い
+        self.journal.save_remote(self.tid, cursor)
+        self.last_compacted_at = time.time()
+        return True
+
+    def sync_once(self, compact=True):
+        """push → pull →（必要なら）圧縮 を1回行う。成功なら True"""
+        with self._sync_lock:
+            try:
+                self.push()
+                self.pull()
+                if compact: self.compact()
+            except Exception as e:
+                self.last_error = e
+                return False
+            self.last_error = None
+            self.last_synced_at = time.time()
+            return True
+
+    def run_exclusive(self, fn):
+        """同期（push / pull / 圧縮）と重ならないように fn() を実行する（リモートを丸ごと書き換えるとき用）"""
+        with self._sync_lock:
+            return fn()
+
+    def compact_now(self):
+        """最新まで取り込んでから、条件に関係なく圧縮する（管理画面の手動実行用）"""
+        with self._sync_lock:
+            self.push()
+            self.pull()
+            return self.compact(force=True)
+
+    def _poll_interval(self, idle_polls):
+        """次の定期的な pull までの秒数（idle_backoff なら、使われていない間は倍々に延ばす）"""
+        if not self._idle_backoff or time.monotonic() - self._last_active < self._active_for: return self._pull_interval
+        return min(self._pull_interval * 2 ** idle_polls, self._idle_interval)
+
+    def _should_stop(self):
+        """しばらく使われておらず、送信待ちも無ければ止める（touch と同時に起きても取りこぼさないよう _state_lock の中で決める）"""
+        with self._state_lock:
+            if self._stopped:
+                self._thread = None
+                return True
+            if not self._idle_backoff: return False
+            if time.monotonic() - self._last_active < self._stop_after: return False
+            if self.journal.pending_count(self.tid): return False
+            self._thread = None
+            return True
+
+    def _run(self):
+        idle_polls = 0
+        while not self._should_stop():
+            # 書き込みがあればすぐ（同時に終わったコートの結果をまとめるため少し待って）、無ければ定期的に同期する
+            woke = self._wakeup.wait(self._poll_interval(idle_polls))
+            if self._stopped: continue
+            if woke:
+                time.sleep(self._interval)
+                idle_polls = 0
+            elif time.monotonic() - self._last_active >= self._active_for:
+                idle_polls += 1
+            else:
+                idle_polls = 0
+            self._wakeup.clear()
+            if self.sync_once():
+                self._failures = 0
+            else:
+                self._failures += 1
+                time.sleep(min(self._interval * 2 ** self._failures, self._max_backoff))
@@ -0,0 +1,162 @@
+"""
+再実行ごとの処理時間の計測（Streamlit に依存しない）。
+
+大会当日に画面が重いとき、時間がシートとの通信・ログ再生・順位表・表のグラデーション・
+トーナメント表の描画のどこでかかっているかを、管理者設定の中で確かめるためのもの。
+既定では無効で、有効なときだけ各フェーズの所要時間と、外部 API の呼び出し・キャッシュの当たり外れを数える。
+
+    with phase("standings:reg"): ...   # 実行中の再実行に、このフェーズの時間を加算する
+    count("sheets_api")                # 実行中の再実行の回数を数える
+
+どちらも、計測中の再実行を実行しているスレッドからの呼び出しを、その再実行に記録する。
+同期スレッドなど、それ以外のスレッドからの呼び出しは（計測が有効なら）プロセス全体の記録（background）に入る。
+phase は1回ごとの時間を、フェーズごとに直近 history 回まで残す。
+"""
+import math
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+HISTORY = 50 # p50 / p95 を求める直近の再実行の数
+
+_local = threading.local()
+_profiler = None # 最後に作った RerunProfiler（計測中でないスレッドからの count の行き先）
+
+
+def _current():
+    return getattr(_local, "record", None)
+
+
+@contextmanager
+def phase(name):
+    """計測中ならこのブロックの時間をフェーズ name に加算する（同じ再実行で複数回通れば合計）"""
+    record = _current()
+    if record is None:
+        if _profiler is None or not _profiler.enabled:
+            yield
+            return
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            _profiler._add_background_phase(name, time.perf_counter() - t0)
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        record['touched'] = time.perf_counter()
+        record['phases'][name] = record['phases'].get(name, 0.0) + record['touched'] - t0
+
+
+def count(name, n=1):
+    """計測中の再実行の回数 name を n 増やす"""
+    record = _current()
+    if record is not None:
+        record['counters'][name] += n
+    elif _profiler is not None and _profiler.enabled:
+        with _profiler._lock:
+            _profiler.background[name] += n
+
+
+def _summarize(samples):
+    """{フェーズ: [秒, ...]} → [{phase, n, p50, p95, last}]（total を先頭に、あとは p95 の大きい順）"""
+    rows = []
+    for name, values in samples.items():
+        ordered = sorted(values)
+        rows.append({'phase': name, 'n': len(values), 'p50': percentile(ordered, 50),
+                     'p95': percentile(ordered, 95), 'last': values[-1]})
+    rows.sort(key=lambda r: (r['phase'] != 'total', -r['p95']))
+    return rows
+
+
+def percentile(sorted_values, q):
+    """最近傍順位法のパーセンタイル（sorted_values は昇順・空でないこと）"""
+    return sorted_values[max(0, math.ceil(q / 100 * len(sorted_values)) - 1)]
+
+
+class RerunProfiler:
+    """直近 history 回の再実行の計測結果を持つ（プロセス内の全セッションで共有する）"""
+
+    def __init__(self, enabled=False, history=HISTORY):
+        global _profiler
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.records = deque(maxlen=history)
+        self.background = Counter()
+        self.background_phases = {} # {フェーズ: 直近 history 回の秒数}（再実行の外での呼び出し）
+        self._inflight = [] # 計測中の再実行（例外や st.rerun() で最後まで行かなかったものも含む）
+        _profiler = self
+
+    def start_rerun(self):
+        """
+        再実行の先頭で呼ぶ。無効なら何もしない。
+        例外や st.rerun() で最後まで行かなかった再実行は、最後にフェーズを抜けた時点までを1回分としてここで記録する。
+        """
+        thread = threading.current_thread()
+        with self._lock:
+            stale = [r for r in self._inflight if r['thread'] is thread or not r['thread'].is_alive()]
+        for record in stale:
+            self._commit(record, record['touched'])
+        if not self.enabled:
+            _local.record = None
+            return
+        now = time.perf_counter()
+        _local.record = {'thread': thread, 'started': now, 'touched': now, 'phases': {}, 'counters': Counter()}
+        with self._lock:
+            self._inflight.append(_local.record)
+
+    def finish_rerun(self):
+        """再実行の最後で呼ぶ（ここまでを1回分として記録する）"""
+        record = _current()
+        if record is not None: self._commit(record, time.perf_counter())
+        _local.record = None
+
+    def _commit(self, record, ended):
+        record['phases']['total'] = ended - record['started']
+        with self._lock:
+            if record not in self._inflight: return
+            self._inflight.remove(record)
+            self.records.append({'phases': record['phases'], 'counters': record['counters']})
+
+    def _add_background_phase(self, name, seconds):
+        with self._lock:
+            self.background_phases.setdefault(name, deque(maxlen=self.records.maxlen)).append(seconds)
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+            self._inflight.clear()
+            self.background.clear()
+            self.background_phases.clear()
+
+    def phase_summary(self):
+        """フェーズごとの [{phase, n, p50, p95, last}]（秒。そのフェーズを通った再実行だけで求める）"""
+        with self._lock:
+            records = list(self.records)
+        samples = {}
+        for record in records:
+            for name, seconds in record['phases'].items():
+                samples.setdefault(name, []).append(seconds)
+        return _summarize(samples)
+
+    def background_phase_summary(self):
+        """再実行の外（同期スレッドなど）のフェーズごとの [{phase, n, p50, p95, last}]（直近 history 回の呼び出しで求める）"""
+        with self._lock:
+            samples = {name: list(values) for name, values in self.background_phases.items()}
+        return _summarize(samples)
+
+    def counter_summary(self):
+        """回数ごとの [{counter, per_rerun, last, background}]（per_rerun は直近の再実行での平均）"""
+        with self._lock:
+            records = list(self.records)
+            background = dict(self.background)
+        names = sorted(set().union(*(r['counters'] for r in records), background))
+        rows = []
+        for name in names:
+            values = [r['counters'][name] for r in records]
+            rows.append({'counter': name, 'per_rerun': sum(values) / len(values) if values else 0.0,
+                         'last': values[-1] if values else 0, 'background': background.get(name, 0)})
+        return rows
+
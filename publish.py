@@ -0,0 +1,343 @@
+"""
+観戦者向けの静的ページの書き出し（Streamlit に依存しない）。
+
+保存された状態（A1 + ログを再生したもの）から、順位表・スコア入りの対戦表・トーナメント表を
+1つの HTML（index.html）と JSON（state.json）に書き出す。どちらも外部ファイルを参照しないので、
+出力先のディレクトリを任意の静的ファイルサーバー（nginx, GitHub Pages, S3 など）で配信すれば、
+保護者など大勢の観戦者がアクセスしても Streamlit のプロセスには負荷がかからない。
+
+app.py では環境変数 PATENT_CUP_PUBLISH_DIR を設定すると、同期スレッドがシートの変更を
+取り込むたびに書き出す（内容が変わっていなければ書き直さない）。ただし書き出しが始まるのは、その大会を
+誰かが一度開いて同期スレッドができてから（サーバーの再起動後も同じ）。
+Streamlit とは別のプロセスで、シートを取り込み続けて書き出す場合（secrets.toml は app.py と同じもの）:
+
+    python publish.py --watch public/ [大会ID ...]     # 大会IDを省略すると既定の大会
+
+同じ表は、app.py の観戦者向けの軽い画面（render_fragment）にもそのまま埋め込む。
+手元の JSON から1回だけ書き出す場合:
+
+    python publish.py patent_cup_data.json public/
+"""
+import hashlib
+import html
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from bracket import bracket_svg, bracket_text
+from standings import LEAGUES, build_standings, standings_rows
+from storage import journal_state
+from timetable import compile_timetable
+from tournament import tourn_match_result, tournament_match_teams, bracket_state
+
+JOURNAL_FILE = "patent_cup_journal.db" # app.py と同じ（環境変数 PATENT_CUP_JOURNAL で変更可）
+PULL_INTERVAL = float(os.environ.get("PATENT_CUP_PULL_INTERVAL", "10")) # app.py と同じ
+
+# 保存データに項目が無い場合の既定値（app.py の init_session_state と同じ）
+DEFAULT_SETTINGS = {
+    'app_title': "パテントカップ2025",
+    'court_mode': "4面",
+    'start_time_hour': 13,
+    'start_time_minute': 15,
+    'league_duration': 7,
+    'tourn_duration': 10,
+    'interval_duration': 15,
+    'league_games': 3,
+}
+LEAGUE_LABELS = {"reg": "🟦 ガチリーグ", "mix": "🟧 MIXリーグ"}
+CUPS = ("Champions", "Elite", "Classical")
+CUP_LABELS = {"Champions": "パテントチャンピオンズカップ", "Elite": "パテントエリートカップ", "Classical": "パテントクラシカルカップ"}
+REFRESH_SECONDS = 30 # 観戦者のブラウザが自動で読み直す間隔
+
+
+def _setting(data, key):
+    return data.get(key, DEFAULT_SETTINGS[key])
+
+
+def public_state(data):
+    """
+    保存された状態から、観戦者に見せる内容（JSON にそのまま変換できる dict）を作る。
+    チーム記号はチーム名に、トーナメントの枠は勝ち上がったチーム名に解決済み。
+    """
+    teams = {"reg": data.get('teams_reg', {}), "mix": data.get('teams_mix', {})}
+    results = data.get('results', {})
+    tourn_results = data.get('tourn_results', {})
+
+    timetable = compile_timetable(_setting(data, 'court_mode'), tuple(teams["reg"]), tuple(teams["mix"]),
+                                  _setting(data, 'start_time_hour'), _setting(data, 'start_time_minute'),
+                                  _setting(data, 'league_duration'), _setting(data, 'interval_duration'),
+                                  _setting(data, 'tourn_duration'), _setting(data, 'league_games'))
+    aggregates = build_standings(results, timetable.by_key)
+    standings, ranks = {}, {}
+    for league in LEAGUES:
+        standings[league] = standings_rows(aggregates.get(league, {}), teams[league])
+        ranks[league] = [row["チーム名"] for row in standings[league]]
+
+    league = []
+    for slot in timetable.league_slots:
+        games = []
+        for m in slot.matches:
+            res = results.get(m.key, {'s1': None, 's2': None})
+            games.append({"league": m.league, "court": m.court,
+                          "home": teams[m.league].get(m.home, m.home), "away": teams[m.league].get(m.away, m.away),
+                          "s1": res['s1'], "s2": res['s2']})
+        league.append({"time": slot.time, "games": games})
+
+    tournament = []
+    for slot in timetable.tournament_slots:
+        games = []
+        for m in slot.matches:
+            t_left, t_right = tournament_match_teams(tourn_results, m.game, ranks[m.league])
+            res, winner, _ = tourn_match_result(tourn_results, m.key)
+            games.append({"league": m.league, "cup": m.cup, "round": m.round, "court": m.court,
+                          "left": t_left, "right": t_right, "s1": res['s1'], "s2": res['s2'],
+                          "pk1": res.get('pk1'), "pk2": res.get('pk2'), "winner": winner})
+        tournament.append({"time": slot.time, "title": slot.title, "games": games})
+
+    brackets = []
+    for league_type in LEAGUES:
+        for cup in CUPS:
+            state = bracket_state(tourn_results, league_type, cup, ranks[league_type])
+            brackets.append({"league": league_type, "cup": cup,
+                             "teams": list(state[0]) if state else None, "winners": list(state[1]) if state else None})
+
+    return {"title": _setting(data, 'app_title'), "standings": standings, "league": league,
+            "tournament": tournament, "brackets": brackets}
+
+
+def state_version(state):
+    """内容から決まるバージョン（同じ内容なら同じ値）"""
+    raw = json.dumps(state, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode()).hexdigest()[:16]
+
+
+# ==========================================
+# HTML
+# ==========================================
+
+_CSS = """
+body { font-family: sans-serif; margin: 0 auto; max-width: 1100px; padding: 8px; color: #222; }
+h1 { font-size: 1.4em; } h2 { border-bottom: 2px solid #ccc; padding-bottom: 4px; }
+table { border-collapse: collapse; width: 100%; margin-bottom: 12px; font-size: 0.9em; }
+th, td { border: 1px solid #ddd; padding: 4px 6px; text-align: center; }
+td.name { text-align: left; }
+.reg { background: #E6F3FF; } .mix { background: #FFF0F5; }
+.cols { display: flex; flex-wrap: wrap; gap: 12px; } .cols > div { flex: 1 1 420px; min-width: 0; }
+.bracket svg { max-width: 100%; height: auto; }
+.updated { color: #888; font-size: 0.8em; }
+"""
+# アプリの画面に埋め込む場合は、Streamlit の他の部分に効かないよう .patent-cup の中だけに効かせる
+_EMBED_CSS = """
+.patent-cup table { border-collapse: collapse; width: 100%; margin-bottom: 12px; font-size: 0.9em; }
+.patent-cup th, .patent-cup td { border: 1px solid #ddd; padding: 4px 6px; text-align: center; }
+.patent-cup td.name { text-align: left; }
+.patent-cup .reg { background: #E6F3FF; color: #222; } .patent-cup .mix { background: #FFF0F5; color: #222; }
+.patent-cup .cols { display: flex; flex-wrap: wrap; gap: 12px; } .patent-cup .cols > div { flex: 1 1 420px; min-width: 0; }
+.patent-cup .bracket svg { max-width: 100%; height: auto; }
+"""
+
+
+def _e(value):
+    return html.escape("" if value is None else str(value))
+
+
+def _score(s1, s2, pk1=None, pk2=None):
+    if s1 is None: return "ー"
+    txt = f"{s1} - {s2}"
+    if s1 == s2 and pk1 is not None: txt += f" (PK {pk1}-{pk2})"
+    return txt
+
+
+def _standings_html(rows):
+    cols = ["順位", "チーム名", "勝点", "試合数", "勝", "引", "負", "得点", "失点", "得失差"]
+    out = ["<table><tr>" + "".join(f"<th>{c}</th>" for c in cols) + "</tr>"]
+    for row in rows:
+        out.append("<tr>" + "".join(f'<td class="name">{_e(row[c])}</td>' if c == "チーム名" else f"<td>{_e(row[c])}</td>"
+                                    for c in cols) + "</tr>")
+    out.append("</table>")
+    return "".join(out)
+
+
+def _bracket_html(bracket):
+    label = f"{LEAGUE_LABELS[bracket['league']]} {CUP_LABELS[bracket['cup']]}"
+    if not bracket['teams']:
+        return f"<h3>{_e(label)}</h3><p>順位確定後に表示されます</p>"
+    try:
+        svg = bracket_svg(bracket['league'], tuple(bracket['teams']), tuple(bracket['winners']))
+        svg = svg[svg.index("<svg"):] # XML 宣言と DOCTYPE を外して HTML に埋め込む
+    except Exception:
+        # dot コマンドが無い・描画に失敗した場合は図を省き、文字だけのトーナメント表にする
+        svg = "<p>" + "<br>".join(_e(line) for line in bracket_text(bracket['teams'], bracket['winners'])) + "</p>"
+    return f'<h3>{_e(label)}</h3><div class="bracket">{svg}</div>'
+
+
+def _sections(state):
+    """順位表・リーグ戦・トーナメント・トーナメント表（ページと画面への埋め込みで共通）"""
+    parts = ['<h2>📊 順位表</h2><div class="cols">']
+    for league in LEAGUES:
+        parts.append(f"<div><h3>{LEAGUE_LABELS[league]}</h3>{_standings_html(state['standings'][league])}</div>")
+    parts.append("</div><h2>📝 リーグ戦</h2><table><tr><th>時間</th><th>コート</th><th>対戦</th><th>スコア</th></tr>")
+    for i, slot in enumerate(state['league']):
+        for game in slot['games']:
+            parts.append(f'<tr class="{game["league"]}"><td>第{i+1}試合帯 {slot["time"]}</td><td>{_e(game["court"])}</td>'
+                         f'<td class="name">{_e(game["home"])} vs {_e(game["away"])}</td><td>{_score(game["s1"], game["s2"])}</td></tr>')
+    parts.append("</table><h2>🏆 トーナメント</h2><table><tr><th>時間</th><th>試合</th><th>コート</th><th>対戦</th><th>スコア</th></tr>")
+    for slot in state['tournament']:
+        for game in slot['games']:
+            left, right = game['left'] or "Wait", game['right'] or "Wait"
+            parts.append(f'<tr class="{game["league"]}"><td>{slot["time"]}</td><td>{_e(game["cup"])} {_e(game["round"])}</td>'
+                         f'<td>{_e(game["court"])}</td><td class="name">{_e(left)} vs {_e(right)}</td>'
+                         f'<td>{_score(game["s1"], game["s2"], game["pk1"], game["pk2"])}</td></tr>')
+    parts.append('</table><h2>🌲 トーナメント表</h2><div class="cols">')
+    for league in LEAGUES:
+        parts.append("<div>" + "".join(_bracket_html(b) for b in state['brackets'] if b['league'] == league) + "</div>")
+    parts.append("</div>")
+    return "".join(parts)
+
+
+def render_html(state, generated_at):
+    return f"""<!DOCTYPE html>
+<html lang="ja"><head><meta charset="utf-8">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+<meta http-equiv="refresh" content="{REFRESH_SECONDS}">
+<title>{_e(state['title'])}</title><style>{_CSS}</style></head><body>
+<h1>⚽ {_e(state['title'])}</h1>
+<p class="updated">更新: {_e(generated_at)}（{REFRESH_SECONDS}秒ごとに自動で読み直します）</p>
+{_sections(state)}</body></html>
+"""
+
+
+def render_fragment(state):
+    """アプリの画面に埋め込む HTML（見出し・自動読み直しなしで、表だけ。ウィジェットは使わない）"""
+    return f'<style>{_EMBED_CSS}</style><div class="patent-cup">{_sections(state)}</div>'
+
+
+# ==========================================
+# 状態のキャッシュ
+# ==========================================
+
+class StateCache:
+    """
+    大会ごとに、ジャーナルの目印（state_marker）が変わったときだけ状態を組み立て直す。
+    変わっていなければ、前回の状態・バージョン・応答本文をそのまま使う。
+    ジャーナルを使わない保存先では load_fn(tid) で毎回状態を読み、内容のバージョンが同じなら前回のものを使う。
+    """
+
+    def __init__(self, journal=None, load_fn=None):
+        self.journal = journal
+        self._load_fn = load_fn or (lambda tid: journal_state(self.journal, tid))
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, tid):
+        """(バージョン, 状態, 観戦者向けの内容) を返す。その大会のデータが無ければ None"""
+        marker = self.journal.state_marker(tid) if self.journal is not None else None
+        with self._lock:
+            previous = self._entries.get(tid)
+        if previous and marker is not None and previous['marker'] == marker: return previous
+        data = self._load_fn(tid)
+        if data is None: return None
+        version = state_version(data)
+        if previous and marker is None and previous['version'] == version: return previous
+        entry = {'marker': marker, 'version': version, 'data': data,
+                 'public': public_state(data), 'bodies': {}}
+        with self._lock:
+            # 内容が同じ（圧縮しただけ等）なら、作り済みの応答本文を引き継ぐ
+            if previous and previous['version'] == entry['version']:
+                entry['bodies'] = previous['bodies']
+            self._entries[tid] = entry
+        return entry
+
+
+# ==========================================
+# 書き出し
+# ==========================================
+
+def _write_atomic(path, text):
+    """書き出し途中のファイルを配信しないよう、一時ファイルに書いてから置き換える"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+class SnapshotPublisher:
+    """out_dir に index.html と state.json を書き出す。内容が前回と同じなら何もしない"""
+
+    def __init__(self, out_dir):
+        self.out_dir = out_dir
+        self._lock = threading.Lock()
+        self.last_version = None
+        self.last_published_at = None
+        self.last_error = None
+
+    def publish(self, data):
+        """書き出したら True。失敗しても例外は投げない（同期スレッドから呼ばれるため）"""
+        try:
+            state = public_state(data)
+            version = state_version(state)
+            with self._lock:
+                if version == self.last_version: return False
+                generated_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                os.makedirs(self.out_dir, exist_ok=True)
+                payload = dict(state, version=version, generated_at=generated_at)
+                _write_atomic(os.path.join(self.out_dir, "state.json"), json.dumps(payload, ensure_ascii=False))
+                _write_atomic(os.path.join(self.out_dir, "index.html"), render_html(state, generated_at))
+                self.last_version = version
+                self.last_published_at = time.time()
+                self.last_error = None
+                return True
+        except Exception as e:
+            self.last_error = e
+            return False
+
+
+def watch(out_dir, tids):
+    """
+    大会ごとにシートを取り込み続け、変わるたびに out_dir/大会ID（既定の大会は default）に書き出す。
+    取り込むだけのスレッド（storage.sheet_reader）なので、入力は app.py のプロセスに任せる。
+    読み手のセッションが無くても止まらないよう、取り込みの間隔は延ばさない。
+    """
+    from journal import LocalJournal
+    from storage import load_secrets, sheets_client, spreadsheet_from_secrets, tournament_worksheet, sheet_reader
+    journal = LocalJournal(os.environ.get("PATENT_CUP_JOURNAL", JOURNAL_FILE))
+    secrets = load_secrets()
+    client = sheets_client(secrets)
+    readers = []
+    for tid in tids:
+        publisher = SnapshotPublisher(os.path.join(out_dir, tid or "default"))
+        data = journal_state(journal, tid)
+        if data is not None: publisher.publish(data) # 前回までに取り込んだ状態で、まず書き出しておく
+        readers.append(sheet_reader(journal, tid, lambda tid=tid: tournament_worksheet(spreadsheet_from_secrets(client, secrets), tid),
+                                    pull_interval=PULL_INTERVAL, on_change=publisher.publish))
+    print(f"{out_dir} に書き出し続けます（{PULL_INTERVAL:g} 秒ごとにシートを確認）")
+    while True:
+        time.sleep(60)
+        for reader in readers:
+            if reader.last_error: print(f"シートを取り込めません（{reader.tid or 'default'}）: {reader.last_error}")
+
+
+def main():
+    if len(sys.argv) >= 3 and sys.argv[1] == "--watch":
+        return watch(sys.argv[2], sys.argv[3:] or [""])
+    if len(sys.argv) != 3:
+        sys.exit("usage: python publish.py STATE_JSON OUT_DIR | python publish.py --watch OUT_DIR [TOURNAMENT_ID ...]")
+    with open(sys.argv[1], encoding="utf-8") as f:
+        data = json.load(f)
+    publisher = SnapshotPublisher(sys.argv[2])
+    if not publisher.publish(data):
+        sys.exit(f"書き出しに失敗しました: {publisher.last_error}")
+    print(f"{sys.argv[2]} に書き出しました（version {publisher.last_version}）")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,8 +5,11 @@ import graphviz
 import json
 import time
 import random
+import uuid
 # --- 追加ライブラリ（DB用） ---
 from sqlalchemy import text
+from log_state import SCHEMA_SQL, STATE_SQL, state_from_rows
+from log_notify import LogListener, NOTIFY_SQL, notify_payload
 
 # ==========================================
 # 1. 設定・データ定義
@@ -152,55 +155,36 @@ TOURN_SCHED_3COURT = [
 
 @st.cache_resource
 def init_db():
-    """データベースのテーブルが存在しない場合は作成する"""
+    """データベースのテーブルと索引が存在しない場合は作成する"""
     conn = st.connection("postgresql", type="sql")
     with conn.session as s:
         # patent_cup_logs という名前のテーブルを作成（追記ログ用）
-        s.execute(text("""
-            CREATE TABLE IF NOT EXISTS patent_cup_logs (
-                id SERIAL PRIMARY KEY,
-                log_type VARCHAR(50),
-                log_data JSONB,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """))
+        for sql in SCHEMA_SQL:
+            s.execute(text(sql))
         s.commit()
 
 @st.cache_data(ttl=30)
 def load_data_from_db():
     """
     【追記型 DB版】
-    DBからログを全件読み込み、最新状態を復元する。
+    最新状態の復元は DB 側で行う（log_state.STATE_SQL）。
+    最新の init 行と、それ以降の試合キーごとの最新結果だけを受け取るので、ログが伸びても転送量は増えない。
     """
     conn = st.connection("postgresql", type="sql")
-    # ログを古い順に全て取得
-    df = conn.query("SELECT log_type, log_data FROM patent_cup_logs ORDER BY id ASC", ttl=0)
-    
+    df = conn.query(STATE_SQL, ttl=0)
+
     if df.empty: return None
+    return state_from_rows(df.itertuples(index=False, name=None))
 
-    current_data = {}
-    
-    for _, row in df.iterrows():
-        l_type = row['log_type']
-        l_data = row['log_data']
-        
-        # JSONが文字列として返ってきた場合の処理
-        if isinstance(l_data, str):
-            l_data = json.loads(l_data)
-            
-        if l_type == 'init':
-            current_data = l_data
-        elif l_type == 'match' and current_data:
-            m_key = l_data.get('k')
-            res = l_data.get('v')
-            is_tourn = l_data.get('t')
-            
-            if is_tourn:
-                current_data['tourn_results'][m_key] = res
-            else:
-                current_data['results'][m_key] = res
-                
-    return current_data if current_data else None
+@st.cache_resource
+def get_log_listener():
+    """
+    ログへの書き込み通知（LISTEN/NOTIFY）を待ち受けるスレッド（プロセスに1本）。
+    どのプロセスで書き込まれても、通知が届いた時点でこのプロセスのキャッシュを捨てる。
+    """
+    conn = st.connection("postgresql", type="sql")
+    dsn = conn.engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+    return LogListener(dsn, on_notify=lambda payload: load_data_from_db.clear())
 
 def save_data_to_db():
     """
@@ -230,6 +214,7 @@ def save_data_to_db():
                 text("INSERT INTO patent_cup_logs (log_type, log_data) VALUES (:type, CAST(:data AS JSONB));"),
                 {"type": "init", "data": json.dumps(data, ensure_ascii=False)}
             )
+            s.execute(text(NOTIFY_SQL), {"payload": notify_payload("init", origin=st.session_state.session_origin)})
             s.commit()
             
         load_data_from_db.clear()
@@ -256,6 +241,7 @@ def save_specific_match(match_key, new_result_dict, is_tournament=False):
                 text("INSERT INTO patent_cup_logs (log_type, log_data) VALUES (:type, CAST(:data AS JSONB));"),
                 {"type": "match", "data": json.dumps(log_data, ensure_ascii=False)}
             )
+            s.execute(text(NOTIFY_SQL), {"payload": notify_payload("match", match_key, st.session_state.session_origin)})
             s.commit()
 
         # 手元の画面も即座に更新
@@ -274,11 +260,30 @@ def save_specific_match(match_key, new_result_dict, is_tournament=False):
 # セッション初期化・その他の関数はそのまま
 # ==========================================
 
+def apply_saved_data(saved_data):
+    """DBから復元した状態をセッションに反映する"""
+    st.session_state.app_title = saved_data.get('app_title', "パテントカップ2025")
+    st.session_state.teams_reg = saved_data.get('teams_reg', DEFAULT_TEAMS_REGULAR.copy())
+    st.session_state.teams_mix = saved_data.get('teams_mix', DEFAULT_TEAMS_MIX.copy())
+    st.session_state.results = saved_data.get('results', {})
+    st.session_state.tourn_results = saved_data.get('tourn_results', {})
+    st.session_state.court_mode = saved_data.get('court_mode', "4面")
+    st.session_state.start_time_hour = saved_data.get('start_time_hour', 13)
+    st.session_state.start_time_minute = saved_data.get('start_time_minute', 15)
+    st.session_state.league_duration = saved_data.get('league_duration', 7)
+    st.session_state.tourn_duration = saved_data.get('tourn_duration', 10)
+    st.session_state.interval_duration = saved_data.get('interval_duration', 15)
+
 def init_session_state():
     # ★追加: アプリ起動時にデータベースのテーブルを準備する
     init_db()
-    
+    listener = get_log_listener()
+
     if 'initialized' not in st.session_state:
+        # 読み込みより前の version を覚えておく（読み込み中に届いた通知を取りこぼさない）
+        st.session_state.log_version = listener.version
+        # 通知の送り元としての、このセッションの識別子（自分の書き込みの通知では読み直さない）
+        st.session_state.session_origin = uuid.uuid4().hex[:12]
         saved_data = load_data_from_db() # ★変更
         
         st.session_state.auth_status = None
@@ -289,17 +294,7 @@ def init_session_state():
         st.session_state.editing_match_id = None
 
         if saved_data:
-            st.session_state.app_title = saved_data.get('app_title', "パテントカップ2025")
-            st.session_state.teams_reg = saved_data.get('teams_reg', DEFAULT_TEAMS_REGULAR.copy())
-            st.session_state.teams_mix = saved_data.get('teams_mix', DEFAULT_TEAMS_MIX.copy())
-            st.session_state.results = saved_data.get('results', {})
-            st.session_state.tourn_results = saved_data.get('tourn_results', {})
-            st.session_state.court_mode = saved_data.get('court_mode', "4面")
-            st.session_state.start_time_hour = saved_data.get('start_time_hour', 13)
-            st.session_state.start_time_minute = saved_data.get('start_time_minute', 15)
-            st.session_state.league_duration = saved_data.get('league_duration', 7)
-            st.session_state.tourn_duration = saved_data.get('tourn_duration', 10)
-            st.session_state.interval_duration = saved_data.get('interval_duration', 15)
+            apply_saved_data(saved_data)
         else:
             if 'app_title' not in st.session_state: st.session_state.app_title = "パテントカップ2025"
             if 'teams_reg' not in st.session_state: st.session_state.teams_reg = DEFAULT_TEAMS_REGULAR.copy()
@@ -314,6 +309,14 @@ def init_session_state():
             if 'interval_duration' not in st.session_state: st.session_state.interval_duration = 15
         
         st.session_state.initialized = True
+    elif st.session_state.log_version != listener.version:
+        # 他の端末・プロセスの書き込みを取り込む（キャッシュは通知を受けた時点で破棄済み）
+        version = listener.version
+        changed = listener.changed_by_others(st.session_state.log_version, st.session_state.session_origin)
+        st.session_state.log_version = version
+        if changed:
+            saved_data = load_data_from_db()
+            if saved_data: apply_saved_data(saved_data)
 
     query_params = st.query_params
     if st.session_state.auth_status is None:
@@ -519,6 +522,21 @@ def render_graphviz_bracket(cup_name, team_list, league, league_label):
     """
     st.graphviz_chart(dot_code)
 
+@st.fragment(run_every=1)
+def watch_log_updates():
+    """
+    1秒ごとに、通知で version が進んでいないかだけを見る（プロセス内の値なので DB には問い合わせない）。
+    他のセッションの書き込みがあれば画面全体を再実行し、init_session_state で最新の状態を取り込む。
+    このセッション自身の書き込みの通知だけなら、画面は書き込んだときに更新済みなので、
+    version を覚え直すだけで再実行しない（この fragment の中だけで済ませる）。
+    """
+    listener = get_log_listener()
+    version = listener.version
+    if st.session_state.log_version == version: return
+    if listener.changed_by_others(st.session_state.log_version, st.session_state.session_origin):
+        st.rerun()
+    st.session_state.log_version = version
+
 # ==========================================
 # 4. メイン処理
 # ==========================================
@@ -526,6 +544,7 @@ init_session_state()
 
 if check_password():
     is_admin = (st.session_state.auth_status == "admin")
+    watch_log_updates()
     
     if is_admin:
         with st.expander("⚙️ 管理者設定 (設定・リセット)", expanded=False):
@@ -617,6 +636,7 @@ if check_password():
                                 text("INSERT INTO patent_cup_logs (log_type, log_data) VALUES (:type, CAST(:data AS JSONB));"),
                                 {"type": "init", "data": json.dumps(default_data, ensure_ascii=False)}
                             )
+                            s.execute(text(NOTIFY_SQL), {"payload": notify_payload("init")})
                             s.commit()
                         
                         load_data_from_db.clear()
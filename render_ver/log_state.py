@@ -0,0 +1,71 @@
+"""
+PostgreSQL 版の状態復元（Streamlit に依存しない）。
+
+ログ（patent_cup_logs）を全件アプリに送って Python で再生する代わりに、
+DB 側で「最新の init 行」と「それ以降の、試合キーごとの最新の結果」だけを選んで返す。
+返ってくる行数は「試合数 + 1」で、ログがどれだけ伸びても変わらない。
+"""
+import json
+
+SCHEMA_SQL = [
+    """
+    CREATE TABLE IF NOT EXISTS patent_cup_logs (
+        id SERIAL PRIMARY KEY,
+        log_type VARCHAR(50),
+        log_data JSONB,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    # 最新の init 行を1件で引く
+    "CREATE INDEX IF NOT EXISTS patent_cup_logs_init_idx ON patent_cup_logs (id DESC) WHERE log_type = 'init';",
+    # (トーナメントか, 試合キー, id DESC) の順に並んだ索引で、キーごとの最新行を DISTINCT ON で拾う
+    """
+    CREATE INDEX IF NOT EXISTS patent_cup_logs_match_key_idx ON patent_cup_logs
+        ((COALESCE(log_data->>'t', 'false') = 'true'), (log_data->>'k'), id DESC)
+        WHERE log_type = 'match';
+    """,
+]
+
+# 1行目: 最新の init（無ければ0行）/ 2行目以降: init より後の、試合キーごとの最新の結果
+STATE_SQL = """
+WITH last_init AS (
+    SELECT id, log_data FROM patent_cup_logs
+    WHERE log_type = 'init'
+    ORDER BY id DESC LIMIT 1
+)
+SELECT 'init' AS log_type, NULL::boolean AS is_tourn, NULL::text AS match_key, log_data AS payload
+FROM last_init
+UNION ALL
+SELECT * FROM (
+    SELECT DISTINCT ON (COALESCE(l.log_data->>'t', 'false') = 'true', l.log_data->>'k')
+        'match', COALESCE(l.log_data->>'t', 'false') = 'true', l.log_data->>'k', l.log_data->'v'
+    FROM patent_cup_logs l JOIN last_init i ON l.id > i.id
+    WHERE l.log_type = 'match'
+    ORDER BY COALESCE(l.log_data->>'t', 'false') = 'true', l.log_data->>'k', l.id DESC
+) latest
+"""
+
+
+def _decode(value):
+    # ドライバによっては JSONB が文字列のまま返ってくる
+    return json.loads(value) if isinstance(value, str) else value
+
+
+def state_from_rows(rows):
+    """
+    STATE_SQL の結果 [(log_type, is_tourn, match_key, payload), ...] から最新状態を組み立てる。
+    init が無ければ None
+    """
+    current_data = None
+    matches = []
+    for log_type, is_tourn, match_key, payload in rows:
+        if log_type == 'init':
+            current_data = _decode(payload)
+        else:
+            matches.append((is_tourn, match_key, payload))
+
+    if not current_data: return None
+    for is_tourn, match_key, payload in matches:
+        target = 'tourn_results' if is_tourn else 'results'
+        current_data[target][match_key] = _decode(payload)
+    return current_data
@@ -0,0 +1,123 @@
+"""
+リーグ戦の対戦表を自動生成するロジック（Streamlit に依存しない）。
+
+チーム数・コート数が固定テンプレートに合わない大会向け。
+1. サークル方式で各リーグの対戦カードを節ごとに作る
+2. 時間帯ごとに、コート数の範囲で対戦カードを詰めていく
+   - 同じ時間帯に同じチームは1試合まで
+   - 直前の時間帯に試合をしたチームは、他に入れられる試合がある限り休ませる
+   - 残り試合数の多いチームを優先する（試合帯の総数を減らすため）
+   対戦カードは優先度のヒープに入れておき、時間帯ごとに全カードを並べ直さない
+   （残り試合数は減る一方なので、取り出したときに優先度が古ければ入れ直すだけでよい）。
+"""
+import heapq
+from datetime import timedelta
+
+COURT_NAMES = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def team_code(i):
+    """0 → A, 25 → Z, 26 → AA ... のチーム記号（試合キーの区切り '_' を含まない）"""
+    code = ""
+    i += 1
+    while i:
+        i, r = divmod(i - 1, 26)
+        code = chr(65 + r) + code
+    return code
+
+
+def round_robin_rounds(codes, rounds=None):
+    """
+    サークル方式の総当たり。各節で全チームが最大1試合ずつ戦う。
+    rounds を指定すると最初の rounds 節だけを返す（＝各チーム rounds 試合）。
+    """
+    ring = list(codes) + ([None] if len(codes) % 2 else [])
+    n_rounds = len(ring) - 1
+    if rounds is not None: n_rounds = min(rounds, n_rounds)
+    result = []
+    for r in range(n_rounds):
+        pairs = []
+        for j in range(len(ring) // 2):
+            home, away = ring[j], ring[-1 - j]
+            if home is None or away is None: continue
+            # 同じチームがいつもホーム側にならないよう、節ごとに左右を入れ替える
+            pairs.append((home, away) if (r + j) % 2 == 0 else (away, home))
+        result.append(pairs)
+        ring = [ring[0], ring[-1]] + ring[1:-1]
+    return result
+
+
+def generate_league_schedule(teams_by_league, courts, slot_minutes=None, start=None, games_per_team=None,
+                             rounds_by_league=None):
+    """
+    teams_by_league: {"reg": [チーム記号...], "mix": [...]}
+    courts: 使えるコート数（全リーグで共有）
+    slot_minutes / start: 指定すると各時間帯に "time" を付ける
+    games_per_team: 1チームあたりの試合数（None なら総当たり）
+    rounds_by_league: {リーグ: [[(ホーム, アウェイ), ...], ...]} 指定したリーグは、総当たりの代わりにこの節の対戦カードを使う
+
+    戻り値は Tab 2 がそのまま描画できる形（"r" はその対戦カードのリーグ内での節番号。詰め方に依存しない）:
+        [{"time": datetime or None, "games": [{"type": "reg", "c": "A", "p": ("A", "E"), "r": 0}, ...]}, ...]
+    """
+    if courts < 1: raise ValueError("courts must be >= 1")
+    rounds_by_league = rounds_by_league or {}
+
+    # (節番号, リーグ, ホーム, アウェイ)。各リーグの節を交互に並べておく
+    pending = []
+    for league, codes in teams_by_league.items():
+        rounds = rounds_by_league.get(league)
+        if rounds is None: rounds = round_robin_rounds(codes, games_per_team)
+        for r, pairs in enumerate(rounds):
+            pending.extend((r, league, h, a) for h, a in pairs)
+    pending.sort(key=lambda m: m[0])
+
+    remaining = {}
+    for _, league, h, a in pending:
+        remaining[(league, h)] = remaining.get((league, h), 0) + 1
+        remaining[(league, a)] = remaining.get((league, a), 0) + 1
+
+    def priority(m):
+        # 残り試合の多いチームを含むカードから順に検討（同点なら節の早い順）
+        return -max(remaining[(m[1], m[2])], remaining[(m[1], m[3])]), m[0]
+
+    heap = [(priority(m), i, m) for i, m in enumerate(pending)]
+    heapq.heapify(heap)
+    slots = []
+    last_played = set()
+    while heap:
+        chosen = _fill_slot(heap, priority, courts, avoid=last_played)
+        if not chosen:
+            # 休ませると1試合も組めない場合だけ、連戦を許す
+            chosen = _fill_slot(heap, priority, courts, avoid=set())
+
+        games = []
+        last_played = set()
+        for c, (r, league, h, a) in enumerate(chosen):
+            games.append({"type": league, "c": COURT_NAMES[c], "p": (h, a), "r": r})
+            remaining[(league, h)] -= 1; remaining[(league, a)] -= 1
+            last_played.add((league, h)); last_played.add((league, a))
+
+        time = start + timedelta(minutes=len(slots) * slot_minutes) if start is not None and slot_minutes else None
+        slots.append({"time": time, "games": games})
+    return slots
+
+
+def _fill_slot(heap, priority, courts, avoid):
+    """ヒープから優先度順にカードを取り出して1つの時間帯を埋める（選んだカードはヒープから除かれる）"""
+    chosen, busy, skipped = [], set(), []
+    while heap and len(chosen) < courts:
+        entry = heapq.heappop(heap)
+        key, i, m = entry
+        current = priority(m)
+        if key != current:
+            heapq.heappush(heap, (current, i, m)) # 前の時間帯で残り試合数が減った
+            continue
+        _, league, h, a = m
+        if (league, h) in busy or (league, a) in busy or (league, h) in avoid or (league, a) in avoid:
+            skipped.append(entry)
+            continue
+        chosen.append(m)
+        busy.add((league, h)); busy.add((league, a))
+    for entry in skipped:
+        heapq.heappush(heap, entry)
+    return chosen
@@ -0,0 +1,149 @@
+"""
+順位表の集計ロジック（Streamlit に依存しない）。
+
+リーグ戦の結果をチーム単位の集計値として保持しておき、
+試合結果が1件書き込まれるたびに、その2チーム分だけを O(1) で更新する。
+全件からの再集計（ログ再生時）は、結果が多いときだけ、結果を一度だけ列配列にしてから
+pandas/NumPy の group-by でまとめて計算する。
+pandas/NumPy は読み込みに時間がかかるので、表（DataFrame）を作る・列データで集計するときにだけ読み込む。
+"""
+LEAGUES = ("reg", "mix")
+STAT_COLUMNS = ["勝点", "試合数", "勝", "引", "負", "得点", "失点", "得失差"]
+# 結果がこれより少なければ、1件ずつ加算する方が group-by より速い（pandas も読み込まずに済む）
+COLUMNAR_MIN_RESULTS = 5000
+
+
+def parse_match_key(match_key):
+    """'reg_0_A_E' のような試合キーを (リーグ, ホーム, アウェイ) に分解する。形式外なら None"""
+    parts = match_key.split("_")
+    if len(parts) < 4: return None
+    return parts[0], parts[2], parts[3]
+
+
+def _add_side(stats, gf, ga, sign):
+    stats["試合数"] += sign; stats["得点"] += sign * gf; stats["失点"] += sign * ga; stats["得失差"] += sign * (gf - ga)
+    if gf > ga: stats["勝点"] += sign * 3; stats["勝"] += sign
+    elif gf == ga: stats["勝点"] += sign; stats["引"] += sign
+    else: stats["負"] += sign
+
+
+def apply_result(agg, match_key, res, sign=1):
+    """
+    1試合分の結果を集計に加算する（sign=-1 で取り消し）。
+    スコア未入力の結果や、形式外のキーは何もしない。
+    """
+    if not res or res.get('s1') is None or res.get('s2') is None: return
+    parsed = parse_match_key(match_key)
+    if not parsed: return
+    league, home, away = parsed
+    table = agg.setdefault(league, {})
+    s1, s2 = res['s1'], res['s2']
+    _add_side(table.setdefault(home, dict.fromkeys(STAT_COLUMNS, 0)), s1, s2, sign)
+    _add_side(table.setdefault(away, dict.fromkeys(STAT_COLUMNS, 0)), s2, s1, sign)
+
+
+def update_result(agg, match_key, old_res, new_res):
+    """結果の上書き: 古いスコアを差し引いてから新しいスコアを足す"""
+    apply_result(agg, match_key, old_res, sign=-1)
+    apply_result(agg, match_key, new_res)
+
+
+def results_to_columns(results):
+    """
+    結果の dict を一度だけ走査して、列（league, home, away, s1, s2）の DataFrame にする。
+    スコア未入力・形式外のキーはここで落とす。
+    """
+    import numpy as np
+    import pandas as pd
+    leagues, homes, aways, s1s, s2s = [], [], [], [], []
+    for key, res in results.items():
+        if not res or res.get('s1') is None or res.get('s2') is None: continue
+        parsed = parse_match_key(key)
+        if not parsed: continue
+        leagues.append(parsed[0]); homes.append(parsed[1]); aways.append(parsed[2])
+        s1s.append(res['s1']); s2s.append(res['s2'])
+    return pd.DataFrame({
+        "league": pd.Series(leagues, dtype=object), "home": pd.Series(homes, dtype=object), "away": pd.Series(aways, dtype=object),
+        "s1": np.array(s1s, dtype=np.int64), "s2": np.array(s2s, dtype=np.int64),
+    })
+
+
+def team_totals(cols, league):
+    """列データから、チームごとの集計値を group-by で求める（index はチーム記号）"""
+    import numpy as np
+    import pandas as pd
+    m = cols[cols["league"] == league]
+    team = np.concatenate([m["home"].to_numpy(), m["away"].to_numpy()])
+    gf = np.concatenate([m["s1"].to_numpy(), m["s2"].to_numpy()])
+    ga = np.concatenate([m["s2"].to_numpy(), m["s1"].to_numpy()])
+    diff = gf - ga
+    win, draw, lose = (diff > 0).astype(np.int64), (diff == 0).astype(np.int64), (diff < 0).astype(np.int64)
+    per_side = pd.DataFrame({
+        "team": team, "勝点": 3 * win + draw, "試合数": np.ones(len(team), dtype=np.int64),
+        "勝": win, "引": draw, "負": lose, "得点": gf, "失点": ga, "得失差": diff,
+    })
+    return per_side.groupby("team", sort=False)[STAT_COLUMNS].sum()
+
+
+def build_standings(results, scheduled=None):
+    """
+    全結果からの再集計（ログ再生直後・対戦表が変わったときにだけ使う）。
+    scheduled（試合キーの集合）を渡すと、その中の試合だけを数える
+    （チーム数を変えて対戦表から消えた試合の結果を、順位に残さない）。
+    """
+    if scheduled is not None:
+        results = {key: res for key, res in results.items() if key in scheduled}
+    if len(results) < COLUMNAR_MIN_RESULTS:
+        agg = {league: {} for league in LEAGUES}
+        for key, res in results.items():
+            apply_result(agg, key, res)
+        return agg
+    cols = results_to_columns(results)
+    return {league: team_totals(cols, league).to_dict("index") for league in LEAGUES}
+
+
+def _rank(df):
+    df = df.sort_values(by=["勝点", "得失差", "得点", "SortIndex"], ascending=[False, False, False, True])
+    df.insert(0, "順位", range(1, len(df) + 1))
+    return df
+
+
+def standings_frame(table, teams_map):
+    """集計値から順位表の DataFrame を作る（並び順: 勝点 → 得失差 → 得点 → チームの登録順）"""
+    import pandas as pd
+    data = []
+    for i, (code, name) in enumerate(teams_map.items()):
+        stats = {"チーム名": name, "Code": code}
+        stats.update(table.get(code) or dict.fromkeys(STAT_COLUMNS, 0))
+        stats["SortIndex"] = i
+        data.append(stats)
+    return _rank(pd.DataFrame(data))
+
+
+def ranked_team_codes(table, teams_map):
+    """standings_frame と同じ並び順のチーム記号のリスト（同名のチームがあっても区別できる）"""
+    empty = dict.fromkeys(STAT_COLUMNS, 0)
+    def sort_key(item):
+        i, code = item
+        stats = table.get(code) or empty
+        return -stats["勝点"], -stats["得失差"], -stats["得点"], i
+    return [code for _, code in sorted(enumerate(teams_map), key=sort_key)]
+
+
+def ranked_team_names(table, teams_map):
+    """standings_frame と同じ並び順のチーム名だけのリスト（表を作らないので pandas を使わない）"""
+    return [teams_map[code] for code in ranked_team_codes(table, teams_map)]
+
+
+def standings_rows(table, teams_map):
+    """
+    standings_frame と同じ行・列（SortIndex を除く）の dict のリスト。
+    観戦者向けの HTML や JSON を作るときに使う（pandas を使わない）
+    """
+    rows = []
+    for rank, code in enumerate(ranked_team_codes(table, teams_map), 1):
+        stats = table.get(code) or dict.fromkeys(STAT_COLUMNS, 0)
+        row = {"順位": rank, "チーム名": teams_map[code], "Code": code}
+        row.update((c, int(stats[c])) for c in STAT_COLUMNS)
+        rows.append(row)
+    return rows
@@ -0,0 +1,636 @@
+"""
+大会データの保存先（Streamlit に依存しない）。
+
+どの保存先も「スナップショット（基本データ）+ 追記ログ」の形で持ち、同じ操作で読み書きできる:
+  load_state()                                   最新状態を復元する（何も無ければ None）
+  append_result(match_key, result, is_tournament) 試合結果を1件追記する
+  append_settings(settings)                      設定（試合結果以外の項目）の変更を追記する
+  write_snapshot(data)                           ログを捨てて data を新しいスナップショットにする
+  reset()                                        全て消す
+  compact()                                      ログを現在の状態に畳み込む（畳み込んだら True）
+
+実装:
+  MemoryStorage   プロセス内のみ（確認・ベンチマークの基準用）
+  SQLiteStorage   ローカルの SQLite ファイル（会場のノートPC 1台で完結させる場合）
+  SheetsStorage   Google スプレッドシート（A1 = スナップショット, B1 = バージョン, 2行目以降 = ログ）
+  PostgresStorage PostgreSQL（render_ver と同じテーブル・同じ SQL）
+  JournaledStorage ローカルのジャーナル + 同期スレッド越しのリモート（app.py の既定。リモートはスプレッドシート）
+
+シートのログ形式と差分読み込み・圧縮の処理は app.py と共有する（replay_sheet / compact_sheet）。
+シートへの接続（sheets_client / spreadsheet_from_secrets / tournament_worksheet）は app.py と、
+シートを取り込むだけの別プロセス（api.py / publish.py の sheet_reader）で共有する。
+"""
+import copy
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from journal import SyncWorker, new_cursor
+
+SETTINGS_LOG_KEY = "__settings__" # ジャーナルでの設定の変更のキー（試合キーと重ならない）
+VERSION_CELL = "B1" # 書き込みのたびに進めるバージョン番号（読む側はまずここだけ見る）
+LEASE_CELL = "C1" # ログ圧縮中の端末（"端末ID:期限"）。複数の端末が同時に圧縮しないための目印
+SECRETS_FILE = os.path.join(".streamlit", "secrets.toml") # Streamlit 以外のプロセスが読む secrets（app.py と同じファイル）
+SHEETS_SCOPES = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+
+
+def result_log(match_key, result, is_tournament=False):
+    """試合結果のログ1行（{'k': match_key, 'v': result, 't': is_tournament, 'id': 書き込みID}）"""
+    return {'k': match_key, 'v': result, 't': is_tournament, 'id': uuid.uuid4().hex}
+
+
+def settings_log(settings):
+    """設定の変更のログ1行（{'s': {設定項目: 値}, 'id': 書き込みID}）"""
+    return {'s': settings, 'id': uuid.uuid4().hex}
+
+
+def apply_log_row(current_data, raw):
+    """
+    ログ1行を状態に上書き適用し、ログの書き込みID（古いログには無い）を返す。
+    ログの形式: [json_string] (中身は {'k': match_key, 'v': result, 't': is_tournament, 'id': 書き込みID})
+    設定の変更は {'s': {設定項目: 値}, 'id': 書き込みID} の形で追記される。
+    """
+    if not raw: return None
+    try:
+        log = json.loads(raw)
+        if 's' in log:
+            current_data.update(log['s'])
+            return log.get('id')
+        m_key = log.get('k')
+        res = log.get('v')
+        is_tourn = log.get('t')
+
+        if is_tourn:
+            current_data['tourn_results'][m_key] = res
+        else:
+            current_data['results'][m_key] = res
+        return log.get('id')
+    except:
+        return None # 壊れたログは無視
+
+
+def journal_state(journal, tid, empty_state=None):
+    """
+    ローカルのジャーナルから最新状態を復元する（リモートへの通信なし）。
+    取り込み済みのリモート側の状態に、まだ取り込まれていないローカルの書き込みを重ねる。
+    リモートの状態が無い（取り込めていない・空）場合、empty_state() があればその上に重ねる
+    （オフラインで起動したときも、手元の入力を見せるため）。どちらも無ければ None
+    """
+    cursor, rows = journal.local_state(tid)
+    if cursor and cursor['data'] is not None:
+        current_data = cursor['data']
+    elif rows and empty_state is not None:
+        current_data = empty_state()
+    else:
+        return None
+    for raw in rows:
+        apply_log_row(current_data, raw)
+    return current_data
+
+
+class Storage:
+    """保存先の共通インターフェース"""
+
+    def load_state(self):
+        raise NotImplementedError
+
+    def append_result(self, match_key, result, is_tournament=False):
+        raise NotImplementedError
+
+    def append_settings(self, settings):
+        raise NotImplementedError
+
+    def write_snapshot(self, data):
+        raise NotImplementedError
+
+    def reset(self):
+        raise NotImplementedError
+
+    def compact(self):
+        """
+        ログを現在の状態に畳み込む。
+        この既定の実装は読んでから書くだけなので、複数の書き手がいる保存先では上書きすること。
+        """
+        data = self.load_state()
+        if data is None: return False
+        self.write_snapshot(data)
+        return True
+
+
+# ==========================================
+# プロセス内
+# ==========================================
+
+class MemoryStorage(Storage):
+    """他の保存先と同じく JSON 文字列で持つ（呼び出し側が状態を書き換えても保存内容は変わらない）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._log = []
+
+    def load_state(self):
+        with self._lock:
+            snapshot, log = self._snapshot, list(self._log)
+        if snapshot is None: return None
+        current_data = json.loads(snapshot)
+        for raw in log:
+            apply_log_row(current_data, raw)
+        return current_data
+
+    def _append(self, log):
+        raw = json.dumps(log, ensure_ascii=False)
+        with self._lock:
+            self._log.append(raw)
+
+    def append_result(self, match_key, result, is_tournament=False):
+        self._append(result_log(match_key, result, is_tournament))
+
+    def append_settings(self, settings):
+        self._append(settings_log(settings))
+
+    def write_snapshot(self, data):
+        snapshot = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            self._snapshot, self._log = snapshot, []
+
+    def reset(self):
+        with self._lock:
+            self._snapshot, self._log = None, []
+
+    def compact(self):
+        with self._lock:
+            if self._snapshot is None: return False
+            current_data = json.loads(self._snapshot)
+            for raw in self._log:
+                apply_log_row(current_data, raw)
+            self._snapshot, self._log = json.dumps(current_data, ensure_ascii=False), []
+            return True
+
+
+# ==========================================
+# SQLite
+# ==========================================
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS snapshot (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    is_tourn INTEGER NOT NULL,
+    key TEXT NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS logs_key ON logs (is_tourn, key, id);
+CREATE TABLE IF NOT EXISTS settings_logs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    data TEXT NOT NULL
+);
+"""
+
+
+class SQLiteStorage(Storage):
+    """
+    スナップショット1行 + 結果のログ + 設定の変更のログ。
+    状態の復元では、試合キーごとの最新の結果だけを SQL で選ぶ（ログの長さに比例して Python で再生しない）。
+    設定の変更は項目の一部だけのこともあるので、順に全て重ねる（管理者の操作でしか増えない）。
+    """
+
+    def __init__(self, path):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SQLITE_SCHEMA)
+
+    def _load(self):
+        row = self._conn.execute("SELECT data FROM snapshot WHERE id = 1").fetchone()
+        if not row: return None
+        current_data = json.loads(row[0])
+        for (settings,) in self._conn.execute("SELECT data FROM settings_logs ORDER BY id"):
+            current_data.update(json.loads(settings))
+        latest = self._conn.execute(
+            "SELECT is_tourn, key, result FROM logs"
+            " WHERE id IN (SELECT MAX(id) FROM logs GROUP BY is_tourn, key) ORDER BY id")
+        for is_tourn, key, result in latest:
+            current_data['tourn_results' if is_tourn else 'results'][key] = json.loads(result)
+        return current_data
+
+    def _replace(self, data):
+        self._conn.execute("DELETE FROM logs")
+        self._conn.execute("DELETE FROM settings_logs")
+        self._conn.execute("DELETE FROM snapshot")
+        if data is not None:
+            self._conn.execute("INSERT INTO snapshot (id, data) VALUES (1, ?)", (json.dumps(data, ensure_ascii=False),))
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn()
+                self._conn.execute("COMMIT")
+                return out
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def load_state(self):
+        with self._lock:
+            return self._load()
+
+    def append_result(self, match_key, result, is_tournament=False):
+        with self._lock:
+            self._conn.execute("INSERT INTO logs (is_tourn, key, result) VALUES (?, ?, ?)",
+                               (1 if is_tournament else 0, match_key, json.dumps(result, ensure_ascii=False)))
+
+    def append_settings(self, settings):
+        with self._lock:
+            self._conn.execute("INSERT INTO settings_logs (data) VALUES (?)", (json.dumps(settings, ensure_ascii=False),))
+
+    def write_snapshot(self, data):
+        self._transaction(lambda: self._replace(data))
+
+    def reset(self):
+        self._transaction(lambda: self._replace(None))
+
+    def compact(self):
+        def fold():
+            data = self._load()
+            if data is None: return False
+            self._replace(data)
+            return True
+        return self._transaction(fold)
+
+
+# ==========================================
+# Google スプレッドシート
+# ==========================================
+
+def _first_cell(rows):
+    return rows[0][0] if rows and rows[0] else ""
+
+
+def next_version(version):
+    """
+    B1セルのバージョン番号を進めた値（"連番-乱数"）。
+    別の端末と同時に同じ連番を書いても、乱数部分で必ず「変わった」と分かるようにする。
+    """
+    try:
+        n = int(str(version).split("-")[0]) + 1
+    except ValueError:
+        n = 1
+    return f"{n}-{uuid.uuid4().hex[:8]}"
+
+
+def replay_sheet(sheet, cursor):
+    """
+    【追記型・差分読み込み】
+    A1セルの「基本データ」に、2行目以降の「変更ログ」をカーソル位置から適用する。
+    前回どの行まで適用したかを覚えておき、次回は A1 と「最後に適用した行」以降だけを範囲取得する。
+    A1 が変わった（＝スナップショット作成・初期化された）場合だけ全件を読み直す。
+    B1 のバージョンが前回と同じなら、ログは読まない（B1 を読む1回だけで済む）。
+    戻り値: (全件読み直したか, 適用したログの書き込みID)
+    """
+    if cursor['data'] is not None:
+        if cursor.get('version') and _first_cell(sheet.get(VERSION_CELL)) == cursor['version']:
+            return False, []
+        # A1・B1 と、最後に適用した行から下だけを1回のリクエストで取得
+        snap_rows, version_rows, tail_rows = sheet.batch_get(["A1", VERSION_CELL, f"A{cursor['last_row']}:A"])
+        tail = [row[0] if row else "" for row in tail_rows]
+        # 最後に適用した行が同じ内容で残っていれば、それより後ろだけ適用すればよい
+        if _first_cell(snap_rows) == cursor['snapshot'] and tail and tail[0] == cursor['last_raw']:
+            ids = [apply_log_row(cursor['data'], raw) for raw in tail[1:]]
+            cursor['log_bytes'] = (cursor.get('log_bytes') or 0) + sum(len(raw.encode()) for raw in tail[1:])
+            cursor['last_row'] += len(tail) - 1
+            cursor['last_raw'] = tail[-1]
+            cursor['version'] = _first_cell(version_rows) or None
+            return False, ids
+
+    # 初回 or スナップショットが変わった場合はシート全体を読み直す
+    all_values = sheet.get_all_values()
+
+    if not all_values: return True, []
+
+    # 1行目（A1）は基本データ
+    try:
+        current_data = json.loads(all_values[0][0])
+    except:
+        return True, [] # データが壊れている場合
+
+    # 2行目以降は「変更ログ」なので、順番に適用していく
+    ids = []
+    for row in all_values[1:]:
+        if row and row[0]:
+            ids.append(apply_log_row(current_data, row[0]))
+
+    if cursor['snapshot'] != all_values[0][0]:
+        cursor['snapshot_at'] = time.time()
+    cursor['snapshot'] = all_values[0][0]
+    cursor['log_bytes'] = sum(len(row[0].encode()) for row in all_values[1:] if row)
+    cursor['last_row'] = len(all_values)
+    cursor['last_raw'] = all_values[-1][0] if all_values[-1] else ""
+    cursor['data'] = current_data
+    cursor['version'] = all_values[0][1] if len(all_values[0]) > 1 and all_values[0][1] else None
+    return True, ids
+
+
+def compact_sheet(sheet, cursor, node_id):
+    """
+    【ログ圧縮】
+    取り込み済みのログ（2〜N行目）を、その時点の状態として A1 に畳み込む。
+    シートを丸ごと消すのではなく「取り込み済みの行だけ」を削除するので、
+    圧縮中に他の端末が追記した行（N+1行目以降）は上に詰まるだけで消えない。
+    A1/B1 の書き換えと行の削除は1回の batch_update で行う（途中の状態を他の端末に見せない）。
+    成功したら cursor を圧縮後の状態に更新して True を返す。
+    """
+    n = cursor['last_row']
+    now = time.time()
+    # 1. 他の端末が圧縮中なら今回は見送る
+    lease = _first_cell(sheet.get(LEASE_CELL))
+    if lease:
+        owner, _, expires = lease.partition(":")
+        try:
+            if owner != node_id and float(expires) > now: return False
+        except ValueError:
+            pass
+    my_lease = f"{node_id}:{now + 60}"
+    sheet.update(range_name=LEASE_CELL, values=[[my_lease]], value_input_option="RAW")
+
+    # 2. 目印が自分のもので、A1 と N 行目が取り込んだときのままであることを確認
+    snap_rows, lease_rows, tail_rows = sheet.batch_get(["A1", LEASE_CELL, f"A{n}:A{n}"])
+    if _first_cell(lease_rows) != my_lease: return False
+    if _first_cell(snap_rows) != cursor['snapshot'] or _first_cell(tail_rows) != (cursor['last_raw'] or ""): return False
+
+    # 3. A1/B1 を新しいスナップショットにし、目印を消し、2〜N行目を削除する
+    json_str = json.dumps(cursor['data'], ensure_ascii=False)
+    version = next_version(cursor.get('version'))
+    sheet.spreadsheet.batch_update({"requests": [
+        {"updateCells": {
+            "range": {"sheetId": sheet.id, "startRowIndex": 0, "endRowIndex": 1, "startColumnIndex": 0, "endColumnIndex": 3},
+            "rows": [{"values": [{"userEnteredValue": {"stringValue": json_str}},
+                                 {"userEnteredValue": {"stringValue": version}}, {}]}],
+            "fields": "userEnteredValue"}},
+        {"deleteDimension": {"range": {"sheetId": sheet.id, "dimension": "ROWS", "startIndex": 1, "endIndex": n}}},
+    ]})
+    # B1 は他の端末の追記に伴う書き換えを上書きした可能性があるので、次の pull では必ずログ末尾を読む
+    cursor.update({'snapshot': json_str, 'last_row': 1, 'last_raw': json_str, 'version': None,
+                   'log_bytes': 0, 'snapshot_at': now})
+    return True
+
+
+def load_secrets(path=SECRETS_FILE):
+    """Streamlit の secrets.toml を dict として読む（Streamlit の外から同じ接続情報を使うため）"""
+    import tomllib
+    with open(path, "rb") as f:
+        return tomllib.load(f)
+
+
+def sheets_client(secrets, fake_spec=None, on_request=None):
+    """
+    secrets（st.secrets か load_secrets の dict）の GCP_JSON_KEY で認証した gspread クライアント。
+    アクセストークンの期限切れは google-auth が自動で更新する。
+    fake_spec が None でなければ、認証せずにプロセス内の偽のシート（fake_sheets.py の仕様文字列）を返す。
+    on_request(): Sheets API へのリクエスト1回ごとに呼ぶ関数（計測用。append_rows なども、送った回数だけ呼ばれる）
+    """
+    if fake_spec is not None:
+        from fake_sheets import FakeSheetsService
+        service = FakeSheetsService.from_spec(fake_spec)
+        service.on_request = on_request
+        return service
+    import gspread
+    from google.oauth2.service_account import Credentials
+    creds = Credentials.from_service_account_info(json.loads(secrets["GCP_JSON_KEY"]), scopes=SHEETS_SCOPES)
+    client = gspread.authorize(creds)
+    if on_request is not None:
+        # gspread の API 呼び出しは全て HTTPClient.request を通る
+        request = client.http_client.request
+        def counted_request(*args, **kwargs):
+            on_request()
+            return request(*args, **kwargs)
+        client.http_client.request = counted_request
+    return client
+
+
+def spreadsheet_from_secrets(client, secrets, fake=False):
+    """SPREADSHEET_KEY（ID）でスプレッドシートを開く。未設定なら SPREADSHEET_NAME で探す（偽のシートなら "local"）"""
+    sheet_key = secrets.get("SPREADSHEET_KEY") or ("local" if fake else None)
+    return client.open_by_key(sheet_key) if sheet_key else client.open(secrets["SPREADSHEET_NAME"])
+
+
+def tournament_worksheet(spreadsheet, tid):
+    """大会のワークシート（既定の大会は1枚目。無ければ gspread の WorksheetNotFound）"""
+    return spreadsheet.worksheet(tid) if tid else spreadsheet.sheet1
+
+
+def sheet_reader(journal, tid, open_sheet, **kwargs):
+    """
+    シートの新しいログをジャーナルに取り込むだけの同期スレッド（送信・圧縮は書き込む側のプロセスが行う）。
+    Streamlit のセッションが無くても最新の状態を返す・書き出すプロセス（api.py / publish.py）で使う。
+    open_sheet(): ワークシートを返す関数。取り込みに失敗したら、次の周期で開き直す。
+    kwargs は SyncWorker にそのまま渡す（pull_interval / idle_backoff / on_change など）。
+    """
+    handle = {}
+
+    def pull(cursor):
+        if 'sheet' not in handle: handle['sheet'] = open_sheet()
+        try:
+            return replay_sheet(handle['sheet'], cursor)
+        except Exception:
+            handle.clear()
+            raise
+
+    return SyncWorker(journal, tid, push_fn=None, pull_fn=pull, **kwargs)
+
+
+class SheetsStorage(Storage):
+    """
+    gspread のワークシート1枚。カーソルを持ち続けるので、2回目以降の load_state は差分だけを読む。
+    app.py も、ジャーナルからの送信（append_rows）とスナップショットの書き直しにこのクラスを使う。
+    known_version(): 呼び出し側が知っている最新のバージョン（B1）を返す関数。
+    省略時はこのハンドルが最後に読み書きしたもの（app.py はジャーナルに保存したものを渡す）。
+    """
+
+    def __init__(self, sheet, node_id=None, known_version=None):
+        self.sheet = sheet
+        self.node_id = node_id or uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        self._cursor = new_cursor()
+        self._known_version = known_version or (lambda: self._cursor.get('version'))
+
+    @property
+    def cursor(self):
+        """取り込み・書き込み済みの位置（write_snapshot の直後なら、書いたスナップショットの位置）"""
+        return self._cursor
+
+    def load_state(self):
+        with self._lock:
+            replay_sheet(self.sheet, self._cursor)
+            return copy.deepcopy(self._cursor['data'])
+
+    def append_rows(self, raws, empty_snapshot=None):
+        """
+        ログの行（JSON 文字列）をまとめて追記し、B1 のバージョンを進める（追記 → バージョンの順なので、読む側は取りこぼさない）。
+        empty_snapshot を渡すと、A1 が空ならまずそれを A1 に書く（ログを A1 に書かないため）。
+        """
+        with self._lock:
+            version = next_version(self._known_version())
+            if empty_snapshot is not None and not self.sheet.get("A1"):
+                self.sheet.update(range_name=f"A1:{VERSION_CELL}", values=[[json.dumps(empty_snapshot, ensure_ascii=False), version]],
+                                  value_input_option="RAW")
+            self.sheet.append_rows([[raw] for raw in raws])
+            self.sheet.update(range_name=VERSION_CELL, values=[[version]], value_input_option="RAW")
+
+    def append_result(self, match_key, result, is_tournament=False):
+        self.append_rows([json.dumps(result_log(match_key, result, is_tournament), ensure_ascii=False)])
+
+    def append_settings(self, settings):
+        self.append_rows([json.dumps(settings_log(settings), ensure_ascii=False)])
+
+    def write_snapshot(self, data):
+        """シートを一旦クリアして、A1（基本データ）とB1（バージョン）だけ書き直す。カーソルは書いた内容の位置にする"""
+        json_str = json.dumps(data, ensure_ascii=False)
+        with self._lock:
+            version = next_version(self._known_version())
+            self.sheet.clear()
+            self.sheet.update(range_name=f"A1:{VERSION_CELL}", values=[[json_str, version]], value_input_option="RAW")
+            # 書いた直後の状態は分かっているので、次の load_state で全件を読み直さない
+            self._cursor = {'snapshot': json_str, 'last_row': 1, 'last_raw': json_str, 'data': json.loads(json_str),
+                            'version': version, 'log_bytes': 0, 'snapshot_at': time.time()}
+
+    def reset(self):
+        with self._lock:
+            self.sheet.clear()
+            self._cursor = new_cursor()
+
+    def compact(self):
+        with self._lock:
+            replay_sheet(self.sheet, self._cursor)
+            if self._cursor['data'] is None: return False
+            # 他の端末が圧縮中・読んだ後にシートが変わった場合は False（次の機会に回す）
+            return self._cursor['last_row'] < 2 or compact_sheet(self.sheet, self._cursor, self.node_id)
+
+
+# ==========================================
+# PostgreSQL
+# ==========================================
+
+class PostgresStorage(Storage):
+    """
+    render_ver と同じ patent_cup_logs テーブル。
+    状態は DB 側で復元し（render_ver/log_state.STATE_SQL）、書き込みのたびに NOTIFY する。
+    engine: SQLAlchemy の Engine（st.connection("postgresql").engine でも、create_engine(dsn) でもよい）
+    """
+
+    def __init__(self, engine):
+        from sqlalchemy import text
+        from render_ver.log_state import SCHEMA_SQL, STATE_SQL, state_from_rows
+        from render_ver.log_notify import NOTIFY_SQL, notify_payload
+        self._text = text
+        self._state_sql = STATE_SQL
+        self._state_from_rows = state_from_rows
+        self._notify_sql = NOTIFY_SQL
+        self._notify_payload = notify_payload
+        self.engine = engine
+        with engine.begin() as conn:
+            for sql in SCHEMA_SQL:
+                conn.execute(text(sql))
+
+    def _insert(self, conn, log_type, log_data, match_key=None):
+        conn.execute(
+            self._text("INSERT INTO patent_cup_logs (log_type, log_data) VALUES (:type, CAST(:data AS JSONB))"),
+            {"type": log_type, "data": json.dumps(log_data, ensure_ascii=False)})
+        conn.execute(self._text(self._notify_sql), {"payload": self._notify_payload(log_type, match_key)})
+
+    def load_state(self):
+        with self.engine.connect() as conn:
+            return self._state_from_rows(conn.execute(self._text(self._state_sql)).all())
+
+    def append_result(self, match_key, result, is_tournament=False):
+        with self.engine.begin() as conn:
+            self._insert(conn, "match", {'k': match_key, 'v': result, 't': is_tournament}, match_key)
+
+    def append_settings(self, settings):
+        # このテーブルには設定だけのログの種類が無いので、render_ver と同じく設定を反映した状態を init 行として追記する
+        # （それより前の試合のログは読まれなくなるので、読んでから書くまでの間は追記を待たせる）
+        with self.engine.begin() as conn:
+            conn.execute(self._text("LOCK TABLE patent_cup_logs IN EXCLUSIVE MODE"))
+            data = self._state_from_rows(conn.execute(self._text(self._state_sql)).all())
+            if data is None: raise ValueError("スナップショットが無い状態では設定を追記できません")
+            data.update(settings)
+            self._insert(conn, "init", data)
+
+    def write_snapshot(self, data):
+        with self.engine.begin() as conn:
+            conn.execute(self._text("DELETE FROM patent_cup_logs"))
+            self._insert(conn, "init", data)
+
+    def reset(self):
+        with self.engine.begin() as conn:
+            conn.execute(self._text("DELETE FROM patent_cup_logs"))
+            conn.execute(self._text(self._notify_sql), {"payload": self._notify_payload("init")})
+
+    def compact(self):
+        with self.engine.begin() as conn:
+            # 畳み込む間だけ追記を待たせる（読み取りは止めない）
+            conn.execute(self._text("LOCK TABLE patent_cup_logs IN EXCLUSIVE MODE"))
+            data = self._state_from_rows(conn.execute(self._text(self._state_sql)).all())
+            if data is None: return False
+            conn.execute(self._text("DELETE FROM patent_cup_logs"))
+            self._insert(conn, "init", data)
+            return True
+
+
+# ==========================================
+# ローカルのジャーナル越し（app.py の既定）
+# ==========================================
+
+class JournaledStorage(Storage):
+    """
+    書き込みはローカルのジャーナルに入れてすぐ戻り、リモートへの送信・取り込みは同期スレッド（journal.SyncWorker）が行う。
+    読み込みもジャーナルから（一度も取り込んでいなければ、その場で1回同期する）。
+    write_fn(data): リモートのスナップショットを data に置き換え（None なら空にし）、ジャーナル側のリモート状態も合わせる関数
+    empty_state(): リモートが空のときの初期状態を返す関数。リモートの状態を取り込めないまま送信待ちがあれば、
+    その上に重ねて返す（送信するときも、空のリモートにはまずこの状態を書く前提）
+    """
+
+    def __init__(self, worker, write_fn, empty_state=None):
+        self.worker = worker
+        self.journal = worker.journal
+        self.tid = worker.tid
+        self._write_fn = write_fn
+        self._empty_state = empty_state
+
+    def load_state(self):
+        if self.journal.remote_cursor(self.tid) is None:
+            self.worker.sync_once()
+        return journal_state(self.journal, self.tid, self._empty_state)
+
+    def _submit(self, key, log):
+        self.worker.submit(log['id'], key, json.dumps(log, ensure_ascii=False))
+
+    def append_result(self, match_key, result, is_tournament=False):
+        self._submit(match_key, result_log(match_key, result, is_tournament))
+
+    def append_settings(self, settings):
+        self._submit(SETTINGS_LOG_KEY, settings_log(settings))
+
+    def _replace(self, data):
+        # 置き換える前の送信待ちを後から書き込まない。取り込みとも重ねない（古い状態で上書きしないように）
+        def replace():
+            self.journal.discard(self.tid)
+            self._write_fn(data)
+        self.worker.run_exclusive(replace)
+
+    def write_snapshot(self, data):
+        self._replace(data)
+
+    def reset(self):
+        self._replace(None)
+
+    def compact(self):
+        return self.worker.compact_now()
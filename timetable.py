@@ -0,0 +1,126 @@
+"""
+コンパイル済みの対戦表（Streamlit に依存しない）。
+
+リーグ戦・トーナメントの「いつ・どのコートで・どの試合か」は、設定（コート数・チーム構成・開始時刻・
+各試合時間）だけで決まる。設定ごとに一度だけ組み立てて、プロセス内の全セッションで共有する。
+再実行のたびに datetime や試合キーの文字列を作り直さず、試合キー・時間帯・コート・チームからの
+参照も辞書1回で済む。中身は作り直さない前提なので、タプルと namedtuple だけで持つ（書き換えないこと）。
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from tournament import TEMPLATE_GAMES_PER_TEAM, league_slots, league_match_key, tournament_schedule, tournament_match_teams
+
+# 設定の組み合わせ（大会数 × 設定の変更）が同時に何通りか入る程度
+TIMETABLE_CACHE_SIZE = 32
+
+# リーグ戦1試合。slot は第何試合帯か（0始まり）
+LeagueMatch = namedtuple("LeagueMatch", "key league slot court home away time")
+# トーナメント1試合。game は tournament_match_teams にそのまま渡せるテンプレートの1試合
+TournamentMatch = namedtuple("TournamentMatch", "key league cup round court slot time title game")
+# 1つの時間帯。time は "HH:MM"、matches はコート順
+Slot = namedtuple("Slot", "index time title matches")
+
+
+class Timetable:
+    """
+    league_slots / tournament_slots: 時間帯のタプル
+    league_end / tournament_start: リーグ戦の終了・トーナメントの開始時刻（datetime）
+    by_key: 試合キー → 試合（リーグ戦・トーナメントの両方）
+    by_court: コート → そのコートの試合（時刻順）
+    by_team: (リーグ, チーム記号) → そのチームのリーグ戦の試合（時刻順）
+    by_league: リーグ → そのリーグのリーグ戦の試合（時刻順）
+    """
+
+    def __init__(self, league_slots, tournament_slots, league_end, tournament_start):
+        self.league_slots = league_slots
+        self.tournament_slots = tournament_slots
+        self.league_end = league_end
+        self.tournament_start = tournament_start
+        by_key, by_court, by_team, by_league = {}, {}, {}, {}
+        for slot in league_slots + tournament_slots:
+            for match in slot.matches:
+                by_key[match.key] = match
+                by_court.setdefault(match.court, []).append(match)
+        for slot in league_slots:
+            for match in slot.matches:
+                by_league.setdefault(match.league, []).append(match)
+                by_team.setdefault((match.league, match.home), []).append(match)
+                by_team.setdefault((match.league, match.away), []).append(match)
+        self.by_key = by_key
+        self.by_court = {court: tuple(matches) for court, matches in by_court.items()}
+        self.by_team = {team: tuple(matches) for team, matches in by_team.items()}
+        self.by_league = {league: tuple(matches) for league, matches in by_league.items()}
+
+    def team_matches(self, league, code):
+        return self.by_team.get((league, code), ())
+
+
+@lru_cache(maxsize=TIMETABLE_CACHE_SIZE)
+def compile_timetable(court_mode, reg_codes, mix_codes, start_hour, start_minute,
+                      league_duration, interval_duration, tourn_duration, league_games=TEMPLATE_GAMES_PER_TEAM):
+    """
+    設定から対戦表を組み立てる（同じ設定なら同じオブジェクトを返す）。
+    reg_codes / mix_codes はキャッシュのキーになるのでタプルで渡す。league_games は1チームあたりのリーグ戦の試合数。
+    """
+    base_time = datetime(2025, 1, 1, start_hour, start_minute)
+    leagues = []
+    for i, slot in enumerate(league_slots(court_mode, reg_codes, mix_codes, base_time, league_duration, league_games)):
+        time_str = slot['time'].strftime('%H:%M')
+        matches = tuple(LeagueMatch(league_match_key(game['type'], game['k'], *game['p']), game['type'], i, game['c'],
+                                    game['p'][0], game['p'][1], time_str) for game in slot['games'])
+        leagues.append(Slot(i, time_str, f"第{i+1}試合帯 ({time_str})", matches))
+
+    league_end = base_time + timedelta(minutes=len(leagues) * league_duration)
+    tournament_start = league_end + timedelta(minutes=interval_duration)
+    tournaments = []
+    for i, slot in enumerate(tournament_schedule(court_mode)):
+        time_str = (tournament_start + timedelta(minutes=i * tourn_duration)).strftime('%H:%M')
+        matches = tuple(TournamentMatch(f"{game['league']}_{game['cup']}_{game['round']}", game['league'], game['cup'],
+                                        game['round'], game['court'], i, time_str, f"{game['cup']} {game['round']}", game)
+                        for game in slot['games'])
+        tournaments.append(Slot(i, time_str, slot['cup_display'], matches))
+    return Timetable(tuple(leagues), tuple(tournaments), league_end, tournament_start)
+
+
+# 1チームの1試合。opponent は相手のチーム名（トーナメントで未定なら None）、
+# result はスコア入力済みならその結果（未入力なら None）、provisional はリーグ戦の途中の順位で決めた組み合わせか
+Fixture = namedtuple("Fixture", "match is_home opponent result provisional")
+
+
+def _played(res):
+    return res if res and res.get('s1') is not None else None
+
+
+def team_fixtures(timetable, league, code, teams_map, results, tourn_results, ranked_codes):
+    """
+    1チームの試合一覧（時刻順）。リーグ戦は by_team から引き、トーナメントは現在の順位と結果から
+    勝ち上がりを解決して、そのチームが入る試合だけを拾う（resolve_tournament_team と同じ規則）。
+    ranked_codes: 順位順のチーム記号（standings.ranked_team_codes）。
+    トーナメントの枠はチーム記号で解決して比べる（チーム名が重なっていても別のチームの試合を拾わない）。
+    """
+    fixtures = []
+    for m in timetable.team_matches(league, code):
+        is_home = m.home == code
+        opponent = teams_map.get(m.away if is_home else m.home)
+        fixtures.append(Fixture(m, is_home, opponent, _played(results.get(m.key)), False))
+
+    # リーグ戦が全て終わるまでは、トーナメントの組み合わせは途中の順位によるもの（トーナメントの試合がある場合だけ調べる）
+    provisional = None
+    for slot in timetable.tournament_slots:
+        for m in slot.matches:
+            if m.league != league: continue
+            left, right = tournament_match_teams(tourn_results, m.game, ranked_codes)
+            if code not in (left, right): continue
+            is_home = left == code
+            if provisional is None:
+                provisional = any(_played(results.get(m2.key)) is None for m2 in timetable.by_league.get(league, ()))
+            fixtures.append(Fixture(m, is_home, teams_map.get(right if is_home else left),
+                                    _played(tourn_results.get(m.key)), provisional))
+    return fixtures
+
+
+def next_fixture(fixtures):
+    """まだスコアが入っていない最初の試合（無ければ None）"""
+    return next((f for f in fixtures if f.result is None), None)
@@ -0,0 +1,257 @@
+"""
+大会の進行に関するロジック（Streamlit に依存しない）。
+
+リーグ戦・トーナメントの対戦表のテンプレートと、保存された状態（試合結果）から
+「いつ・どのコートで・誰と誰が戦うか」「トーナメントの勝ち上がり」を求める関数。
+画面（app.py）と、観戦者向けの静的ページの書き出し（publish.py）で共有する。
+"""
+from datetime import timedelta
+
+from schedule import generate_league_schedule
+
+SCHEDULE_TEMPLATE_4COURT = [
+    [("A", "E"), ("B", "F"), ("A", "E"), ("B", "F")], 
+    [("C", "G"), ("D", "H"), ("C", "G"), ("D", "H")],
+    [("I", "J"), ("K", "L"), ("I", "J"), ("K", "L")],
+    [("A", "B"), ("C", "D"), ("A", "B"), ("C", "D")],
+    [("E", "F"), ("G", "H"), ("E", "F"), ("G", "H")],
+    [("A", "I"), ("B", "J"), ("A", "I"), ("B", "J")],
+    [("C", "K"), ("D", "L"), ("C", "K"), ("D", "L")],
+    [("E", "I"), ("F", "J"), ("E", "I"), ("F", "J")],
+    [("G", "K"), ("H", "L"), ("G", "K"), ("H", "L")]
+]
+
+SCHEDULE_TEMPLATE_3COURT = [
+    {"id": 1, "matches": [("reg", "A", "E"), ("reg", "B", "F"), ("mix", "A", "E")]},
+    {"id": 2, "matches": [("reg", "C", "G"), ("mix", "B", "F"), ("mix", "C", "G")]},
+    {"id": 3, "matches": [("reg", "I", "J"), ("reg", "D", "H"), ("mix", "D", "H")]},
+    {"id": 4, "matches": [("reg", "K", "L"), ("mix", "I", "J"), ("mix", "K", "L")]},
+    {"id": 5, "matches": [("reg", "A", "B"), ("reg", "C", "D"), ("mix", "A", "B")]},
+    {"id": 6, "matches": [("reg", "E", "F"), ("mix", "C", "D"), ("mix", "E", "F")]},
+    {"id": 7, "matches": [("reg", "G", "H"), ("reg", "A", "I"), ("mix", "G", "H")]},
+    {"id": 8, "matches": [("reg", "B", "J"), ("mix", "A", "I"), ("mix", "B", "J")]},
+    {"id": 9, "matches": [("reg", "C", "K"), ("reg", "D", "L"), ("mix", "C", "K")]},
+    {"id": 10, "matches": [("reg", "E", "I"), ("mix", "D", "L"), ("mix", "E", "I")]},
+    {"id": 11, "matches": [("reg", "F", "J"), ("reg", "G", "K"), ("mix", "F", "J")]},
+    {"id": 12, "matches": [("reg", "H", "L"), ("mix", "G", "K"), ("mix", "H", "L")]},
+]
+
+# 既定の12チーム構成（保存済みの試合キーと互換を保つため、この構成ではテンプレートを使う）
+STANDARD_TEAM_CODES = tuple(chr(65+i) for i in range(12))
+# テンプレートの1チームあたりのリーグ戦の試合数（自動生成の場合の既定値も同じ）
+TEMPLATE_GAMES_PER_TEAM = 3
+# テンプレートの対戦カードをリーグごとに分けたもの（片方のリーグだけが既定の構成の場合に使う）
+TEMPLATE_ROUNDS = {"reg": [[slot[0], slot[1]] for slot in SCHEDULE_TEMPLATE_4COURT],
+                   "mix": [[slot[2], slot[3]] for slot in SCHEDULE_TEMPLATE_4COURT]}
+
+TOURN_SCHED_4COURT = [
+    {"cup_display": "パテントクラシカルカップ", "games": [
+        {"league": "reg", "cup": "Classical", "round": "SF1", "court": "A"},
+        {"league": "reg", "cup": "Classical", "round": "SF2", "court": "B"},
+        {"league": "mix", "cup": "Classical", "round": "SF1", "court": "C"},
+        {"league": "mix", "cup": "Classical", "round": "SF2", "court": "D"},
+    ]},
+    {"cup_display": "パテントエリートカップ", "games": [
+        {"league": "reg", "cup": "Elite", "round": "SF1", "court": "A"},
+        {"league": "reg", "cup": "Elite", "round": "SF2", "court": "B"},
+        {"league": "mix", "cup": "Elite", "round": "SF1", "court": "C"},
+        {"league": "mix", "cup": "Elite", "round": "SF2", "court": "D"},
+    ]},
+    {"cup_display": "パテントチャンピオンズカップ", "games": [
+        {"league": "reg", "cup": "Champions", "round": "SF1", "court": "A"},
+        {"league": "reg", "cup": "Champions", "round": "SF2", "court": "B"},
+        {"league": "mix", "cup": "Champions", "round": "SF1", "court": "C"},
+        {"league": "mix", "cup": "Champions", "round": "SF2", "court": "D"},
+    ]},
+    {"cup_display": "パテントクラシカルカップ(決勝)", "games": [
+        {"league": "reg", "cup": "Classical", "round": "Final", "court": "A"},
+        {"league": "reg", "cup": "Classical", "round": "3rd", "court": "B"},
+        {"league": "mix", "cup": "Classical", "round": "Final", "court": "C"},
+        {"league": "mix", "cup": "Classical", "round": "3rd", "court": "D"},
+    ]},
+    {"cup_display": "パテントエリートカップ(決勝)", "games": [
+        {"league": "reg", "cup": "Elite", "round": "Final", "court": "A"},
+        {"league": "reg", "cup": "Elite", "round": "3rd", "court": "B"},
+        {"league": "mix", "cup": "Elite", "round": "Final", "court": "C"},
+        {"league": "mix", "cup": "Elite", "round": "3rd", "court": "D"},
+    ]},
+    {"cup_display": "パテントチャンピオンズカップ(決勝)", "games": [
+        {"league": "reg", "cup": "Champions", "round": "Final", "court": "A"},
+        {"league": "reg", "cup": "Champions", "round": "3rd", "court": "B"},
+        {"league": "mix", "cup": "Champions", "round": "Final", "court": "C"},
+        {"league": "mix", "cup": "Champions", "round": "3rd", "court": "D"},
+    ]},
+]
+
+TOURN_SCHED_3COURT = [
+    {"cup_display": "クラシカルSF", "games": [
+        {"league": "reg", "cup": "Classical", "round": "SF1", "court": "A"},
+        {"league": "reg", "cup": "Classical", "round": "SF2", "court": "B"},
+        {"league": "mix", "cup": "Classical", "round": "SF1", "court": "C"},
+    ]},
+    {"cup_display": "クラシカル/エリートSF", "games": [
+        {"league": "mix", "cup": "Classical", "round": "SF2", "court": "A"},
+        {"league": "reg", "cup": "Elite", "round": "SF1", "court": "B"},
+        {"league": "reg", "cup": "Elite", "round": "SF2", "court": "C"},
+    ]},
+    {"cup_display": "エリート/チャンピオンズSF", "games": [
+        {"league": "mix", "cup": "Elite", "round": "SF1", "court": "A"},
+        {"league": "mix", "cup": "Elite", "round": "SF2", "court": "B"},
+        {"league": "reg", "cup": "Champions", "round": "SF1", "court": "C"},
+    ]},
+    {"cup_display": "チャンピオンズSF", "games": [
+        {"league": "reg", "cup": "Champions", "round": "SF2", "court": "A"},
+        {"league": "mix", "cup": "Champions", "round": "SF1", "court": "B"},
+        {"league": "mix", "cup": "Champions", "round": "SF2", "court": "C"},
+    ]},
+    {"cup_display": "クラシカル決勝", "games": [
+        {"league": "reg", "cup": "Classical", "round": "Final", "court": "A"},
+        {"league": "reg", "cup": "Classical", "round": "3rd", "court": "B"},
+        {"league": "mix", "cup": "Classical", "round": "Final", "court": "C"},
+    ]},
+    {"cup_display": "エリート決勝", "games": [
+        {"league": "mix", "cup": "Classical", "round": "3rd", "court": "A"},
+        {"league": "reg", "cup": "Elite", "round": "Final", "court": "B"},
+        {"league": "reg", "cup": "Elite", "round": "3rd", "court": "C"},
+    ]},
+    {"cup_display": "エリート/チャンピオンズ決勝", "games": [
+        {"league": "mix", "cup": "Elite", "round": "Final", "court": "A"},
+        {"league": "mix", "cup": "Elite", "round": "3rd", "court": "B"},
+        {"league": "reg", "cup": "Champions", "round": "Final", "court": "C"},
+    ]},
+    {"cup_display": "チャンピオンズ決勝", "games": [
+        {"league": "reg", "cup": "Champions", "round": "3rd", "court": "A"},
+        {"league": "mix", "cup": "Champions", "round": "Final", "court": "B"},
+        {"league": "mix", "cup": "Champions", "round": "3rd", "court": "C"},
+    ]},
+]
+
+
+CUP_ROUNDS = ("SF1", "SF2", "Final", "3rd")
+
+
+def league_slots(court_mode, reg_codes, mix_codes, base_time, league_duration, games_per_team=TEMPLATE_GAMES_PER_TEAM):
+    """
+    リーグ戦の時間帯 × コートの対戦表（games_per_team は1チームあたりの試合数）。
+    両リーグとも既定の12チーム構成・1チーム3試合ならテンプレート、それ以外は自動生成した対戦表を使う。
+    テンプレートを使うかどうかはリーグごとに決める: 自動生成でも、既定の構成のリーグの対戦カードは
+    テンプレートと同じにする（片方のリーグのチーム数を変えても、もう片方の試合数は変わらない）。
+    各試合の "k" は試合キーの番号（league_match_key）。時間帯への詰め方に依存させない:
+    既定の構成のリーグは、その対戦カードのテンプレートでの時間帯番号（保存済みの試合キーと同じ）、
+    自動生成のリーグは節番号。片方のリーグのチーム数を変えても、もう片方の試合キーは変わらない。
+    """
+    standard = {"reg": reg_codes == STANDARD_TEAM_CODES and games_per_team == TEMPLATE_GAMES_PER_TEAM,
+                "mix": mix_codes == STANDARD_TEAM_CODES and games_per_team == TEMPLATE_GAMES_PER_TEAM}
+    if all(standard.values()):
+        slots = []
+        if court_mode == "4面":
+            for i, slot in enumerate(SCHEDULE_TEMPLATE_4COURT):
+                slots.append({"time": base_time + timedelta(minutes=i*league_duration), "games": [
+                    {"type": "reg", "c": "A", "p": slot[0], "k": i}, {"type": "reg", "c": "B", "p": slot[1], "k": i},
+                    {"type": "mix", "c": "C", "p": slot[2], "k": i}, {"type": "mix", "c": "D", "p": slot[3], "k": i}
+                ]})
+        else:
+            for i, slot in enumerate(SCHEDULE_TEMPLATE_3COURT):
+                games = []
+                for idx, m_info in enumerate(slot["matches"]):
+                    games.append({"type": m_info[0], "c": ["A","B","C"][idx], "p": (m_info[1], m_info[2]), "k": i})
+                slots.append({"time": base_time + timedelta(minutes=i*league_duration), "games": games})
+        return slots
+    courts = 4 if court_mode == "4面" else 3
+    slots = generate_league_schedule({"reg": list(reg_codes), "mix": list(mix_codes)}, courts, league_duration, base_time,
+                                     games_per_team, {league: TEMPLATE_ROUNDS[league] for league, std in standard.items() if std})
+    template_index = _template_slot_index(court_mode)
+    for slot in slots:
+        for game in slot["games"]:
+            game["k"] = template_index[(game["type"], game["p"])] if standard[game["type"]] else game["r"]
+    return slots
+
+
+def _template_slot_index(court_mode):
+    """{(リーグ, (ホーム, アウェイ)): テンプレートでの時間帯番号}（テンプレートを使ったときの試合キーと同じ番号）"""
+    if court_mode == "4面":
+        return {(league, p): i for i, slot in enumerate(SCHEDULE_TEMPLATE_4COURT)
+                for league, p in zip(("reg", "reg", "mix", "mix"), slot)}
+    return {(m[0], (m[1], m[2])): i for i, slot in enumerate(SCHEDULE_TEMPLATE_3COURT) for m in slot["matches"]}
+
+
+def league_match_key(l_type, index, home, away):
+    """リーグ戦の試合キー（index は league_slots の "k"。形式は '{リーグ}_{番号}_{ホーム}_{アウェイ}' のまま）"""
+    return f"{l_type}_{index}_{home}_{away}"
+
+
+def tournament_schedule(court_mode):
+    return TOURN_SCHED_4COURT if court_mode == "4面" else TOURN_SCHED_3COURT
+
+
+def cup_ranks(cup_name):
+    """カップに出場するチームの、リーグ順位表での開始位置（0始まり）"""
+    if cup_name == "Champions": return 0
+    if cup_name == "Elite": return 4
+    if cup_name == "Classical": return 8
+    return 0
+
+
+def tourn_match_result(tourn_results, match_id):
+    """トーナメント1試合の (結果, 勝者 "left"/"right"/None, 敗者)。同点なら PK で決める"""
+    res = tourn_results.get(match_id, {'s1': None, 's2': None, 'pk1': None, 'pk2': None})
+    winner, loser = None, None
+    s1, s2 = res['s1'], res['s2']
+    if s1 is not None and s2 is not None:
+        if s1 > s2: winner, loser = "left", "right"
+        elif s2 > s1: winner, loser = "right", "left"
+        else:
+            pk1, pk2 = res.get('pk1'), res.get('pk2')
+            if pk1 is not None and pk2 is not None:
+                if pk1 > pk2: winner, loser = "left", "right"
+                elif pk2 > pk1: winner, loser = "right", "left"
+    return res, winner, loser
+
+
+def resolve_tournament_team(tourn_results, league, cup, round_name, ranks_list):
+    """
+    round_name の左側（"SF1", "Final" など）/ 右側（"SF1_Opp", "Final_Opp" など）に入るチーム名。
+    順位が確定していない・前の試合が終わっていない場合は None
+    """
+    start_idx = cup_ranks(cup)
+    if len(ranks_list) < 12: return None
+    t1, t4 = ranks_list[start_idx], ranks_list[start_idx+3]
+    t2, t3 = ranks_list[start_idx+1], ranks_list[start_idx+2]
+    
+    if round_name == "SF1": return t1
+    if round_name == "SF1_Opp": return t4
+    if round_name == "SF2": return t2
+    if round_name == "SF2_Opp": return t3
+
+    sf1_id = f"{league}_{cup}_SF1"; sf2_id = f"{league}_{cup}_SF2"
+    _, w1, l1 = tourn_match_result(tourn_results, sf1_id)
+    _, w2, l2 = tourn_match_result(tourn_results, sf2_id)
+    
+    win1 = t1 if w1=="left" else t4 if w1=="right" else None
+    lose1 = t1 if w1=="right" else t4 if w1=="left" else None
+    win2 = t2 if w2=="left" else t3 if w2=="right" else None
+    lose2 = t2 if w2=="right" else t3 if w2=="left" else None
+
+    if round_name == "Final": return win1
+    if round_name == "Final_Opp": return win2
+    if round_name == "3rd": return lose1
+    if round_name == "3rd_Opp": return lose2
+    return None
+
+
+def tournament_match_teams(tourn_results, game, ranks_list):
+    """トーナメント表（TOURN_SCHED_*）の1試合の (左のチーム, 右のチーム)"""
+    return (resolve_tournament_team(tourn_results, game['league'], game['cup'], game['round'], ranks_list),
+            resolve_tournament_team(tourn_results, game['league'], game['cup'], f"{game['round']}_Opp", ranks_list))
+
+
+def bracket_state(tourn_results, league, cup, ranks_list):
+    """
+    トーナメント表の描画に必要な状態: (出場4チーム, (SF1, SF2, 決勝, 3位決定戦) の勝者)。
+    順位が確定していなければ None
+    """
+    if len(ranks_list) < 12: return None
+    start_idx = cup_ranks(cup)
+    teams = tuple(ranks_list[start_idx:start_idx+4])
+    winners = tuple(tourn_match_result(tourn_results, f"{league}_{cup}_{r}")[1] for r in CUP_ROUNDS)
+    return teams, winners